@@ -4,6 +4,9 @@ import urllib.error
 import json
 import re
 
+import bgg_http
+import bgg_rate_limiter
+
 def _lambda_handler_impl(event, context):
     query_params = event.get('queryStringParameters') or {}
     username = query_params.get('username')
@@ -35,10 +38,14 @@ def _lambda_handler_impl(event, context):
     api_url = f"https://boardgamegeek.com/xmlapi2/collection?username={username}&stats=1"
     
     req = urllib.request.Request(api_url, headers=headers)
+    limiter = bgg_rate_limiter.get_limiter()
+    limiter.acquire()
     
     try:
-        with urllib.request.urlopen(req) as response:
+        # Read timeout stays under the 30s Lambda timeout so BGG stalls surface as errors
+        with bgg_http.urlopen(req, timeout=(5, 25)) as response:
             status_code = response.getcode()
+            limiter.record_response(status_code)
             content = response.read().decode('utf-8')
             return {
                 'statusCode': status_code,
@@ -49,6 +56,7 @@ def _lambda_handler_impl(event, context):
             }
     except urllib.error.HTTPError as e:
         # Forward HTTP errors directly from BGG (e.g. 202 Accepted, 400, etc.)
+        limiter.record_response(e.code, (e.headers or {}).get('Retry-After'))
         content = e.read().decode('utf-8')
         return {
             'statusCode': e.code,
@@ -0,0 +1,216 @@
+"""
+Pooled HTTP client for BoardGameGeek requests.
+
+Every BGG call goes through a module-level connection pool that survives warm Lambda
+invocations, so consecutive requests reuse one TLS connection instead of paying a fresh
+handshake each time. All requests ask for gzip and carry explicit connect/read timeouts
+(BGG_HTTP_CONNECT_TIMEOUT / BGG_HTTP_READ_TIMEOUT).
+
+Two entry points share the same defaults:
+  * get() - a requests.Session with a sized HTTPAdapter, for the container images that
+    ship `requests`.
+  * urlopen() - a stdlib (http.client) keep-alive replacement for urllib.request.urlopen,
+    for the zip-packaged Lambdas that only have the standard library. It returns a
+    response with getcode()/read() and raises urllib.error.HTTPError like urlopen does.
+"""
+import gzip
+import http.client
+import io
+import os
+import threading
+import urllib.error
+import zlib
+from urllib.parse import urljoin, urlsplit
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:  # zip-packaged Lambdas use urlopen() only
+    requests = None
+
+CONNECT_TIMEOUT = float(os.environ.get('BGG_HTTP_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.environ.get('BGG_HTTP_READ_TIMEOUT', '60'))
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# Connections kept open per host (the upload pools never talk to BGG, so this stays small)
+POOL_SIZE = int(os.environ.get('BGG_HTTP_POOL_SIZE', '10'))
+
+DEFAULT_HEADERS = {'Accept-Encoding': 'gzip, deflate'}
+
+_MAX_REDIRECTS = 5
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _split_timeout(timeout):
+    if timeout is None:
+        return DEFAULT_TIMEOUT
+    if isinstance(timeout, (tuple, list)):
+        return float(timeout[0]), float(timeout[1])
+    return float(timeout), float(timeout)
+
+
+def get_session():
+    """Returns the process-wide requests.Session, creating it on first use."""
+    global _session
+    if requests is None:
+        raise RuntimeError("bgg_http.get_session() needs the requests package; use bgg_http.urlopen() instead")
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            _session = session
+        return _session
+
+
+def get(url, headers=None, timeout=None):
+    """GETs a URL through the pooled session. timeout is seconds or (connect, read); defaults to DEFAULT_TIMEOUT."""
+    return get_session().get(url, headers=headers, timeout=_split_timeout(timeout))
+
+
+class PooledResponse:
+    """Fully-read response from urlopen(): getcode()/status, headers and the decoded body."""
+
+    def __init__(self, url, status, reason, headers, body):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._body = body
+
+    def getcode(self):
+        return self.status
+
+    def read(self):
+        return self._body
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _ConnectionPool:
+    """Idle keep-alive http.client connections per (scheme, host, port)."""
+
+    def __init__(self, size):
+        self.size = size
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        conn_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return conn_class(host, port, timeout=timeout), False
+
+    def give_back(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def clear(self):
+        with self._lock:
+            conns = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+
+_pool = _ConnectionPool(POOL_SIZE)
+
+
+def _decode_body(body, encoding):
+    encoding = (encoding or '').lower()
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'deflate':
+        return zlib.decompress(body)
+    return body
+
+
+def _send(url, headers, timeout):
+    """Sends one GET over a pooled connection, retrying once on a fresh connection if a reused one went stale."""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    key = (scheme, parts.hostname, parts.port or (443 if scheme == 'https' else 80))
+    path = parts.path or '/'
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    connect_timeout, read_timeout = timeout
+
+    for attempt in range(2):
+        conn, reused = _pool.take(key, connect_timeout)
+        try:
+            if conn.sock is None:
+                conn.timeout = connect_timeout
+                conn.connect()
+            conn.sock.settimeout(read_timeout)
+            conn.request('GET', path, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read()
+        except (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if reused and attempt == 0:
+                continue
+            raise
+        except Exception:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            _pool.give_back(key, conn)
+        return resp, body
+
+
+def urlopen(req, timeout=None):
+    """
+    Keep-alive replacement for urllib.request.urlopen(req, timeout) for GET requests.
+
+    req is a URL or urllib.request.Request; timeout is seconds or (connect, read). Follows
+    redirects, decodes gzip/deflate bodies, and raises urllib.error.HTTPError (with a
+    readable body and the response headers) for 4xx/5xx responses.
+    """
+    if isinstance(req, str):
+        url, req_headers = req, {}
+    else:
+        url, req_headers = req.full_url, dict(req.header_items())
+    headers = dict(DEFAULT_HEADERS)
+    headers.update(req_headers)
+    timeout = _split_timeout(timeout)
+
+    for _ in range(_MAX_REDIRECTS + 1):
+        resp, body = _send(url, headers, timeout)
+        if resp.status in (301, 302, 303, 307, 308) and resp.getheader('Location'):
+            url = urljoin(url, resp.getheader('Location'))
+            continue
+        body = _decode_body(body, resp.getheader('Content-Encoding'))
+        if resp.status >= 400:
+            raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.msg, io.BytesIO(body))
+        return PooledResponse(url, resp.status, resp.reason, resp.msg, body)
+    raise urllib.error.HTTPError(url, resp.status, "Too many redirects", resp.msg, io.BytesIO(body))
+
+
+def reset():
+    """Closes every pooled connection and the shared session (tests, reconfiguration)."""
+    global _session
+    _pool.clear()
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
@@ -0,0 +1,148 @@
+"""
+Token-bucket rate limiter shared by every BoardGameGeek API caller.
+
+Each process keeps one limiter per API (get_limiter('bgg')) that every request goes
+through: acquire() blocks until the bucket has a token, so callers issue requests as fast
+as the configured rate allows instead of sleeping a fixed interval. The bucket is kept as a
+virtual schedule (the time the next token frees up), so each caller sleeps at most once.
+
+The limiter adapts to the API: a 429/503 response halves the rate (down to a floor) and
+holds every caller for the server's Retry-After, while successful responses step the rate
+back up towards the configured maximum. Retry backoff after other errors goes through
+pause() so that the next acquire() waits it out.
+
+Stdlib only, so it can be zipped next to the single-file Lambdas as well as copied into
+the container images.
+"""
+import email.utils
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# Responses that mean "slow down" rather than a request-specific failure
+THROTTLE_STATUS_CODES = frozenset({429, 503})
+
+# BGG asks API clients for no more than about one request per second
+DEFAULT_RATE_PER_SECOND = 1.0
+DEFAULT_BURST = 1
+DEFAULT_MIN_RATE_PER_SECOND = 0.1
+
+
+def parse_retry_after(value, now=None):
+    """
+    Parses a Retry-After header (delay in seconds or an HTTP-date) into seconds from now.
+    Returns None when the header is missing or unparseable; dates in the past give 0.
+    """
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text:
+        return None
+    try:
+        return max(0.0, float(text))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(text)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket with adaptive backoff.
+
+    rate is the steady-state requests per second and burst the bucket size. On a throttled
+    response the rate is multiplied by backoff_factor (never below min_rate); every
+    successful response adds recovery_step (default a tenth of the maximum) back.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE_PER_SECOND, burst=DEFAULT_BURST,
+                 min_rate=DEFAULT_MIN_RATE_PER_SECOND, backoff_factor=0.5, recovery_step=None):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.burst = max(1, int(burst))
+        self.backoff_factor = backoff_factor
+        self.recovery_step = recovery_step if recovery_step is not None else self.max_rate / 10.0
+        self._rate = self.max_rate
+        self._next_token_at = 0.0  # virtual time at which the next token is released
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        """Current (possibly backed-off) requests per second."""
+        return self._rate
+
+    def acquire(self):
+        """Blocks until a request may be sent. Returns the number of seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            interval = 1.0 / self._rate
+            scheduled = max(self._next_token_at, now)
+            start = max(scheduled - (self.burst - 1) * interval, self._paused_until, now)
+            self._next_token_at = max(scheduled, start) + interval
+        wait = start - now
+        if wait > 0:
+            time.sleep(wait)
+            return wait
+        return 0.0
+
+    def pause(self, seconds):
+        """Holds every caller for at least `seconds` from now (retry backoff, Retry-After)."""
+        if seconds and seconds > 0:
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def record_response(self, status_code, retry_after=None):
+        """
+        Feeds a response back into the limiter. Throttled responses (429/503) back the rate
+        off and pause for Retry-After (or one interval at the new rate); successful responses
+        recover the rate. Returns True when the response was throttled.
+        """
+        if status_code in THROTTLE_STATUS_CODES:
+            with self._lock:
+                self._rate = max(self.min_rate, self._rate * self.backoff_factor)
+                delay = parse_retry_after(retry_after)
+                if delay is None:
+                    delay = 1.0 / self._rate
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            return True
+        if isinstance(status_code, int) and status_code < 400 and self._rate < self.max_rate:
+            with self._lock:
+                self._rate = min(self.max_rate, self._rate + self.recovery_step)
+        return False
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(name='bgg'):
+    """
+    Returns the process-wide limiter for an API, creating it from the BGG_RATE_LIMIT_* environment
+    variables on first use. Warm Lambda containers keep their limiter (and any backoff) across invocations.
+    """
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(name)
+        if limiter is None:
+            limiter = RateLimiter(
+                rate=float(os.environ.get('BGG_RATE_LIMIT_PER_SECOND', DEFAULT_RATE_PER_SECOND)),
+                burst=int(os.environ.get('BGG_RATE_LIMIT_BURST', DEFAULT_BURST)),
+                min_rate=float(os.environ.get('BGG_RATE_LIMIT_MIN_PER_SECOND', DEFAULT_MIN_RATE_PER_SECOND)),
+            )
+            _LIMITERS[name] = limiter
+        return limiter
+
+
+def reset_limiters():
+    """Drops every process-wide limiter so the next get_limiter() starts fresh (tests, reconfiguration)."""
+    with _LIMITERS_LOCK:
+        _LIMITERS.clear()
@@ -0,0 +1,236 @@
+"""
+Vectorized taste-profile builder shared by the BGG Recommender and Taste Analytics Lambdas.
+
+A taste profile is a set of rating-weighted affinities derived from a user's liked games:
+mechanics, categories, designers, primary publisher, and complexity buckets. List columns
+are flattened with pyarrow list kernels and the weights are accumulated with group-by sums (np.bincount)
+instead of per-row Python loops. The same kernels accept a group code per row, so every
+user's profile can be built in a single pass (build_taste_profiles) for batch regeneration.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+COMPLEXITY_BUCKETS = ("Light", "Medium-Light", "Medium-Heavy", "Heavy")
+
+# Neutral rating assumed for liked games without a usable user rating (e.g. owned but unrated)
+DEFAULT_USER_RATING = 7.0
+
+
+def empty_complexity_weights():
+    return {b: 0.0 for b in COMPLEXITY_BUCKETS}
+
+
+def select_liked_games(user_df):
+    """
+    Picks the games a profile is built from: rated 7.0+, else owned games,
+    else the user's 10 highest-rated games.
+    """
+    liked = user_df[user_df['rating'] >= 7.0]
+    if liked.empty:
+        liked = user_df[user_df['own']]
+    if liked.empty:
+        liked = user_df.sort_values(by='rating', ascending=False).head(10)
+    return liked
+
+
+def select_liked_games_by_user(user_games, user_column='username'):
+    """
+    Vectorized select_liked_games over many users' collections stacked in one DataFrame.
+    Each user falls back independently: rated 7.0+, else owned, else their 10 highest-rated games.
+    """
+    if user_games.empty:
+        return user_games
+    codes, users = pd.factorize(user_games[user_column])
+    n_users = len(users)
+    rating = pd.to_numeric(user_games['rating'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    rated = rating >= 7.0
+    own = user_games['own'].fillna(False).astype(bool).to_numpy()
+
+    any_rated = np.bincount(codes, weights=rated, minlength=n_users) > 0
+    any_owned = np.bincount(codes, weights=own, minlength=n_users) > 0
+
+    # Top 10 per user by rating (descending, missing ratings last)
+    order = np.lexsort((np.where(np.isnan(rating), np.inf, -rating), codes))
+    sorted_codes = codes[order]
+    group_start = np.searchsorted(sorted_codes, sorted_codes, side='left')
+    top_ten = np.zeros(len(codes), dtype=bool)
+    top_ten[order[np.arange(len(order)) - group_start < 10]] = True
+
+    fallback_own = ~any_rated[codes] & own
+    fallback_top = ~any_rated[codes] & ~any_owned[codes] & top_ten
+    return user_games[rated | fallback_own | fallback_top]
+
+
+def rating_weights(ratings):
+    """Maps user ratings to affinity weights: max(1, rating - 5), treating missing/invalid ratings as 7.0."""
+    r = pd.to_numeric(pd.Series(ratings), errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    r = np.where(np.isnan(r) | (r <= 0), DEFAULT_USER_RATING, r)
+    return np.maximum(1.0, r - 5.0)
+
+
+def _as_list_array(values):
+    """Converts a list-like column to a pyarrow list array; non-list cells (NaN, None, scalars) become null."""
+    if isinstance(values, pd.Series) and isinstance(values.dtype, pd.ArrowDtype):
+        values = values.array._pa_array
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    if isinstance(values, pa.Array):
+        return values
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Stray scalar cells: null them out and convert again
+        series = pd.Series(values, dtype=object)
+        is_list = series.map(type).isin((list, np.ndarray)).to_numpy()
+        return pa.array(series.where(is_list, None), from_pandas=True)
+
+
+def _flatten(values, first_only=False):
+    """Flattens list-like cells into (row index, token) arrays; non-list cells contribute nothing."""
+    arr = _as_list_array(values)
+    if not (pa.types.is_list(arr.type) or pa.types.is_large_list(arr.type)):
+        return np.zeros(0, dtype=np.int64), np.empty(0, dtype=object)
+    if first_only:
+        arr = pc.list_slice(arr, 0, 1)
+    rows = pc.list_parent_indices(arr).to_numpy(zero_copy_only=False).astype(np.int64, copy=False)
+    tokens = pc.list_flatten(arr)
+    valid = pc.is_valid(tokens).to_numpy(zero_copy_only=False)
+    return rows[valid], tokens.to_numpy(zero_copy_only=False)[valid]
+
+
+def grouped_token_sums(groups, n_groups, values, weights, unique_per_row=False, first_only=False):
+    """
+    Sums row weights per (group, token) over a list column, returning one {token: weight}
+    dict per group. groups holds each row's integer group code in [0, n_groups).
+
+    unique_per_row counts a token at most once per row (mechanics, categories); first_only
+    uses only the first token of each row (primary publisher). Keys keep first-seen order.
+    """
+    result = [{} for _ in range(n_groups)]
+    rows, tokens = _flatten(values, first_only=first_only)
+    if len(tokens) == 0:
+        return result
+    codes, vocab = pd.factorize(tokens)
+    if unique_per_row:
+        pair_keys = rows * len(vocab) + codes
+        _, first = np.unique(pair_keys, return_index=True)
+        keep = np.sort(first)
+        rows, codes = rows[keep], codes[keep]
+    key_codes, keys = pd.factorize(np.asarray(groups, dtype=np.int64)[rows] * len(vocab) + codes)
+    sums = np.bincount(key_codes, weights=weights[rows], minlength=len(keys))
+    for key, total in zip(keys, sums):
+        group, tok = divmod(int(key), len(vocab))
+        result[group][vocab[tok]] = float(total)
+    return result
+
+
+def weighted_token_sums(values, weights, unique_per_row=False, first_only=False):
+    """Single-group grouped_token_sums: sums row weights per token, returning {token: weight}."""
+    groups = np.zeros(len(weights), dtype=np.int64)
+    return grouped_token_sums(groups, 1, values, weights, unique_per_row=unique_per_row, first_only=first_only)[0]
+
+
+def grouped_complexity_weights(groups, n_groups, complexity, weights):
+    """
+    Sums row weights into the four complexity buckets per group (Light < 2.0 <= Medium-Light
+    <= 2.8 < Medium-Heavy <= 3.5 < Heavy). Returns (list of weight dicts, list of whether
+    the group had any row with complexity).
+
+    Each running total is rounded to 2 decimals after every row, in row order, exactly as the
+    per-row profile loop did, so cached and recomputed profiles stay value-identical.
+    """
+    comp = pd.to_numeric(pd.Series(complexity), errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = ~np.isnan(comp)
+    groups = np.asarray(groups, dtype=np.int64)[valid]
+    c = comp[valid]
+    bucket_idx = np.select([c < 2.0, c <= 2.8, c <= 3.5], [0, 1, 2], default=3)
+    results = [empty_complexity_weights() for _ in range(n_groups)]
+    has_data = [False] * n_groups
+    for g, b, w in zip(groups.tolist(), bucket_idx.tolist(), np.asarray(weights)[valid].tolist()):
+        name = COMPLEXITY_BUCKETS[b]
+        results[g][name] = round(results[g][name] + w, 2)
+        has_data[g] = True
+    return results, has_data
+
+
+def complexity_bucket_weights(complexity, weights):
+    """Single-group grouped_complexity_weights: returns (weights dict, whether any row had complexity)."""
+    groups = np.zeros(len(weights), dtype=np.int64)
+    results, has_data = grouped_complexity_weights(groups, 1, complexity, weights)
+    return results[0], has_data[0]
+
+
+def _build_profiles(groups, n_groups, game_ids, user_ratings, catalog_df):
+    """Builds n_groups taste profiles from parallel (group code, game id, user rating) arrays."""
+    profiles = [{
+        "mech_weights": {},
+        "cat_weights": {},
+        "designer_weights": {},
+        "publisher_weights": {},
+        "complexity_weights": empty_complexity_weights(),
+    } for _ in range(n_groups)]
+
+    catalog_cols = [c for c in ('id', 'mechanics', 'categories', 'designers', 'publishers', 'complexity')
+                    if c in catalog_df.columns]
+    user_games = pd.DataFrame({
+        'group': np.asarray(groups, dtype=np.int64),
+        'id': pd.Series(game_ids).astype(str).to_numpy(),
+        'user_rating': np.asarray(user_ratings),
+    })
+    joined = user_games.merge(catalog_df[catalog_cols], on='id', how='inner')
+
+    has_complexity = [False] * n_groups
+    if not joined.empty:
+        g = joined['group'].to_numpy()
+        weights = rating_weights(joined['user_rating'])
+        token_columns = (
+            ('mechanics', 'mech_weights', dict(unique_per_row=True)),
+            ('categories', 'cat_weights', dict(unique_per_row=True)),
+            ('designers', 'designer_weights', {}),
+            ('publishers', 'publisher_weights', dict(first_only=True)),
+        )
+        for col, key, opts in token_columns:
+            if col in joined.columns:
+                for profile, sums in zip(profiles, grouped_token_sums(g, n_groups, joined[col], weights, **opts)):
+                    profile[key] = sums
+        if 'complexity' in joined.columns:
+            buckets, has_complexity = grouped_complexity_weights(g, n_groups, joined['complexity'], weights)
+            for profile, b in zip(profiles, buckets):
+                profile["complexity_weights"] = b
+
+    for profile, has_data in zip(profiles, has_complexity):
+        if not has_data:
+            profile["complexity_weights"]["Medium-Light"] = 1.0
+    return profiles
+
+
+def build_taste_profile(liked_games, catalog_df):
+    """
+    Builds a taste profile from a user's liked games (rows with 'id' and the user's 'rating').
+    catalog_df ids must already be strings.
+
+    Each liked game found in the catalog contributes its rating weight to every distinct
+    mechanic and category, every listed designer, its primary (first-listed) publisher, and
+    its complexity bucket. Complexity weights are summed per bucket; when no liked game has
+    complexity data the profile defaults to {"Medium-Light": 1.0}.
+
+    Returns a dict with mech_weights, cat_weights, designer_weights, publisher_weights and
+    complexity_weights.
+    """
+    groups = np.zeros(len(liked_games), dtype=np.int64)
+    return _build_profiles(groups, 1, liked_games['id'], liked_games['rating'], catalog_df)[0]
+
+
+def build_taste_profiles(liked_games, catalog_df, user_column='username'):
+    """
+    Builds taste profiles for many users in one pass. liked_games stacks every user's liked
+    games (e.g. from select_liked_games_by_user) with a user_column naming the owner.
+
+    Returns {username: profile}, each profile identical to build_taste_profile on that
+    user's rows alone.
+    """
+    codes, users = pd.factorize(liked_games[user_column])
+    profiles = _build_profiles(codes, len(users), liked_games['id'], liked_games['rating'], catalog_df)
+    return dict(zip(users, profiles))
@@ -1,11 +1,17 @@
 import os
 import io
+import hashlib
+import itertools
+import json
+from datetime import datetime, timezone
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 import boto3
 import gc
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from botocore.config import Config
+from botocore.exceptions import ClientError
 
 # Initialize Structured Logging with AWS Lambda Powertools or Fallback
 try:
@@ -63,6 +69,27 @@ TARGET_SCHEMA = pa.schema([
     ('suggested_players_recommended', pa.list_(pa.string()))
 ])
 
+# Serving layout of the aligned catalog: sorted so row-group statistics are tight on the
+# sort column (e.g. rating >= 5.0 skips the tail), small row groups for finer pushdown, and
+# dictionary encoding for the low-cardinality string/list-of-string columns.
+SERVING_SORT_COLUMN = os.environ.get('SERVING_SORT_COLUMN', 'rating')
+SERVING_ROW_GROUP_SIZE = int(os.environ.get('SERVING_ROW_GROUP_SIZE', '8192'))
+DICTIONARY_COLUMNS = (
+    'type', 'categories', 'mechanics', 'designers', 'publishers',
+    'suggested_players_best', 'suggested_players_recommended'
+)
+
+# Per-game index written next to the catalog: which raw object each game came from, when that
+# object was written, and a hash of the game's catalog row. Readers (reprocess planner,
+# crawler) load this one small object instead of paginating every raw key.
+MANIFEST_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('key', pa.string()),
+    ('size', pa.int64()),
+    ('last_modified', pa.timestamp('ms', tz='UTC')),
+    ('row_hash', pa.string())
+])
+
 def align_table_to_schema(table, target_schema):
     """
     Align a PyArrow Table's columns and types with a target schema.
@@ -118,6 +145,324 @@ def download_and_parse(s3_client, bucket_name, key):
         logger.error(f"Error parsing S3 object at {key}: {e}")
         return None
 
+def list_raw_objects(s3_client, bucket_name, raw_prefix, output_filename):
+    """Lists raw Parquet objects under raw_prefix as (key, LastModified, Size) tuples, skipping the output file."""
+    logger.info(f"Listing all raw Parquet files from {bucket_name}/{raw_prefix}")
+    paginator = s3_client.get_paginator('list_objects_v2')
+    pages = paginator.paginate(Bucket=bucket_name, Prefix=raw_prefix)
+
+    objects = []
+    for page in pages:
+        if 'Contents' in page:
+            for obj in page['Contents']:
+                key = obj['Key']
+                if key.endswith('.parquet') and not key.endswith(output_filename):
+                    objects.append((key, obj.get('LastModified'), obj.get('Size')))
+    return objects
+
+def keys_in_write_order(objects):
+    """Orders (key, LastModified, ...) tuples oldest first (unknown times first), so later writers win dedup/upserts."""
+    oldest = datetime.min.replace(tzinfo=timezone.utc)
+    return [item[0] for item in sorted(objects, key=lambda item: item[1] or oldest)]
+
+def watermark_key(combined_prefix, output_filename):
+    """S3 key of the JSON watermark recording the newest raw object merged into output_filename."""
+    stem = output_filename[:-8] if output_filename.endswith('.parquet') else output_filename
+    return f"{combined_prefix}{stem}.watermark.json"
+
+def manifest_key(combined_prefix, output_filename):
+    """S3 key of the id -> raw object manifest written alongside output_filename."""
+    stem = output_filename[:-8] if output_filename.endswith('.parquet') else output_filename
+    return f"{combined_prefix}{stem}.manifest.parquet"
+
+def merged_watermark(objects, failed_keys):
+    """
+    Returns the watermark to store after a run: the newest LastModified listed, or, when some
+    raw files failed, the oldest failed LastModified so the next incremental run (which merges
+    LastModified >= watermark) picks them up again. Returns None when no safe watermark exists
+    (nothing has a LastModified, or a failed file has none).
+    """
+    last_modified = dict((key, lm) for key, lm, *_ in objects)
+    if failed_keys:
+        failed_times = [last_modified.get(key) for key in failed_keys]
+        if any(lm is None for lm in failed_times):
+            return None
+        return min(failed_times)
+    modified_times = [lm for lm in last_modified.values() if lm is not None]
+    return max(modified_times) if modified_times else None
+
+def read_watermark(s3_client, bucket_name, key):
+    """Returns the stored watermark as an aware datetime, or None if none has been written yet."""
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=key)
+        with response['Body'] as stream:
+            data = json.loads(stream.read())
+        return datetime.fromisoformat(data['last_modified'])
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+
+def write_watermark(s3_client, bucket_name, key, last_modified, num_rows, mode, duplicates_dropped=0):
+    body = {
+        "last_modified": last_modified.isoformat(),
+        "num_rows": num_rows,
+        "duplicates_dropped": duplicates_dropped,
+        "mode": mode,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    s3_client.put_object(Bucket=bucket_name, Key=key, Body=json.dumps(body).encode('utf-8'),
+                         ContentType='application/json')
+
+def iter_compacted_chunks(s3_client, bucket_name, keys, apply_schema_alignment, max_workers, chunk_size=10000,
+                          id_sources=None, failed_keys=None):
+    """
+    Downloads the given raw Parquet keys in chunks with a thread pool and yields one
+    consolidated table per chunk, in key order. Chunks where every file failed are skipped.
+    When id_sources is a dict it is filled with id -> key of the last file containing that id;
+    when failed_keys is a list the keys that could not be downloaded or parsed are appended.
+    """
+    num_files = len(keys)
+
+    logger.info(f"Downloading and merging {num_files} files in chunks of {chunk_size} using ThreadPoolExecutor with {max_workers} workers...", extra={
+        "apply_schema_alignment": apply_schema_alignment
+    })
+
+    for chunk_start in range(0, num_files, chunk_size):
+        chunk_keys = keys[chunk_start:chunk_start + chunk_size]
+        logger.info(f"Processing chunk {chunk_start // chunk_size + 1}: files {chunk_start} to {chunk_start + len(chunk_keys)}")
+
+        # Keep tables in key order so later keys win when deduplicating/upserting
+        chunk_tables = [None] * len(chunk_keys)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_index = {
+                executor.submit(download_and_parse, s3_client, bucket_name, key): i
+                for i, key in enumerate(chunk_keys)
+            }
+
+            for future in as_completed(future_to_index):
+                i = future_to_index[future]
+                try:
+                    table = future.result()
+                    if table is not None:
+                        # Apply game-catalog schema alignment only when configured
+                        if apply_schema_alignment:
+                            table = align_table_to_schema(table, TARGET_SCHEMA)
+                        chunk_tables[i] = table
+                except Exception as e:
+                    logger.error(f"Future execution failed for {chunk_keys[i]}: {e}")
+
+        if failed_keys is not None:
+            failed_keys.extend(key for key, table in zip(chunk_keys, chunk_tables) if table is None)
+        if id_sources is not None:
+            for key, table in zip(chunk_keys, chunk_tables):
+                if table is not None and 'id' in table.column_names:
+                    for game_id in table.column('id').to_pylist():
+                        id_sources[game_id] = key
+
+        chunk_tables = [t for t in chunk_tables if t is not None]
+        # Consolidate this chunk's tables immediately to release single-row table metadata memory
+        if chunk_tables:
+            # promote_options='default' resolves type mismatches (e.g. string vs large_string)
+            # that arise from different pandas/pyarrow versions writing the same column differently.
+            consolidated = pa.concat_tables(chunk_tables, promote_options='default')
+            chunk_tables = []  # Clear references for garbage collection
+            yield consolidated
+
+def compact_keys(s3_client, bucket_name, keys, apply_schema_alignment, max_workers, chunk_size=10000,
+                 id_sources=None, failed_keys=None):
+    """
+    Downloads and merges the given raw Parquet keys into one in-memory table.
+    Returns the merged table, or None if every download/parse failed.
+    """
+    master_tables = list(iter_compacted_chunks(s3_client, bucket_name, keys, apply_schema_alignment,
+                                               max_workers, chunk_size, id_sources, failed_keys))
+    if not master_tables:
+        return None
+
+    logger.info("Merging consolidated tables into final master table...")
+    merged = pa.concat_tables(master_tables, promote_options='default')
+    del master_tables
+    gc.collect()
+    return merged
+
+def upsert_table(previous, delta, key_column):
+    """
+    Replaces every row of previous whose key_column value appears in delta with delta's rows.
+    With key 'id' this upserts games; with 'username' it replaces a user's whole collection.
+    """
+    delta_keys = pc.unique(delta.column(key_column))
+    keep = pc.invert(pc.is_in(previous.column(key_column), value_set=delta_keys))
+    return pa.concat_tables([previous.filter(keep), delta], promote_options='default')
+
+def download_previous_output(s3_client, bucket_name, key, local_path):
+    """Downloads the previously compacted file to local_path. Returns False if it does not exist."""
+    try:
+        s3_client.download_file(bucket_name, key, local_path)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return False
+        raise
+    return True
+
+def iter_previous_rows(local_path, schema, key_column, exclude_keys, batch_size=10000):
+    """
+    Yields the previously compacted file batch by batch, aligned to schema, without the
+    rows whose key_column value is in exclude_keys (the keys being upserted).
+    """
+    parquet_file = pq.ParquetFile(local_path)
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        table = pa.Table.from_batches([batch])
+        keep = pc.invert(pc.is_in(table.column(key_column), value_set=exclude_keys))
+        yield align_table_to_schema(normalize_string_types(table.filter(keep)), schema)
+
+def write_streaming(tables, output_path, schema):
+    """
+    Writes an iterable of tables matching schema to one Snappy-compressed Parquet file, each
+    table as its own row group(s). Only the table being written is held in memory, so peak
+    memory follows one chunk instead of the whole output. Returns the number of rows written.
+    """
+    num_rows = 0
+    with pq.ParquetWriter(output_path, schema, compression="snappy") as writer:
+        for table in tables:
+            if table.num_rows:
+                writer.write_table(table)
+                num_rows += table.num_rows
+    return num_rows
+
+def last_writer_indices(keys):
+    """
+    Returns the row indices (ascending) that keep only the last occurrence of each key.
+    Rows are expected in write order, so the most recently written row per key wins.
+    """
+    rows = pa.table({'key': keys, 'row': pa.array(range(len(keys)), type=pa.int64())})
+    last = rows.group_by('key', use_threads=False).aggregate([('row', 'max')]).column('row_max').combine_chunks()
+    return last.take(pc.array_sort_indices(last))
+
+def gather_rows(parquet_file, indices, row_group_offsets):
+    """
+    Returns the rows of parquet_file at the given global row indices, in that order, reading
+    one source row group at a time and keeping only the rows it contributes.
+    """
+    pieces, positions = [], []
+    for i in range(parquet_file.metadata.num_row_groups):
+        lo, hi = row_group_offsets[i], row_group_offsets[i + 1]
+        mask = pc.and_(pc.greater_equal(indices, lo), pc.less(indices, hi))
+        if not pc.any(mask).as_py():
+            continue
+        local = pc.subtract(pc.filter(indices, mask), lo)
+        pieces.append(parquet_file.read_row_group(i).take(local))
+        positions.append(pc.indices_nonzero(mask))
+    gathered = pa.concat_tables(pieces)
+    return gathered.take(pc.sort_indices(pa.chunked_array(positions, type=pa.uint64())))
+
+def write_serving_layout(staging_path, output_path, sort_column=SERVING_SORT_COLUMN,
+                         row_group_size=SERVING_ROW_GROUP_SIZE, dedup_column='id'):
+    """
+    Rewrites the staged catalog in its serving layout: one row per dedup_column value (the
+    last staged row wins, so stage rows oldest first), sorted by sort_column descending
+    (nulls last, recorded as sorting_columns metadata), row groups of row_group_size rows,
+    dictionary encoding for DICTIONARY_COLUMNS, and column statistics plus a page index so
+    readers can skip row groups and pages with predicate pushdown.
+
+    Dedup and sort read only the dedup_column and sort_column columns. Each output row group
+    is then gathered from the staged row groups that hold its rows, so peak memory is those
+    two columns for the whole catalog plus one staged and one output row group; the cost is
+    that a staged row group is re-read for every output row group that draws from it.
+    Returns (rows written, duplicate rows dropped).
+    """
+    staged = pq.ParquetFile(staging_path)
+    schema = staged.schema_arrow
+    dictionary_paths = [staged.schema.column(i).path for i in range(len(staged.schema))
+                        if staged.schema.column(i).path.split('.')[0] in DICTIONARY_COLUMNS]
+    index_columns = [c for c in dict.fromkeys([dedup_column, sort_column]) if c in schema.names]
+    index = pq.read_table(staging_path, columns=index_columns)
+    total_rows = staged.metadata.num_rows
+
+    keep = None
+    duplicates = 0
+    if dedup_column in index.column_names:
+        keep = last_writer_indices(index.column(dedup_column))
+        duplicates = total_rows - len(keep)
+        if duplicates:
+            logger.warning(f"Dropped {duplicates} duplicate '{dedup_column}' rows (last writer wins)")
+        else:
+            keep = None
+
+    sorting_columns = None
+    order = keep
+    if sort_column in index.column_names:
+        values = index.column(sort_column)
+        if keep is not None:
+            values = values.take(keep)
+        order = pc.array_sort_indices(values, order='descending', null_placement='at_end')
+        if keep is not None:
+            order = keep.take(order)
+        sorting_columns = pq.SortingColumn.from_ordering(
+            schema, [(sort_column, 'descending')], null_placement='at_end')
+    del index
+
+    row_group_offsets = [0]
+    for i in range(staged.metadata.num_row_groups):
+        row_group_offsets.append(row_group_offsets[-1] + staged.metadata.row_group(i).num_rows)
+
+    num_rows = total_rows if order is None else len(order)
+    with pq.ParquetWriter(output_path, schema, compression="snappy",
+                          use_dictionary=dictionary_paths, write_statistics=True,
+                          write_page_index=True, sorting_columns=sorting_columns) as writer:
+        if order is None:
+            for batch in staged.iter_batches(batch_size=row_group_size):
+                writer.write_table(pa.Table.from_batches([batch], schema=schema), row_group_size=row_group_size)
+        else:
+            for start in range(0, num_rows, row_group_size):
+                row_group = gather_rows(staged, order[start:start + row_group_size], row_group_offsets)
+                writer.write_table(row_group, row_group_size=row_group_size)
+    return num_rows, duplicates
+
+def row_hashes(table):
+    """Returns a short, stable content hash for every row of table (detects changed games between runs)."""
+    return [
+        hashlib.blake2b(json.dumps(row, sort_keys=True, default=str, separators=(',', ':')).encode('utf-8'),
+                        digest_size=8).hexdigest()
+        for row in table.to_pylist()
+    ]
+
+def read_manifest_sources(s3_client, bucket_name, key, local_path):
+    """Returns id -> raw key from a previously written manifest, or {} if there is none or it is unreadable."""
+    try:
+        if not download_previous_output(s3_client, bucket_name, key, local_path):
+            return {}
+        table = pq.read_table(local_path, columns=['id', 'key'])
+        return dict(zip(table.column('id').to_pylist(), table.column('key').to_pylist()))
+    except Exception as e:
+        logger.warning(f"Could not read previous manifest {key}; rebuilding sources from the listing: {e}")
+        return {}
+    finally:
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+def build_manifest(catalog_path, objects, id_sources, raw_prefix, batch_size=10000):
+    """
+    Builds the manifest for a written catalog: one row per catalog id with the raw object it
+    was compacted from (id_sources, else the per-game <raw_prefix><id>.parquet if listed), that
+    object's size and LastModified from the listing, and the hash of the catalog row.
+    """
+    listed = {key: (last_modified, size) for key, last_modified, size in objects}
+    columns = {name: [] for name in MANIFEST_SCHEMA.names}
+    for batch in pq.ParquetFile(catalog_path).iter_batches(batch_size=batch_size):
+        table = pa.Table.from_batches([batch])
+        for game_id, row_hash in zip(table.column('id').to_pylist(), row_hashes(table)):
+            key = id_sources.get(game_id)
+            if key is None and f"{raw_prefix}{game_id}.parquet" in listed:
+                key = f"{raw_prefix}{game_id}.parquet"
+            last_modified, size = listed.get(key, (None, None))
+            columns['id'].append(game_id)
+            columns['key'].append(key)
+            columns['size'].append(size)
+            columns['last_modified'].append(last_modified)
+            columns['row_hash'].append(row_hash)
+    return pa.table(columns, schema=MANIFEST_SCHEMA)
+
 @logger.inject_lambda_context
 def lambda_handler(event, context):
     # Event payload takes precedence over env vars, allowing EventBridge to
@@ -132,13 +477,23 @@ def lambda_handler(event, context):
     else:
         apply_schema_alignment = bool(apply_schema_alignment_val)
     aws_region = event.get('aws_region') or os.environ.get('AWS_REGION', 'us-east-1')
+    # 'full' rebuilds from every raw file; 'incremental' merges only raw files changed since the watermark
+    mode = (event.get('mode') or os.environ.get('COMPACTION_MODE', 'full')).lower()
+    upsert_key = event.get('upsert_key') or os.environ.get('UPSERT_KEY', 'id')
     
     logger.info("Starting optimized multithreaded S3 Parquet compaction", extra={
         "bucket_name": bucket_name,
         "raw_prefix": raw_prefix,
-        "combined_prefix": combined_prefix
+        "combined_prefix": combined_prefix,
+        "mode": mode
     })
     
+    previous_path = f"/tmp/previous_{output_filename}"
+    staging_path = f"/tmp/staging_{output_filename}"
+    manifest_path = f"/tmp/manifest_{output_filename}"
+    has_previous = False
+    id_sources = {}
+    failed_keys = []
     try:
         # Configure custom connection pool size for boto3 to match ThreadPoolExecutor max_workers
         max_workers = 80
@@ -147,106 +502,121 @@ def lambda_handler(event, context):
             retries={'max_attempts': 5, 'mode': 'standard'}
         )
         s3_client = boto3.client('s3', region_name=aws_region, config=config)
+        output_key = f"{combined_prefix}{output_filename}"
+        output_file_path = f"/tmp/{output_filename}"
+        watermark_s3_key = watermark_key(combined_prefix, output_filename)
+        manifest_s3_key = manifest_key(combined_prefix, output_filename)
         
-        # Paginate S3 objects
-        logger.info(f"Listing all raw Parquet files from {bucket_name}/{raw_prefix}")
-        paginator = s3_client.get_paginator('list_objects_v2')
-        pages = paginator.paginate(Bucket=bucket_name, Prefix=raw_prefix)
-        
-        keys = []
-        for page in pages:
-            if 'Contents' in page:
-                for obj in page['Contents']:
-                    key = obj['Key']
-                    if key.endswith('.parquet') and not key.endswith(output_filename):
-                        keys.append(key)
-                        
-        num_files = len(keys)
-        logger.info(f"Found {num_files} raw Parquet files to compact.")
+        objects = list_raw_objects(s3_client, bucket_name, raw_prefix, output_filename)
+        logger.info(f"Found {len(objects)} raw Parquet files.")
         
-        if num_files == 0:
+        if not objects:
             return {
                 'statusCode': 200,
                 'body': "No files found to compact."
             }
-            
-        master_tables = []
-        chunk_size = 10000
-        
-        logger.info(f"Downloading and merging {num_files} files in chunks of {chunk_size} using ThreadPoolExecutor with {max_workers} workers...", extra={
-            "apply_schema_alignment": apply_schema_alignment,
-            "output_filename": output_filename
-        })
         
-        for chunk_start in range(0, num_files, chunk_size):
-            chunk_keys = keys[chunk_start:chunk_start + chunk_size]
-            logger.info(f"Processing chunk {chunk_start // chunk_size + 1}: files {chunk_start} to {chunk_start + len(chunk_keys)}")
-            
-            chunk_tables = []
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                future_to_key = {
-                    executor.submit(download_and_parse, s3_client, bucket_name, key): key
-                    for key in chunk_keys
-                }
-                
-                for future in as_completed(future_to_key):
-                    key = future_to_key[future]
-                    try:
-                        table = future.result()
-                        if table is not None:
-                            # Apply game-catalog schema alignment only when configured
-                            if apply_schema_alignment:
-                                table = align_table_to_schema(table, TARGET_SCHEMA)
-                            chunk_tables.append(table)
-                    except Exception as e:
-                        logger.error(f"Future execution failed for {key}: {e}")
-            
-            # Consolidate this chunk's tables immediately to release single-row table metadata memory
-            if chunk_tables:
-                # promote_options='default' resolves type mismatches (e.g. string vs large_string)
-                # that arise from different pandas/pyarrow versions writing the same column differently.
-                consolidated = pa.concat_tables(chunk_tables, promote_options='default')
-                master_tables.append(consolidated)
-                chunk_tables = []  # Clear references for garbage collection
-                
-        if not master_tables:
-            raise ValueError("All raw Parquet file downloads and parses failed.")
-            
-        logger.info("Merging consolidated tables into final master table...")
-        final_table = pa.concat_tables(master_tables, promote_options='default')
+        if mode == 'incremental':
+            watermark = read_watermark(s3_client, bucket_name, watermark_s3_key)
+            if watermark is not None:
+                has_previous = download_previous_output(s3_client, bucket_name, output_key, previous_path)
+            if not has_previous:
+                logger.warning("No watermark or previous output found; falling back to a full rebuild.")
+                mode = 'full'
+            else:
+                # >= rather than >: re-merging a file written in the watermark's second is harmless,
+                # missing one is not. Oldest first so the newest copy of a key wins the upsert.
+                keys = keys_in_write_order([obj for obj in objects if obj[1] is None or obj[1] >= watermark])
+                logger.info(f"Incremental compaction: {len(keys)} raw files changed since {watermark.isoformat()}")
+                if not keys:
+                    return {
+                        'statusCode': 200,
+                        'body': f"No raw files changed since {watermark.isoformat()}; {output_filename} is up to date."
+                    }
         
-        logger.info("Merge complete", extra={
-            "num_rows": final_table.num_rows,
-            "num_columns": final_table.num_columns
-        })
+        if mode == 'full':
+            keys = keys_in_write_order(objects)
         
-        # Write back to S3 as a single snappy-compressed Parquet file via /tmp to save RAM
-        output_file_path = "/tmp/catalog.parquet"
         logger.info(f"Writing Snappy-compressed combined Parquet file to {output_file_path}")
-        
-        # Explicitly clear master_tables and force GC to free up memory before writing
-        del master_tables
+        duplicates = 0
+        if apply_schema_alignment:
+            # Fixed target schema: stream each aligned chunk straight into a ParquetWriter
+            if has_previous:
+                # Unchanged games keep the source recorded by the last run's manifest
+                id_sources = read_manifest_sources(s3_client, bucket_name, manifest_s3_key, manifest_path)
+                delta = compact_keys(s3_client, bucket_name, keys, apply_schema_alignment, max_workers,
+                                     id_sources=id_sources, failed_keys=failed_keys)
+                if delta is None:
+                    raise ValueError("All raw Parquet file downloads and parses failed.")
+                delta_keys = pc.unique(delta.column(upsert_key))
+                tables = itertools.chain(
+                    iter_previous_rows(previous_path, TARGET_SCHEMA, upsert_key, delta_keys), [delta])
+            else:
+                tables = iter_compacted_chunks(s3_client, bucket_name, keys, apply_schema_alignment, max_workers,
+                                               id_sources=id_sources, failed_keys=failed_keys)
+            num_rows = write_streaming(tables, staging_path, TARGET_SCHEMA)
+            if num_rows == 0 and not has_previous:
+                raise ValueError("All raw Parquet file downloads and parses failed.")
+            # Dedup by id (last writer wins) and re-sort the staged chunks into the serving layout
+            logger.info(f"Writing serving layout sorted by {SERVING_SORT_COLUMN} with {SERVING_ROW_GROUP_SIZE}-row groups")
+            num_rows, duplicates = write_serving_layout(staging_path, output_file_path)
+            # The manifest only indexes raw objects, so it is safe to publish before the catalog
+            try:
+                manifest = build_manifest(output_file_path, objects, id_sources, raw_prefix)
+                pq.write_table(manifest, manifest_path, compression="snappy")
+                s3_client.upload_file(Filename=manifest_path, Bucket=bucket_name, Key=manifest_s3_key)
+                logger.info(f"Uploaded manifest of {manifest.num_rows} games to s3://{bucket_name}/{manifest_s3_key}")
+            except Exception as e:
+                logger.warning(f"Failed to write catalog manifest {manifest_s3_key}: {e}")
+        else:
+            # Without a target schema the output schema is only known once every chunk has been
+            # promoted together, so unaligned outputs (user collections) are merged in memory
+            final_table = compact_keys(s3_client, bucket_name, keys, apply_schema_alignment, max_workers,
+                                       failed_keys=failed_keys)
+            if final_table is None:
+                raise ValueError("All raw Parquet file downloads and parses failed.")
+            if has_previous:
+                previous = normalize_string_types(pq.read_table(previous_path))
+                final_table = upsert_table(previous, final_table, upsert_key)
+                del previous
+            num_rows = final_table.num_rows
+            pq.write_table(final_table, output_file_path, compression="snappy")
+            del final_table
         gc.collect()
         
-        pq.write_table(final_table, output_file_path, compression="snappy")
+        logger.info("Merge complete", extra={
+            "num_rows": num_rows,
+            "duplicates_dropped": duplicates,
+            "mode": mode
+        })
         
         # Upload using upload_file (highly memory efficient streaming from disk)
-        logger.info(f"Uploading combined Parquet file to s3://{bucket_name}/{combined_prefix}{output_filename}")
+        logger.info(f"Uploading combined Parquet file to s3://{bucket_name}/{output_key}")
         s3_client.upload_file(
             Filename=output_file_path,
             Bucket=bucket_name,
-            Key=f"{combined_prefix}{output_filename}"
+            Key=output_key
         )
         
         # Clean up local file
         if os.path.exists(output_file_path):
             os.remove(output_file_path)
+        
+        # Record the newest merged raw object only after the output is safely uploaded. Files that
+        # failed to download hold the watermark back so a later incremental run retries them.
+        new_watermark = merged_watermark(objects, failed_keys)
+        if failed_keys:
+            logger.warning(f"{len(failed_keys)} raw files could not be merged; watermark held at "
+                           f"{new_watermark.isoformat() if new_watermark else 'its previous value'}")
+        if new_watermark is not None:
+            write_watermark(s3_client, bucket_name, watermark_s3_key, new_watermark, num_rows, mode, duplicates)
             
         logger.info("S3 Parquet compaction completed successfully")
         
         return {
             'statusCode': 200,
-            'body': f"Successfully compacted {final_table.num_rows} records into {output_filename}"
+            'body': f"Successfully compacted {num_rows} records into {output_filename}"
+                    + (f" ({duplicates} duplicate ids dropped)" if duplicates else "")
         }
         
     except Exception as e:
@@ -255,6 +625,10 @@ def lambda_handler(event, context):
             'statusCode': 500,
             'body': f"Compaction failed: {e}"
         }
+    finally:
+        for path in (previous_path, staging_path, manifest_path):
+            if os.path.exists(path):
+                os.remove(path)
 
 if __name__ == '__main__':
     os.environ['S3_BUCKET_NAME'] = 'boardgame-app'
@@ -1,15 +1,20 @@
+import io
 import json
-import requests
 import xml.etree.ElementTree as ET
 import os
 import random
-import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 import pandas as pd
 import pyarrow
 import pyarrow.parquet as pq
 import boto3
 
+import bgg_http
+import bgg_rate_limiter
+
 # Initialize Structured Logging with AWS Lambda Powertools or Fallback
 try:
     from aws_lambda_powertools import Logger
@@ -48,6 +53,13 @@ BGG_API_BASE_URL = "https://boardgamegeek.com/xmlapi2/thing"
 # S3 output bucket name (get from environment variable)
 S3_OUTPUT_BUCKET_NAME = os.environ.get('S3_OUTPUT_BUCKET_NAME', 'boardgame-app')
 
+# Raw output layout: 'per_game' writes data/boardgames/{id}.parquet per game; 'batch' writes every
+# game fetched in one SQS batch as a single multi-row parquet under data/boardgames/batches/
+RAW_OUTPUT_MODE = os.environ.get('RAW_OUTPUT_MODE', 'per_game')
+
+# Per-game parquet uploads run on this many threads while the next BGG request is paced
+UPLOAD_MAX_WORKERS = int(os.environ.get('UPLOAD_MAX_WORKERS', '8'))
+
 # Sentinel to distinguish "fetch failed" from "not found"
 GAME_FETCH_FAILED = object()
 
@@ -83,81 +95,154 @@ def _get_element_value(element, xpath, attribute='value', default=None):
         return found_element.get(attribute, default)
     return default
 
-def _get_element_text(element, xpath, default=None):
-    """Helper to safely get text from an XML element."""
-    found_element = element.find(xpath)
-    if found_element is not None and found_element.text is not None:
-        return found_element.text.strip().replace('&#10;', ' ')
-    return default
+# Direct <item> children holding a single integer value attribute -> output field
+_INT_FIELDS = {
+    'yearpublished': 'year_published',
+    'minplayers': 'min_players',
+    'maxplayers': 'max_players',
+    'playingtime': 'playing_time',
+    'minplaytime': 'min_playtime',
+    'maxplaytime': 'max_playtime',
+    'minage': 'min_age',
+}
+
+# <link type="..."> values collected into list fields
+_LINK_FIELDS = {
+    'boardgamecategory': 'categories',
+    'boardgamemechanic': 'mechanics',
+    'boardgamedesigner': 'designers',
+    'boardgamepublisher': 'publishers',
+}
+
+
+def _safe_int(val):
+    try:
+        return int(val) if val is not None else None
+    except (ValueError, TypeError):
+        return None
+
+
+def _safe_float(val):
+    try:
+        return float(val) if val is not None else None
+    except (ValueError, TypeError):
+        return None
+
+
+def _suggested_players(poll):
+    """Returns (best, recommended) player counts from a suggested_numplayers <poll>."""
+    best_players = []
+    rec_players = []
+    for results in poll.findall('results'):
+        num_players = results.get('numplayers')
+        best_votes = rec_votes = not_rec_votes = 0
+        for result in results.findall('result'):
+            val = result.get('value')
+            votes = _safe_int(result.get('numvotes', 0)) or 0
+            if val == 'Best':
+                best_votes = votes
+            elif val == 'Recommended':
+                rec_votes = votes
+            elif val == 'Not Recommended':
+                not_rec_votes = votes
+        total_votes = best_votes + rec_votes + not_rec_votes
+        if total_votes > 0:
+            if best_votes > rec_votes and best_votes > not_rec_votes:
+                best_players.append(num_players)
+            if (best_votes + rec_votes) > not_rec_votes:
+                rec_players.append(num_players)
+    return best_players, rec_players
+
+
+def _first_rating(statistics, item, name):
+    """Value of the first statistics/ratings/{name}, checking direct <statistics> children before a full search."""
+    for stats in statistics:
+        found = stats.find(f'ratings/{name}')
+        if found is not None:
+            return found.get('value')
+    return _get_element_value(item, f".//statistics/ratings/{name}")
 
-def _get_links(item_element, link_type):
-    """Helper to get a list of values for a specific link type."""
-    links = []
-    for link in item_element.findall(f"./link[@type='{link_type}']"):
-        value = link.get('value')
-        if value:
-            links.append(value)
-    return links
 
 def _parse_item(item):
-    """Parse a single <item> XML element into a game data dict."""
-    def safe_int(val):
-        try:
-            return int(val) if val is not None else None
-        except (ValueError, TypeError):
-            return None
-
-    def safe_float(val):
-        try:
-            return float(val) if val is not None else None
-        except (ValueError, TypeError):
-            return None
+    """
+    Parse a single <item> XML element into a game data dict.
 
-    best_players = []
-    rec_players = []
-    poll = item.find(".//poll[@name='suggested_numplayers']")
-    if poll is not None:
-        for results in poll.findall('results'):
-            num_players = results.get('numplayers')
-            best_votes = rec_votes = not_rec_votes = 0
-            for result in results.findall('result'):
-                val = result.get('value')
-                votes = safe_int(result.get('numvotes', 0)) or 0
-                if val == 'Best':
-                    best_votes = votes
-                elif val == 'Recommended':
-                    rec_votes = votes
-                elif val == 'Not Recommended':
-                    not_rec_votes = votes
-            total_votes = best_votes + rec_votes + not_rec_votes
-            if total_votes > 0:
-                if best_votes > rec_votes and best_votes > not_rec_votes:
-                    best_players.append(num_players)
-                if (best_votes + rec_votes) > not_rec_votes:
-                    rec_players.append(num_players)
-
-    return {
+    Walks the item's direct children once, dispatching on tag, instead of running one
+    XPath search per field.
+    """
+    first = {}
+    links = {field: [] for field in _LINK_FIELDS.values()}
+    name = None
+    poll = None
+    statistics = []
+    for child in item:
+        tag = child.tag
+        if tag == 'link':
+            field = _LINK_FIELDS.get(child.get('type'))
+            value = child.get('value')
+            if field is not None and value:
+                links[field].append(value)
+        elif tag == 'name':
+            if name is None and child.get('type') == 'primary':
+                name = child
+        elif tag == 'poll':
+            if poll is None and child.get('name') == 'suggested_numplayers':
+                poll = child
+        elif tag == 'statistics':
+            statistics.append(child)
+        elif tag not in first:
+            first[tag] = child
+
+    if poll is None:
+        poll = item.find(".//poll[@name='suggested_numplayers']")
+    best_players, rec_players = _suggested_players(poll) if poll is not None else ([], [])
+
+    def text_of(tag):
+        elem = first.get(tag)
+        if elem is not None and elem.text is not None:
+            return elem.text.strip().replace('&#10;', ' ')
+        return None
+
+    data = {
         'id': item.get('id'),
         'type': item.get('type'),
-        'name': _get_element_value(item, "./name[@type='primary']"),
-        'year_published': safe_int(_get_element_value(item, 'yearpublished', attribute='value')),
-        'min_players': safe_int(_get_element_value(item, 'minplayers', attribute='value')),
-        'max_players': safe_int(_get_element_value(item, 'maxplayers', attribute='value')),
-        'playing_time': safe_int(_get_element_value(item, 'playingtime', attribute='value')),
-        'min_playtime': safe_int(_get_element_value(item, 'minplaytime', attribute='value')),
-        'max_playtime': safe_int(_get_element_value(item, 'maxplaytime', attribute='value')),
-        'min_age': safe_int(_get_element_value(item, 'minage', attribute='value')),
-        'rating': safe_float(_get_element_value(item, ".//statistics/ratings/bayesaverage", attribute='value')),
-        'complexity': safe_float(_get_element_value(item, ".//statistics/ratings/averageweight", attribute='value')),
-        'thumbnail': _get_element_text(item, 'thumbnail'),
-        'image': _get_element_text(item, 'image'),
-        'categories': _get_links(item, 'boardgamecategory'),
-        'mechanics': _get_links(item, 'boardgamemechanic'),
-        'designers': _get_links(item, 'boardgamedesigner'),
-        'publishers': _get_links(item, 'boardgamepublisher'),
+        'name': name.get('value') if name is not None else None,
+    }
+    for tag, field in _INT_FIELDS.items():
+        elem = first.get(tag)
+        data[field] = _safe_int(elem.get('value') if elem is not None else None)
+    data.update({
+        'rating': _safe_float(_first_rating(statistics, item, 'bayesaverage')),
+        'complexity': _safe_float(_first_rating(statistics, item, 'averageweight')),
+        'thumbnail': text_of('thumbnail'),
+        'image': text_of('image'),
+        **links,
         'suggested_players_best': best_players,
         'suggested_players_recommended': rec_players,
-    }
+    })
+    return data
+
+
+def iter_game_items(source):
+    """
+    Streams a BGG /thing response, yielding one game data dict per top-level <item>.
+
+    source is a file-like object (or path) holding the XML. Each item is parsed as soon as
+    its closing tag arrives and then dropped from the tree, so memory stays at one item
+    rather than the whole document.
+    """
+    root = None
+    depth = 0
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1 and elem.tag == 'item':
+            yield _parse_item(elem)
+            root.clear()
 
 
 def get_batch_game_data(game_ids, max_retries=5, base_delay=2):
@@ -183,17 +268,17 @@ def get_batch_game_data(game_ids, max_retries=5, base_delay=2):
     if bgg_api_token:
         headers["Authorization"] = f"Bearer {bgg_api_token}"
 
+    limiter = bgg_rate_limiter.get_limiter()
     for attempt in range(max_retries):
+        limiter.acquire()
         logger.info(f"Querying BGG API for {len(game_ids)} IDs (batch): {ids_str[:80]}... (Attempt {attempt + 1}/{max_retries})")
         try:
-            response = requests.get(api_url, headers=headers)
+            response = bgg_http.get(api_url, headers=headers)
+            limiter.record_response(response.status_code, response.headers.get('Retry-After'))
             response.raise_for_status()
-            root = ET.fromstring(response.content)
-
             results = {}
-            for item in root.findall('item'):
-                game_data = _parse_item(item)
-                item_id = item.get('id')
+            for game_data in iter_game_items(io.BytesIO(response.content)):
+                item_id = game_data['id']
                 results[item_id] = game_data
                 logger.info(f"Parsed game {item_id}: {game_data.get('name', '?')!r}")
 
@@ -206,7 +291,7 @@ def get_batch_game_data(game_ids, max_retries=5, base_delay=2):
                 delay = min(60, base_delay * (2 ** attempt))
                 jittered_delay = delay / 2.0 + random.uniform(0, delay / 2.0)
                 logger.info(f"Retrying in {jittered_delay:.2f} seconds...")
-                time.sleep(jittered_delay)
+                limiter.pause(jittered_delay)
             else:
                 logger.error(f"Max retries reached for batch. Marking all {len(game_ids)} as failed.")
                 return GAME_FETCH_FAILED
@@ -228,6 +313,33 @@ def get_game_data(game_id, max_retries=5, base_delay=2):
     return result.get(str(game_id), None)  # None if not found
 
 
+def write_game_parquet(gid, game_data):
+    """Writes a single game as data/boardgames/{gid}.parquet and returns its S3 path."""
+    s3_path = f"s3://{S3_OUTPUT_BUCKET_NAME}/data/boardgames/{gid}.parquet"
+    df = pd.DataFrame([game_data])
+    df.to_parquet(s3_path, index=False, engine='pyarrow', schema=_PARQUET_SCHEMA)
+    logger.info(f"Saved game {gid} ({game_data.get('name', '?')!r}) -> {s3_path}")
+    return s3_path
+
+
+def batch_output_path(now=None):
+    """S3 path of a multi-row batch parquet, partitioned by UTC scrape date."""
+    now = now or datetime.now(timezone.utc)
+    return (f"s3://{S3_OUTPUT_BUCKET_NAME}/data/boardgames/batches/dt={now:%Y-%m-%d}/"
+            f"{now:%H%M%S}-{uuid.uuid4().hex[:12]}.parquet")
+
+
+def write_batch_parquet(games):
+    """
+    Writes a list of game data dicts as one multi-row parquet and returns its S3 path.
+    Rows keep input order, so a later row for the same id wins during compaction.
+    """
+    s3_path = batch_output_path()
+    df = pd.DataFrame(games)
+    df.to_parquet(s3_path, index=False, engine='pyarrow', schema=_PARQUET_SCHEMA)
+    return s3_path
+
+
 @logger.inject_lambda_context
 def lambda_handler(event, context):
     """
@@ -235,7 +347,8 @@ def lambda_handler(event, context):
 
     Processes incoming game IDs in chunks of at most 20 IDs to respect BGG API limits.
     For each chunk, queries the BGG API in a single request and writes the returned
-    games to S3.
+    games to S3 (one parquet per game, or one parquet per SQS batch when
+    RAW_OUTPUT_MODE is 'batch').
     """
     logger.info("Received event", extra={"event": event})
 
@@ -250,6 +363,8 @@ def lambda_handler(event, context):
     processed_ids = []
     failed_ids = []
     batch_item_failures = []
+    batch_mode = RAW_OUTPUT_MODE == 'batch'
+    batched_games = []  # (game_id, game_data) pending the single batch write
 
     # Build a map of game_id -> record so we can attribute results back to messageIds
     id_to_record = {}
@@ -269,25 +384,28 @@ def lambda_handler(event, context):
             batch_item_failures.append({'itemIdentifier': record['messageId']})
 
     # --- Batch process game IDs in chunks of at most 20 ---
+    # BGG requests are paced by the shared rate limiter while per-game uploads run on a pool,
+    # so the S3 writes for one chunk overlap the wait before the next request.
     BGG_MAX_BATCH_SIZE = 20
+    uploads = []  # (game_id, Future) in message order
     if valid_game_ids:
-        for i in range(0, len(valid_game_ids), BGG_MAX_BATCH_SIZE):
-            chunk_ids = valid_game_ids[i:i + BGG_MAX_BATCH_SIZE]
-            logger.info(f"Processing chunk {i // BGG_MAX_BATCH_SIZE + 1}: {len(chunk_ids)} game IDs.")
-
-            batch_result = get_batch_game_data(chunk_ids)
+        with ThreadPoolExecutor(max_workers=UPLOAD_MAX_WORKERS) as upload_pool:
+            for i in range(0, len(valid_game_ids), BGG_MAX_BATCH_SIZE):
+                chunk_ids = valid_game_ids[i:i + BGG_MAX_BATCH_SIZE]
+                logger.info(f"Processing chunk {i // BGG_MAX_BATCH_SIZE + 1}: {len(chunk_ids)} game IDs.")
+                batch_result = get_batch_game_data(chunk_ids)
+
+                if batch_result is GAME_FETCH_FAILED:
+                    # Entire chunk failed (network/API error) — route all chunk IDs to DLQ
+                    logger.error(f"Batch API call failed for chunk. Routing all {len(chunk_ids)} IDs to DLQ.")
+                    for gid in chunk_ids:
+                        rec = id_to_record[str(gid)]
+                        failed_ids.append(gid)
+                        batch_item_failures.append({'itemIdentifier': rec['messageId']})
+                    continue
 
-            if batch_result is GAME_FETCH_FAILED:
-                # Entire chunk failed (network/API error) — route all chunk IDs to DLQ
-                logger.error(f"Batch API call failed for chunk. Routing all {len(chunk_ids)} IDs to DLQ.")
-                for gid in chunk_ids:
-                    rec = id_to_record[str(gid)]
-                    failed_ids.append(gid)
-                    batch_item_failures.append({'itemIdentifier': rec['messageId']})
-            else:
                 for gid in chunk_ids:
                     gid_str = str(gid)
-                    rec = id_to_record[gid_str]
 
                     if gid_str not in batch_result:
                         # Game not found on BGG — graceful skip, delete from queue
@@ -296,21 +414,31 @@ def lambda_handler(event, context):
                         continue
 
                     game_data = batch_result[gid_str]
-                    s3_path = f"s3://{S3_OUTPUT_BUCKET_NAME}/data/boardgames/{gid}.parquet"
-                    try:
-                        df = pd.DataFrame([game_data])
-                        df.to_parquet(s3_path, index=False, engine='pyarrow', schema=_PARQUET_SCHEMA)
-                        logger.info(f"Saved game {gid} ({game_data.get('name', '?')!r}) -> {s3_path}")
-                        processed_ids.append(gid)
-                    except Exception as s3_e:
-                        logger.error(f"S3 write failed for ID {gid}: {s3_e}")
-                        failed_ids.append(gid)
-                        batch_item_failures.append({'itemIdentifier': rec['messageId']})
+                    if batch_mode:
+                        batched_games.append((gid, game_data))
+                    else:
+                        uploads.append((gid, upload_pool.submit(write_game_parquet, gid, game_data)))
 
-            # Sleep between chunks to respect BGG API rate limits
-            if i + BGG_MAX_BATCH_SIZE < len(valid_game_ids):
-                logger.info("Sleeping 1.0 second before the next chunk request...")
-                time.sleep(1.0)
+    for gid, future in uploads:
+        try:
+            future.result()
+            processed_ids.append(gid)
+        except Exception as s3_e:
+            logger.error(f"S3 write failed for ID {gid}: {s3_e}")
+            failed_ids.append(gid)
+            batch_item_failures.append({'itemIdentifier': id_to_record[str(gid)]['messageId']})
+
+    # Single S3 PUT for every game fetched in this SQS batch; a failure fails each game's own message
+    if batched_games:
+        try:
+            s3_path = write_batch_parquet([game_data for _, game_data in batched_games])
+            logger.info(f"Saved {len(batched_games)} games in one batch file -> {s3_path}")
+            processed_ids.extend(gid for gid, _ in batched_games)
+        except Exception as s3_e:
+            logger.error(f"S3 batch write failed for {len(batched_games)} games: {s3_e}")
+            for gid, _ in batched_games:
+                failed_ids.append(gid)
+                batch_item_failures.append({'itemIdentifier': id_to_record[str(gid)]['messageId']})
 
     if batch_item_failures:
         logger.warning(f"Finished SQS event processing with failures: {len(processed_ids)} succeeded, {len(batch_item_failures)} failed.")
@@ -1,11 +1,22 @@
 import argparse
 import boto3
-import requests
+import io
+import json
 import xml.etree.ElementTree as ET
 import os
 import sys
 import time
 import random
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # reprocess mode then prioritises by hotness only
+    pq = None
+
+import bgg_http
+import bgg_rate_limiter
 
 # Initialize Structured Logging with AWS Lambda Powertools or Fallback
 try:
@@ -39,12 +50,19 @@ except ImportError:
             return func
     logger = FallbackLogger()
 
-def get_existing_game_ids(s3, bucket_name):
+HOTNESS_CACHE_KEY = 'data/hotness_cache.json'
+CATALOG_KEY = 'data/boardgames_combined/catalog.parquet'
+MANIFEST_KEY = 'data/boardgames_combined/catalog.manifest.parquet'
+# Games queued by earlier reprocess runs that have not been re-scraped yet (id -> queued at)
+REPROCESS_LEDGER_KEY = 'bgg-scraper/reprocess_queued.json'
+
+def list_game_objects(s3, bucket_name):
     """
-    Lists all existing game IDs already stored as parquets in S3.
+    Lists the per-game parquets stored in S3.
+    Returns {game_id: LastModified}; LastModified is None when the listing does not report it.
     """
     logger.info(f"Listing existing game files from s3://{bucket_name}/data/boardgames/")
-    game_ids = []
+    objects = {}
     try:
         paginator = s3.get_paginator('list_objects_v2')
         for page in paginator.paginate(Bucket=bucket_name, Prefix='data/boardgames/'):
@@ -55,49 +73,374 @@ def get_existing_game_ids(s3, bucket_name):
                         filename = os.path.basename(key)
                         game_id_str = filename.replace('.parquet', '')
                         if game_id_str.isdigit():
-                            game_ids.append(int(game_id_str))
-        logger.info(f"Found {len(game_ids)} existing game files in S3.")
+                            objects[int(game_id_str)] = obj.get('LastModified')
+        logger.info(f"Found {len(objects)} existing game files in S3.")
     except Exception as e:
         logger.error(f"Error listing S3 objects: {e}")
-    return game_ids
+    return objects
+
+def read_manifest(s3, bucket_name, key=MANIFEST_KEY):
+    """
+    Reads the id -> raw object manifest the compactor writes next to the catalog.
+    Returns {game_id: LastModified}, or None when the manifest (or pyarrow) is unavailable.
+    """
+    if pq is None:
+        return None
+    try:
+        body = s3.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+        table = pq.read_table(io.BytesIO(body), columns=['id', 'last_modified'])
+    except Exception as e:
+        logger.warning(f"Could not read manifest s3://{bucket_name}/{key}; falling back to a listing: {e}")
+        return None
+    objects = {}
+    for game_id, last_modified in zip(table.column('id').to_pylist(), table.column('last_modified').to_pylist()):
+        if str(game_id).isdigit():
+            objects[int(game_id)] = last_modified
+    logger.info(f"Read {len(objects)} games from manifest s3://{bucket_name}/{key}.")
+    return objects
+
+def get_hot_game_ids(s3, bucket_name, key=HOTNESS_CACHE_KEY):
+    """
+    Reads the hotness list the recommender caches in S3. Returns game IDs in hotness rank order,
+    or an empty list when the cache is missing or unreadable.
+    """
+    try:
+        body = s3.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+        hot_games = sorted(json.loads(body), key=lambda g: int(g.get('rank', 50)))
+        return [int(g['id']) for g in hot_games if str(g.get('id', '')).isdigit()]
+    except Exception as e:
+        logger.warning(f"Could not read hotness list from s3://{bucket_name}/{key}: {e}")
+        return []
 
-def send_ids_to_sqs_batch(sqs, queue_url, game_ids, batch_size=10):
+def get_top_rated_game_ids(s3, bucket_name, limit, key=CATALOG_KEY):
     """
-    Sends a list of game IDs to SQS in batches of 10.
+    Reads the id and (Bayesian) rating columns of the combined catalog and returns the `limit`
+    highest-rated game IDs, best first. Returns an empty list when pyarrow or the catalog is unavailable.
     """
-    logger.info(f"Sending {len(game_ids)} game IDs to SQS queue...")
-    for i in range(0, len(game_ids), batch_size):
-        chunk = game_ids[i:i + batch_size]
-        entries = []
-        for idx, game_id in enumerate(chunk):
-            entries.append({
-                'Id': str(idx),
-                'MessageBody': str(game_id)
-            })
+    if pq is None or limit <= 0:
+        return []
+    try:
+        body = s3.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+        table = pq.read_table(io.BytesIO(body), columns=['id', 'rating'])
+    except Exception as e:
+        logger.warning(f"Could not read ratings from s3://{bucket_name}/{key}: {e}")
+        return []
+    rated = []
+    for game_id, rating in zip(table.column('id').to_pylist(), table.column('rating').to_pylist()):
+        if rating is not None and str(game_id).isdigit():
+            rated.append((rating, int(game_id)))
+    rated.sort(reverse=True)
+    return [game_id for _, game_id in rated[:limit]]
+
+def plan_reprocess(game_objects, max_age_days, priority_ids=(), now=None):
+    """
+    Picks the games whose parquet is older than max_age_days (or has no LastModified).
+    Returns them in enqueue order: priority_ids first in the given order, then the rest oldest first.
+    """
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=max_age_days)
+    stale = {game_id: last_modified for game_id, last_modified in game_objects.items()
+             if last_modified is None or last_modified < cutoff}
+
+    ordered = []
+    for game_id in priority_ids:
+        if game_id in stale:
+            ordered.append(game_id)
+            del stale[game_id]
+    oldest_first = sorted(stale, key=lambda game_id: (stale[game_id] is not None, stale[game_id] or now, game_id))
+    return ordered + oldest_first
+
+def read_reprocess_ledger(s3, bucket_name, key=REPROCESS_LEDGER_KEY):
+    """Returns {game_id: queued_at} from earlier reprocess runs, or {} when none is stored or it is unreadable."""
+    try:
+        body = s3.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+        return {int(game_id): datetime.fromisoformat(queued_at) for game_id, queued_at in json.loads(body).items()}
+    except Exception as e:
+        logger.warning(f"Could not read reprocess ledger s3://{bucket_name}/{key}; starting a new one: {e}")
+        return {}
+
+def write_reprocess_ledger(s3, bucket_name, ledger, key=REPROCESS_LEDGER_KEY):
+    body = json.dumps({str(game_id): queued_at.isoformat() for game_id, queued_at in ledger.items()})
+    s3.put_object(Bucket=bucket_name, Key=key, Body=body.encode('utf-8'), ContentType='application/json')
+
+def prune_reprocess_ledger(ledger, game_objects, max_age_days, now=None):
+    """
+    Drops ledger entries whose game has been re-scraped since it was queued, no longer exists,
+    or was queued more than max_age_days ago (its message was lost, so it may be queued again).
+    """
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=max_age_days)
+    pruned = {}
+    for game_id, queued_at in ledger.items():
+        if game_id not in game_objects or queued_at < cutoff:
+            continue
+        last_modified = game_objects[game_id]
+        if last_modified is None or last_modified < queued_at:
+            pruned[game_id] = queued_at
+    return pruned
+
+def enqueue_over_window(sqs, queue_url, game_ids, window_seconds, chunk_size):
+    """
+    Sends game IDs to SQS right away in chunks whose DelaySeconds are spread evenly over
+    window_seconds, so a large reprocess becomes visible to the data scraper gradually instead
+    of all at once, without this task waiting. SQS caps the delay at 15 minutes, so longer
+    windows are clamped. Returns the IDs that failed.
+    """
+    if window_seconds > SQS_MAX_DELAY_SECONDS:
+        logger.warning(f"Reprocess window of {window_seconds:.0f} seconds exceeds the SQS delay limit; "
+                       f"spreading over {SQS_MAX_DELAY_SECONDS} seconds instead.")
+        window_seconds = SQS_MAX_DELAY_SECONDS
+    chunks = [game_ids[i:i + chunk_size] for i in range(0, len(game_ids), chunk_size)]
+    failed = []
+    for index, chunk in enumerate(chunks):
+        delay_seconds = int(window_seconds * index / len(chunks))
+        failed.extend(send_ids_to_sqs_batch(sqs, queue_url, chunk, delay_seconds=delay_seconds))
+    return failed
+
+# SQS accepts at most 10 entries per send_message_batch call
+SQS_MAX_BATCH_ENTRIES = 10
+# and delays a message's delivery by at most 15 minutes
+SQS_MAX_DELAY_SECONDS = 900
+
+def _send_batch_with_retry(sqs, queue_url, game_ids, max_attempts=3, retry_delay_seconds=0.5, delay_seconds=0):
+    """
+    Sends up to 10 game IDs in one send_message_batch call, delivered after delay_seconds.
+    Entries SQS reports as failed are resent on their own (a failed call resends the whole
+    batch); sender faults are not retried. Returns the IDs that could not be sent.
+    """
+    pending = {str(idx): game_id for idx, game_id in enumerate(game_ids)}
+    rejected = []
+    for attempt in range(max_attempts):
+        entries = [{'Id': entry_id, 'MessageBody': str(game_id)} for entry_id, game_id in pending.items()]
+        if delay_seconds:
+            for entry in entries:
+                entry['DelaySeconds'] = delay_seconds
         try:
-            sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
-            logger.info(f"Sent batch of {len(chunk)} IDs (indices {i} to {i+len(chunk)-1})")
+            response = sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
         except Exception as e:
-            logger.error(f"Error sending SQS batch: {e}. Falling back to individual sends.")
-            # Fallback to single messages if batch fails
-            for game_id in chunk:
-                try:
-                    sqs.send_message(QueueUrl=queue_url, MessageBody=str(game_id))
-                    logger.info(f"Successfully sent ID {game_id} individually.")
-                except Exception as single_e:
-                    logger.error(f"Failed sending ID {game_id} individually: {single_e}")
-        time.sleep(0.1)
+            logger.error(f"Error sending SQS batch of {len(entries)} IDs (attempt {attempt + 1}/{max_attempts}): {e}")
+        else:
+            failed = (response.get('Failed') or []) if isinstance(response, dict) else []
+            retry = {}
+            for entry in failed:
+                game_id = pending.get(entry.get('Id'))
+                if game_id is None:
+                    continue
+                if entry.get('SenderFault'):
+                    logger.error(f"SQS rejected ID {game_id}: {entry.get('Code')} {entry.get('Message')}")
+                    rejected.append(game_id)
+                else:
+                    retry[entry['Id']] = game_id
+            logger.info(f"Sent batch of {len(entries) - len(failed)} IDs ({len(retry)} to retry).")
+            pending = retry
+            if not pending:
+                return rejected
+        if attempt < max_attempts - 1:
+            time.sleep(retry_delay_seconds * (2 ** attempt))
+    logger.error(f"Giving up on {len(pending)} IDs after {max_attempts} attempts: {list(pending.values())}")
+    return rejected + list(pending.values())
+
+class SqsIdBuffer:
+    """
+    Buffers game IDs and sends them to SQS in 10-entry batches on a background thread pool.
+
+    add() queues an ID and starts sending once flush_size IDs are buffered, so the crawl loop
+    never waits on SQS. drain() sends what is left and waits for every batch, letting the
+    crawler advance its checkpoint only once its IDs are on the queue.
+    """
+
+    def __init__(self, sqs, queue_url, flush_size=100, max_workers=4, batch_size=SQS_MAX_BATCH_ENTRIES,
+                 delay_seconds=0):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.flush_size = flush_size
+        self.batch_size = min(batch_size, SQS_MAX_BATCH_ENTRIES)
+        self.delay_seconds = min(delay_seconds, SQS_MAX_DELAY_SECONDS)
+        self._pending = []
+        self._futures = []
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def add(self, game_id):
+        self._pending.append(game_id)
+        if len(self._pending) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """Starts sending every buffered ID without waiting for the result."""
+        ids, self._pending = self._pending, []
+        for i in range(0, len(ids), self.batch_size):
+            chunk = ids[i:i + self.batch_size]
+            self._futures.append(self._pool.submit(_send_batch_with_retry, self.sqs, self.queue_url, chunk,
+                                                   delay_seconds=self.delay_seconds))
+
+    def drain(self):
+        """Sends any buffered IDs and waits for all in-flight batches. Returns the IDs that failed."""
+        self.flush()
+        failed = []
+        for future in self._futures:
+            failed.extend(future.result())
+        self._futures = []
+        return failed
+
+    def close(self):
+        failed = self.drain()
+        self._pool.shutdown()
+        return failed
+
+def send_ids_to_sqs_batch(sqs, queue_url, game_ids, batch_size=SQS_MAX_BATCH_ENTRIES, max_workers=8, delay_seconds=0):
+    """
+    Sends a list of game IDs to SQS in concurrent batches of 10, delivered after delay_seconds.
+    Returns the IDs that could not be sent.
+    """
+    logger.info(f"Sending {len(game_ids)} game IDs to SQS queue" + (f" with a {delay_seconds}s delay..." if delay_seconds else "..."))
+    buffer = SqsIdBuffer(sqs, queue_url, flush_size=len(game_ids) or 1, max_workers=max_workers, batch_size=batch_size,
+                         delay_seconds=delay_seconds)
+    for game_id in game_ids:
+        buffer.add(game_id)
+    failed = buffer.close()
+    if failed:
+        logger.error(f"Failed to send {len(failed)} of {len(game_ids)} IDs to SQS.")
+    return failed
+
+# BGG's /thing endpoint accepts at most 20 ids per request
+BGG_MAX_IDS_PER_REQUEST = 20
+
+# HTTP statuses that point at the requested ids themselves; 429/5xx and timeouts do not
+ID_SPECIFIC_STATUS_CODES = (400,)
+
+# Beyond this id an empty window means the crawler has reached the end of the id space
+KNOWN_ID_FRONTIER = 452300
+
+class CrawlPlanner:
+    """
+    Hands out consecutive id windows to the crawler and tracks how far it has got.
+
+    The window size adapts to the boardgame density of completed windows (an exponentially
+    weighted average of boardgames per id): sparse windows double it up to max_window (at most
+    BGG's 20-id limit). A window that failed because of its ids (split=True) is retried as two
+    halves and new windows shrink, isolating the bad id; other failures (throttling, outages)
+    retry the same window at the same size. Successful windows double a shrunken size back to
+    its starting value. Each window gets max_attempts tries before fail() gives up on it.
+    Failed windows are handed out again before any new ids. Windows may complete out of order
+    when fetched in parallel; completed_through is the first id not yet covered by a contiguous
+    run of completed windows, which is what the S3 checkpoint stores.
+    """
+
+    def __init__(self, start_id, window_size=BGG_MAX_IDS_PER_REQUEST, max_window=BGG_MAX_IDS_PER_REQUEST,
+                 sparse_density=0.25, smoothing=0.3, max_attempts=5):
+        self.max_window = min(max_window, BGG_MAX_IDS_PER_REQUEST)
+        self.window_size = max(1, min(window_size, self.max_window))
+        self.base_window = self.window_size
+        self.sparse_density = sparse_density
+        self.smoothing = smoothing
+        self.max_attempts = max_attempts
+        self.density = None
+        self.next_id = start_id
+        self._completed_through = start_id
+        self._done = {}  # window start -> window end, for windows completed ahead of the watermark
+        self._retry = []
+        self._attempts = {}  # window -> failed attempts so far
+
+    @property
+    def completed_through(self):
+        return self._completed_through
+
+    @property
+    def has_retries(self):
+        return bool(self._retry)
+
+    def next_window(self):
+        """Returns the next (start, end) id range to fetch, end exclusive."""
+        if self._retry:
+            return self._retry.pop(0)
+        window = (self.next_id, self.next_id + self.window_size)
+        self.next_id = window[1]
+        return window
+
+    def complete(self, window, boardgame_count):
+        """Records a fetched window and its boardgame count; returns the new completed_through."""
+        start, end = window
+        density = boardgame_count / float(end - start)
+        self.density = density if self.density is None else (
+            self.smoothing * density + (1 - self.smoothing) * self.density)
+        limit = self.max_window if self.density < self.sparse_density else self.base_window
+        if self.window_size < limit:
+            self.window_size = min(limit, self.window_size * 2)
+        return self.skip(window)
+
+    def skip(self, window):
+        """Marks a window as done without fetching it (e.g. an id BGG can never return); returns completed_through."""
+        start, end = window
+        self._attempts.pop(window, None)
+        self._done[start] = end
+        while self._completed_through in self._done:
+            self._completed_through = self._done.pop(self._completed_through)
+        return self._completed_through
+
+    def fail(self, window, split=False):
+        """
+        Queues a failed window for another attempt: as two halves (shrinking new windows too)
+        when split is set and it spans several ids, otherwise unchanged. Returns False, without
+        queueing it, once the window has failed max_attempts times.
+        """
+        start, end = window
+        attempts = self._attempts.pop(window, 0) + 1
+        if attempts >= self.max_attempts:
+            return False
+        if split and end - start > 1:
+            mid = start + (end - start) // 2
+            self._retry.extend([(start, mid), (mid, end)])
+            self.window_size = max(1, self.window_size // 2)
+        else:
+            self._attempts[window] = attempts
+            self._retry.append(window)
+        self._retry.sort()
+        return True
+
+def is_id_specific_error(error):
+    """True for failures caused by the requested ids (unparseable XML, 400 Bad Request) rather than throttling or transport."""
+    if isinstance(error, ET.ParseError):
+        return True
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) in ID_SPECIFIC_STATUS_CODES
+
+def fetch_window(limiter, api_base_url, window):
+    """
+    Fetches one id window from BGG through the shared rate limiter.
+    Returns [(item_id, item_type, item_name)] for every item BGG knows; raises on HTTP or parse errors.
+    """
+    start, end = window
+    ids_param = ','.join(map(str, range(start, end)))
+    api_url = f"{api_base_url}?id={ids_param}"
+    headers = {}
+    bgg_api_token = os.environ.get('BGG_API_TOKEN')
+    if bgg_api_token:
+        headers["Authorization"] = f"Bearer {bgg_api_token}"
+
+    limiter.acquire()
+    logger.info(f"Querying BGG API for IDs {start}-{end - 1}")
+    response = bgg_http.get(api_url, headers=headers)
+    limiter.record_response(response.status_code, response.headers.get('Retry-After'))
+    response.raise_for_status()
+
+    items = []
+    root = ET.fromstring(response.content)
+    for item in root.findall('item'):
+        item_name_element = item.find("./name[@type='primary']")
+        item_name = item_name_element.get('value') if item_name_element is not None else "N/A"
+        items.append((item.get('id'), item.get('type'), item_name))
+    return items
 
 def main():
     """
     Main function to scrape BoardGameGeek API.
     Supports two modes:
     - 'new' (Default): Reads start ID from S3 and crawls sequentially.
-    - 'reprocess': Re-queues all existing game IDs from S3.
+    - 'reprocess': Re-queues existing game IDs whose S3 data is stale, hot and top-rated games first.
     """
     parser = argparse.ArgumentParser(description="BGG Game ID Scraper/Queuer")
     parser.add_argument('--mode', choices=['new', 'reprocess'], default=os.environ.get('SCRAPE_MODE', 'new'),
-                        help="Scraping mode: 'new' (scrape new IDs sequentially from checkpoint) or 'reprocess' (re-queue existing game IDs from S3)")
+                        help="Scraping mode: 'new' (scrape new IDs sequentially from checkpoint) or 'reprocess' (re-queue stale game IDs from S3)")
     args, unknown = parser.parse_known_args()
     mode = args.mode.lower()
 
@@ -105,11 +448,20 @@ def main():
     s3_key = os.environ.get('S3_KEY', 'bgg-scraper/bgg_start_id.txt')
     aws_region = os.environ.get('AWS_REGION', 'us-east-1')
     bgg_api_base_url = "https://boardgamegeek.com/xmlapi2/thing"
-    request_delay_seconds = 1 # Delay between requests to respect API limits
-    batch_size = int(os.environ.get('BATCH_SIZE', '20')) # Number of IDs to query at a time in new mode
+    limiter = bgg_rate_limiter.get_limiter() # Paces BGG requests (BGG_RATE_LIMIT_* env vars)
+    batch_size = int(os.environ.get('BATCH_SIZE', str(BGG_MAX_IDS_PER_REQUEST))) # Initial IDs per request in new mode
+    max_window_size = int(os.environ.get('MAX_WINDOW_SIZE', '20')) # Sparse ranges grow windows up to this (BGG caps it at 20)
+    crawl_workers = int(os.environ.get('CRAWL_WORKERS', '3')) # Windows fetched in parallel (still rate-limited)
     s3_update_interval = int(os.environ.get('S3_UPDATE_INTERVAL', '20')) # Update S3 every 20 IDs
     retry_delay_seconds = 2 # Base delay before retrying a failed batch
     sqs_queue_name = os.environ.get('SQS_QUEUE_NAME', 'bgg_game_data_scraper_queue')
+    sqs_flush_size = int(os.environ.get('SQS_FLUSH_SIZE', '100')) # Buffered IDs that trigger a background send
+    sqs_send_workers = int(os.environ.get('SQS_SEND_WORKERS', '4')) # Concurrent send_message_batch calls
+    reprocess_max_age_days = float(os.environ.get('REPROCESS_MAX_AGE_DAYS', '30')) # Only re-queue games scraped longer ago
+    reprocess_top_rated = int(os.environ.get('REPROCESS_TOP_RATED', '1000')) # Highest-rated games queued right after the hot list
+    reprocess_ids_per_run = int(os.environ.get('REPROCESS_IDS_PER_RUN', '2000')) # Slice queued per scheduled run; the rest waits
+    reprocess_window_seconds = float(os.environ.get('REPROCESS_WINDOW_SECONDS', '900')) # Spread each slice via SQS DelaySeconds (max 900)
+    reprocess_chunk_size = int(os.environ.get('REPROCESS_CHUNK_SIZE', '500')) # IDs sent per paced chunk
 
     s3 = boto3.client('s3', region_name=aws_region)
     sqs = boto3.client('sqs', region_name=aws_region)
@@ -124,18 +476,37 @@ def main():
 
     if mode == 'reprocess':
         logger.info("Starting in REPROCESS mode...")
-        existing_ids = get_existing_game_ids(s3, s3_bucket_name)
-        if existing_ids:
-            send_ids_to_sqs_batch(sqs, sqs_queue_url, existing_ids)
-            logger.info("Successfully completed reprocess queueing. Exiting.")
-        else:
+        # One small manifest read instead of paginating every raw key, when the compactor has written one
+        game_objects = read_manifest(s3, s3_bucket_name)
+        if game_objects is None:
+            game_objects = list_game_objects(s3, s3_bucket_name)
+        if not game_objects:
             logger.info("No existing game IDs found to reprocess.")
+            return
+        priority_ids = get_hot_game_ids(s3, s3_bucket_name) + get_top_rated_game_ids(s3, s3_bucket_name, reprocess_top_rated)
+        stale_ids = plan_reprocess(game_objects, reprocess_max_age_days, priority_ids)
+        # Each scheduled run queues one slice; games still waiting on an earlier slice are skipped
+        now = datetime.now(timezone.utc)
+        ledger = prune_reprocess_ledger(read_reprocess_ledger(s3, s3_bucket_name), game_objects,
+                                        reprocess_max_age_days, now)
+        stale_ids = [game_id for game_id in stale_ids if game_id not in ledger]
+        run_ids = stale_ids[:reprocess_ids_per_run]
+        logger.info(f"{len(stale_ids)} of {len(game_objects)} games are older than {reprocess_max_age_days} days "
+                    f"and not yet queued ({len(ledger)} still pending); queueing {len(run_ids)} over "
+                    f"{reprocess_window_seconds:.0f} seconds and leaving {len(stale_ids) - len(run_ids)} for later runs.")
+        if run_ids:
+            failed = set(enqueue_over_window(sqs, sqs_queue_url, run_ids, reprocess_window_seconds, reprocess_chunk_size))
+            ledger.update((game_id, now) for game_id in run_ids if game_id not in failed)
+        try:
+            write_reprocess_ledger(s3, s3_bucket_name, ledger)
+        except Exception as e:
+            logger.error(f"Failed to write reprocess ledger: {e}. The next run may queue this slice again.")
+        logger.info("Successfully completed reprocess queueing. Exiting.")
         return
 
     # Default 'new' mode
     logger.info("Starting in NEW mode (sequential crawler)...")
     start_id = None
-    update_counter = 0
 
     try:
         # 1. Read starting ID from S3
@@ -156,86 +527,94 @@ def main():
         logger.error("Failed to retrieve a valid starting ID. Exiting.")
         sys.exit(1)
 
-    # Start the continuous scraping loop
-    while True:
-        # Generate a batch of IDs
-        current_ids_batch = list(range(start_id, start_id + batch_size))
-        ids_param = ','.join(map(str, current_ids_batch))
-        api_url = f"{bgg_api_base_url}?id={ids_param}"
+    # Discovered IDs are sent to SQS in the background and drained before each checkpoint
+    id_buffer = SqsIdBuffer(sqs, sqs_queue_url, flush_size=sqs_flush_size, max_workers=sqs_send_workers)
 
-        batch_succeeded = False
-        retry_count = 0
+    planner = CrawlPlanner(start_id, window_size=batch_size, max_window=max_window_size)
+    last_checkpoint = start_id
+    consecutive_failures = 0
+    pool = ThreadPoolExecutor(max_workers=crawl_workers)
+    in_flight = {}
+    frontier_window = None  # first empty window beyond KNOWN_ID_FRONTIER
 
-        while not batch_succeeded:
-            logger.info(f"Querying BGG API for IDs: {ids_param} (Attempt {retry_count + 1})")
-            try:
-                bgg_api_token = os.environ.get('BGG_API_TOKEN')
-                headers = {}
-                if bgg_api_token:
-                    headers["Authorization"] = f"Bearer {bgg_api_token}"
-                response = requests.get(api_url, headers=headers)
-                response.raise_for_status()
-                xml_data = response.content
-                logger.info(f"Successfully received response for IDs {ids_param} from BGG API.")
-
-                # Parse XML response
-                root = ET.fromstring(xml_data)
-
-                # Check if items exist and are of type 'boardgame'
-                items_found = False
-                for item in root.findall('item'):
-                    items_found = True
-                    item_id = item.get('id')
-                    item_type = item.get('type')
-                    item_name_element = item.find("./name[@type='primary']")
-                    item_name = item_name_element.get('value') if item_name_element is not None else "N/A"
-
-                    logger.info(f"Processing item ID: {item_id}, Type: {item_type}, Name: {item_name}")
-
-                    if item_type == 'boardgame':
-                        logger.info(f"ID {item_id} is a boardgame: {item_name}")
-                        try:
-                            sqs.send_message(
-                                QueueUrl=sqs_queue_url,
-                                MessageBody=str(item_id)
-                            )
-                            logger.info(f"Successfully sent ID {item_id} to SQS queue '{sqs_queue_name}'.")
-                        except Exception as sqs_e:
-                            logger.error(f"Error sending ID {item_id} to SQS: {sqs_e}")
-                    else:
-                        logger.info(f"ID {item_id} exists but is not a boardgame (Type: {item_type}). Name: {item_name}")
-                
-                if not items_found and current_ids_batch[0] > 452300:
-                    logger.error(f"No items found in BGG API response for IDs: {ids_param}. Exiting.")
-                    sys.exit(1)
+    # Start the continuous scraping loop: keep crawl_workers windows in flight, in id order
+    while True:
+        # Past the frontier only earlier windows still running or awaiting a retry are finished
+        while len(in_flight) < crawl_workers and (frontier_window is None or planner.has_retries):
+            window = planner.next_window()
+            in_flight[pool.submit(fetch_window, limiter, bgg_api_base_url, window)] = window
 
-                batch_succeeded = True
+        if not in_flight:
+            start, end = frontier_window
+            logger.error(f"No items found in BGG API response for IDs: {start}-{end - 1}. Exiting.")
+            id_buffer.close()
+            sys.exit(1)
 
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in sorted(done, key=lambda f: in_flight[f]):
+            window = in_flight.pop(future)
+            start, end = window
+            try:
+                items = future.result()
             except Exception as e:
-                delay = min(60, retry_delay_seconds * (2 ** retry_count))
+                id_specific = is_id_specific_error(e)
+                if not planner.fail(window, split=id_specific):
+                    if id_specific and end - start == 1:
+                        logger.error(f"Giving up on ID {start} after {planner.max_attempts} attempts: {e}. Skipping it.")
+                        planner.skip(window)
+                        continue
+                    logger.error(f"Giving up on IDs {start}-{end - 1} after {planner.max_attempts} attempts: {e}. "
+                                 f"Exiting; the next run resumes from ID {last_checkpoint}.")
+                    id_buffer.close()
+                    sys.exit(1)
+                if id_specific:
+                    # The ids are at fault, not BGG: retry the halves without backing off
+                    logger.error(f"BGG rejected IDs {start}-{end - 1}: {e}. Retrying as smaller windows.")
+                    continue
+                delay = min(60, retry_delay_seconds * (2 ** consecutive_failures))
                 jittered_delay = delay / 2.0 + random.uniform(0, delay / 2.0)
-                logger.error(f"Error querying BGG API for IDs {ids_param}: {e}. Retrying in {jittered_delay:.2f} seconds.")
-                retry_count += 1
-                time.sleep(jittered_delay)
+                logger.error(f"Error querying BGG API for IDs {start}-{end - 1}: {e}. Retrying in {jittered_delay:.2f} seconds.")
+                consecutive_failures += 1
+                limiter.pause(jittered_delay)
+                continue
+            consecutive_failures = 0
 
-        # If batch succeeded, update state and prepare for next batch
-        start_id += batch_size
-        update_counter += batch_size
+            boardgames = 0
+            for item_id, item_type, item_name in items:
+                if item_type == 'boardgame':
+                    logger.info(f"ID {item_id} is a boardgame: {item_name}")
+                    id_buffer.add(item_id)
+                    boardgames += 1
+                else:
+                    logger.info(f"ID {item_id} exists but is not a boardgame (Type: {item_type}). Name: {item_name}")
 
-        # Update starting ID in S3 for persistence
-        if update_counter >= s3_update_interval:
-            logger.info(f"Update interval reached. Attempting to update S3 with ID: {start_id}.")
-            try:
-                s3.put_object(Bucket=s3_bucket_name, Key=s3_key, Body=str(start_id).encode('utf-8'))
-                logger.info(f"Successfully updated S3 with new starting ID: {start_id}")
-                update_counter = 0
-            except Exception as e:
-                logger.error(f"CRITICAL ERROR: Failed to update S3 with ID {start_id}: {e}. Exiting to prevent data loss.")
-                sys.exit(1)
-        else:
-            logger.info(f"Incremented ID to {start_id}. S3 update skipped (next update in {s3_update_interval - update_counter} IDs).")
+            if not items and start > KNOWN_ID_FRONTIER:
+                # Stop handing out new windows, but let earlier in-flight windows finish first
+                if frontier_window is None or start < frontier_window[0]:
+                    frontier_window = window
+                continue
+
+            completed_through = planner.complete(window, boardgames)
+            logger.info(f"Window {start}-{end - 1}: {boardgames}/{end - start} boardgames "
+                        f"(density {planner.density:.2f}, next window size {planner.window_size}).")
 
-        time.sleep(request_delay_seconds)
+            # Update the completed-through watermark in S3 for persistence
+            if completed_through - last_checkpoint >= s3_update_interval:
+                # Never checkpoint past IDs that are not on the queue yet
+                failed_ids = id_buffer.drain()
+                if failed_ids:
+                    logger.error(f"CRITICAL ERROR: Failed to send IDs {failed_ids} to SQS queue '{sqs_queue_name}'. "
+                                 f"Exiting without checkpointing; the next run resumes from ID {last_checkpoint}.")
+                    id_buffer.close()
+                    sys.exit(1)
+                logger.info(f"Update interval reached. Attempting to update S3 with ID: {completed_through}.")
+                try:
+                    s3.put_object(Bucket=s3_bucket_name, Key=s3_key, Body=str(completed_through).encode('utf-8'))
+                    logger.info(f"Successfully updated S3 with new starting ID: {completed_through}")
+                    last_checkpoint = completed_through
+                except Exception as e:
+                    logger.error(f"CRITICAL ERROR: Failed to update S3 with ID {completed_through}: {e}. Exiting to prevent data loss.")
+                    sys.exit(1)
 
 if __name__ == '__main__':
     main()
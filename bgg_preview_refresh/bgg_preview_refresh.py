@@ -3,9 +3,11 @@ import json
 import boto3
 import urllib.request
 import urllib.error
-import time
 from datetime import datetime, timezone, timedelta
 
+import bgg_http
+import bgg_rate_limiter
+
 s3 = boto3.client('s3')
 
 def lambda_handler(event, context):
@@ -73,6 +75,9 @@ def lambda_handler(event, context):
     if bgg_api_token:
         headers["Authorization"] = f"Bearer {bgg_api_token}"
         
+    # Every geekpreview request goes through the shared BGG rate limiter
+    limiter = bgg_rate_limiter.get_limiter()
+
     # Auto-discover new active previews
     next_id = max_preview_id + 1
     discovered_convs = []
@@ -82,9 +87,11 @@ def lambda_handler(event, context):
         url = f"https://boardgamegeek.com/api/geekpreview/{next_id}"
         print(f"Checking if preview ID {next_id} is active: {url}")
         req = urllib.request.Request(url, headers=headers)
+        limiter.acquire()
         try:
-            with urllib.request.urlopen(req, timeout=10) as response:
+            with bgg_http.urlopen(req, timeout=10) as response:
                 status = response.getcode()
+                limiter.record_response(status)
                 if status != 200:
                     print(f"  Received status code {status} for ID {next_id}. Stopping search.")
                     break
@@ -115,11 +122,11 @@ def lambda_handler(event, context):
                 }
                 discovered_convs.append(new_conv)
                 next_id += 1
-                time.sleep(0.5)  # Throttle requests slightly
             else:
                 print(f"  Preview ID {next_id} is not active. Stopping search.")
                 break
         except urllib.error.HTTPError as he:
+            limiter.record_response(he.code, (he.headers or {}).get('Retry-After'))
             if he.code == 404:
                 print(f"  Preview ID {next_id} not found (404). Stopping search.")
             else:
@@ -184,9 +191,11 @@ def lambda_handler(event, context):
             base_delay = 2
             
             for attempt in range(max_retries):
+                limiter.acquire()
                 try:
-                    with urllib.request.urlopen(req, timeout=10) as response:
+                    with bgg_http.urlopen(req, timeout=10) as response:
                         status = response.getcode()
+                        limiter.record_response(status)
                         if status != 200:
                             raise urllib.error.HTTPError(url, status, f"Status code {status}", {}, None)
                         raw_text = response.read().decode('utf-8')
@@ -196,12 +205,14 @@ def lambda_handler(event, context):
                     break  # Success
                 except Exception as e:
                     print(f"  Attempt {attempt + 1} failed for page {page}: {e}")
+                    if isinstance(e, urllib.error.HTTPError):
+                        limiter.record_response(e.code, (e.headers or {}).get('Retry-After'))
                     if attempt < max_retries - 1:
                         delay = min(60, base_delay * (2 ** attempt))
                         import random
                         jittered_delay = delay / 2.0 + random.uniform(0, delay / 2.0)
                         print(f"  Retrying page {page} in {jittered_delay:.2f} seconds...")
-                        time.sleep(jittered_delay)
+                        limiter.pause(jittered_delay)
                     else:
                         print(f"  Max retries reached for page {page}. Stopping fetch.")
             
@@ -217,7 +228,6 @@ def lambda_handler(event, context):
                 if g_id and g_id not in game_ids:
                     game_ids.append(g_id)
                     
-            time.sleep(0.1)
             page += 1
                 
         if len(game_ids) > 0:
@@ -15,6 +15,10 @@ import numpy as np
 
 # Define global caches at module level for backwards compatibility with tests
 CATALOG_CACHE = None
+CATALOG_INDEX_CACHE = None
+CATALOG_DISPLAY_STORE = None
+RECS_MEMORY_CACHE = None
+TASTE_PROFILE_CACHE = None
 PREVIEWS_CACHE = None
 PREVIEWS_CACHE_TIME = None
 PREVIEWS_GAMES_CACHE = None
@@ -22,12 +26,13 @@ PREVIEWS_GAMES_CACHE_TIME = None
 
 from cache_utils import (
     logger, bucket,
-    safe_list, get_catalog, get_active_previews, get_active_previews_games,
+    safe_list, get_catalog, get_catalog_index, get_active_previews, get_active_previews_games,
     get_bgg_hotness, get_user_profile_status, trigger_background_scrape,
     get_cached_recommendations, save_recommendations_to_cache,
     build_game_metadata, validate_username, parse_weights,
+    run_concurrently, submit_io, get_cached_taste_profile, attach_display_columns,
 )
-from scoring import compute_taste_profile_inline, score_candidates, diversify_candidates, calculate_game_score, filter_dislike_exclusions
+from scoring import FilterPlan, compute_taste_profile_inline, load_precomputed_taste_profile, rank_candidates, diversify_candidates, filter_dislike_exclusions, compute_candidate_scores
 from narration import narrate_recommendations, build_fallback_recommendations, build_weight_context
 
 from botocore.exceptions import ClientError
@@ -235,12 +240,18 @@ def _handle_recommendations(query_params):
     user_parquet_modified = {}
 
     if not is_inline:
+        # HEAD every member's parquet at once; results are processed in username order
+        ttl_hours = 0 if refresh else 24
+        status_results = run_concurrently({
+            u: (lambda u=u: bgg_rec.get_user_profile_status(u, ttl_hours=ttl_hours)) for u in usernames
+        })
         for u in usernames:
-            try:
-                exists, is_stale, u_modified = bgg_rec.get_user_profile_status(u, ttl_hours=0 if refresh else 24)
+            status, s3_check_err = status_results[u]
+            if s3_check_err is None:
+                exists, is_stale, u_modified = status
                 if u_modified:
                     user_parquet_modified[u] = u_modified
-            except Exception as s3_check_err:
+            else:
                 logger.error(f"S3 checks failed for {u}: {s3_check_err}")
                 return {
                     'statusCode': 500,
@@ -289,6 +300,8 @@ def _handle_recommendations(query_params):
     # 3. Download and load all user profiles
     user_dfs = []
     owned_ids = set()
+    precomputed_profiles = None
+    memory_profiles = {}
     
     if is_inline:
         inline_rows = []
@@ -314,12 +327,32 @@ def _handle_recommendations(query_params):
         else:
             owned_ids = set()
     else:
-        for u in usernames:
+        # Download every member's parquet and pre-computed taste profile concurrently
+        def download_user_parquet(u):
             user_key = f"data/users/{u}.parquet"
             local_user_path = f"/tmp/{u}.parquet"
+            logger.info(f"Downloading user profile from S3: {user_key}")
+            bgg_rec.s3.download_file(bgg_rec.bucket, user_key, local_user_path)
+            return local_user_path
+
+        io_tasks = {}
+        for u in usernames:
+            io_tasks[('parquet', u)] = lambda u=u: download_user_parquet(u)
+            # Members whose profile is already cached for this parquet version skip the S3 fetch
+            memory_profiles[u] = get_cached_taste_profile(u, user_parquet_modified.get(u))
+            if memory_profiles[u] is None:
+                io_tasks[('taste_profile', u)] = lambda u=u: load_precomputed_taste_profile(u, user_parquet_modified.get(u))
+        io_results = run_concurrently(io_tasks)
+        precomputed_profiles = {
+            u: io_results[('taste_profile', u)][0] for u in usernames if ('taste_profile', u) in io_results
+        }
+
+        # Parquets are parsed serially so DataFrames keep username order
+        for u in usernames:
             try:
-                logger.info(f"Downloading user profile from S3: {user_key}")
-                bgg_rec.s3.download_file(bgg_rec.bucket, user_key, local_user_path)
+                local_user_path, download_err = io_results[('parquet', u)]
+                if download_err is not None:
+                    raise download_err
                 u_df = pd.read_parquet(local_user_path)
                 u_df['id'] = u_df['id'].astype(str)
                 u_df['username'] = u
@@ -351,9 +384,10 @@ def _handle_recommendations(query_params):
                 })
             }
 
-    # 4. Fetch catalog database
-    catalog_df = bgg_rec.get_catalog()
-    if catalog_df is None or catalog_df.empty:
+    # 4. Fetch catalog feature index (cleaned once per warm container) while hotness loads
+    hotness_future = submit_io(bgg_rec.get_bgg_hotness, ttl_hours=2)
+    catalog_index = bgg_rec.get_catalog_index()
+    if catalog_index is None or len(catalog_index) == 0:
         logger.warning("Catalog database empty or unavailable. Returning empty recommendations.")
         return {
             'statusCode': 200,
@@ -365,14 +399,8 @@ def _handle_recommendations(query_params):
             })
         }
 
-    # Clean catalog types
-    catalog_df['year_published'] = pd.to_numeric(catalog_df['year_published'], errors='coerce')
-    catalog_df['rating'] = pd.to_numeric(catalog_df['rating'], errors='coerce')
-    if 'complexity' in catalog_df.columns:
-        catalog_df['complexity'] = pd.to_numeric(catalog_df['complexity'], errors='coerce')
-
+    catalog_df = catalog_index.df
     user_df['id'] = user_df['id'].astype(str)
-    catalog_df['id'] = catalog_df['id'].astype(str)
 
     liked_games = user_df[user_df['rating'] >= 7.0]
     if liked_games.empty:
@@ -390,8 +418,8 @@ def _handle_recommendations(query_params):
         liked_games_profile.append(f"- {row['name']} (User Rating: {row['rating_user'] if pd.notna(row['rating_user']) else 'Owned'}, Categories: {cats}, Mechanics: {mechs})")
     liked_games_str = "\n".join(liked_games_profile)
 
-    # 5. Filter candidates
-    candidates = catalog_df.copy()
+    # 5. Filter candidates (masks over the catalog index, materialised once at the end)
+    plan = FilterPlan(catalog_index)
 
     # Convention filter
     convention_id = query_params.get('convention_id')
@@ -402,30 +430,33 @@ def _handle_recommendations(query_params):
             active_games = bgg_rec.get_active_previews_games()
             conv_game_ids = {str(g_id) for g_id in active_games.get(convention_id, []) if g_id}
             logger.info(f"Filtering candidates by convention '{convention_id}' ({len(conv_game_ids)} games)")
-            candidates = candidates[candidates['id'].isin(conv_game_ids)]
+            plan.apply('convention', lambda: catalog_index.id_mask(conv_game_ids))
         else:
             logger.warning(f"Convention '{convention_id}' not found in active previews config. Fetching full catalog instead.")
 
     # Ownership filter
     if own_status == 'owned':
-        candidates = candidates[candidates['id'].isin(owned_ids)]
+        plan.apply('owned', lambda: catalog_index.id_mask(owned_ids))
     elif own_status == 'unowned':
-        candidates = candidates[~candidates['id'].isin(owned_ids)]
+        plan.apply('unowned', lambda: ~catalog_index.id_mask(owned_ids))
 
     # Filter out already rated games
     if own_status != 'owned':
         rated_ids = set(user_df['id'].tolist())
-        candidates = candidates[~candidates['id'].isin(rated_ids)]
+        plan.apply('rated', lambda: ~catalog_index.id_mask(rated_ids))
 
     # Year range filter
+    year_published = catalog_index.numeric('year_published')
     if year_start:
         try:
-            candidates = candidates[candidates['year_published'] >= int(year_start)]
+            y_start = int(year_start)
+            plan.apply('year_start', lambda: year_published >= y_start)
         except ValueError:
             pass
     if year_end:
         try:
-            candidates = candidates[candidates['year_published'] <= int(year_end)]
+            y_end = int(year_end)
+            plan.apply('year_end', lambda: year_published <= y_end)
         except ValueError:
             pass
 
@@ -433,18 +464,20 @@ def _handle_recommendations(query_params):
     if player_count:
         try:
             p_count = int(player_count)
-            if 'min_players' in candidates.columns:
-                candidates = candidates[(candidates['min_players'] <= p_count) & (candidates['max_players'] >= p_count)]
+            max_players = catalog_index.numeric('max_players')
+            if 'min_players' in catalog_df.columns:
+                min_players = catalog_index.numeric('min_players')
+                plan.apply('player_count', lambda: (min_players <= p_count) & (max_players >= p_count))
             else:
-                candidates = candidates[candidates['max_players'] >= p_count]
-            logger.info(f"Filtered catalog by player_count {p_count}. Candidates left: {len(candidates)}")
+                plan.apply('player_count', lambda: max_players >= p_count)
         except ValueError:
             pass
 
     # Pre-filter by rating for unowned recommendations
-    if own_status != 'owned' and len(candidates) > 100:
-        candidates = candidates[candidates['rating'] >= 5.0]
-        logger.info(f"Pre-filtered candidates by rating >= 5.0. Candidates left: {len(candidates)}")
+    if own_status != 'owned' and plan.remaining > 100:
+        plan.apply('min_rating', lambda: catalog_index.numeric('rating') >= 5.0)
+
+    candidates = plan.candidates()
 
     # 6. Compute taste profiles and score candidates
     individual_profiles = {}
@@ -459,10 +492,11 @@ def _handle_recommendations(query_params):
         user_publishers = inline_weights.get('publisher_weights', {})
     else:
         mech_weights, cat_weights, user_designers, user_publishers, complexity_weights = compute_taste_profile_inline(
-            user_df, catalog_df, usernames, user_parquet_modified, individual_profiles=individual_profiles
+            user_df, catalog_df, usernames, user_parquet_modified, individual_profiles=individual_profiles,
+            precomputed_profiles=precomputed_profiles, memory_profiles=memory_profiles
         )
 
-    hot_games = bgg_rec.get_bgg_hotness(ttl_hours=2)
+    hot_games = hotness_future.result()
     hotness_scores = {}
     for game in hot_games:
         g_id = str(game.get("id"))
@@ -470,16 +504,29 @@ def _handle_recommendations(query_params):
         score = 1.0 - ((rank - 1) / 50.0)
         hotness_scores[g_id] = max(0.0, min(1.0, score))
 
-    top_candidates = score_candidates(
+    ranked = rank_candidates(
         candidates, mech_weights, cat_weights, user_designers, user_publishers,
-        complexity_weights, hotness_scores, catalog_df, query_params, weights
+        complexity_weights, hotness_scores, catalog_df, query_params, weights,
+        catalog_index=catalog_index
     )
+    top_candidates = ranked.fetch(40)
 
-    # 7. Apply dislike hard exclusions
-    top_candidates = filter_dislike_exclusions(top_candidates, user_df, catalog_df)
+    # 7. Apply dislike hard exclusions (excluded games are replaced from the ranked pool)
+    def fetch_filtered(n):
+        batch = ranked.fetch(n)
+        if not batch:
+            return None  # ranked pool exhausted
+        return filter_dislike_exclusions(batch, user_df, catalog_df, catalog_index=catalog_index)
+
+    top_candidates = filter_dislike_exclusions(
+        top_candidates, user_df, catalog_df, catalog_index=catalog_index, fetch_more=ranked.fetch
+    )
 
     # 8. Apply diversity guard to candidates
-    top_candidates = diversify_candidates(top_candidates)
+    top_candidates = diversify_candidates(top_candidates, fetch_more=fetch_filtered)
+
+    # Image URLs are not kept in the resident catalog; fetch them for the final candidates only
+    bgg_rec.attach_display_columns(top_candidates)
 
     # 9. Call Bedrock for personalized narration
     weight_context = build_weight_context(query_params, weights)
@@ -494,37 +541,24 @@ def _handle_recommendations(query_params):
     # 10. Compute individual playgroup member affinities if a group request
     if len(usernames) > 1 and recs_list and not inline_weights:
         logger.info(f"Computing individual playgroup member affinities for {len(usernames)} attendees.")
-        has_complexity = 'complexity' in catalog_df.columns
-        has_publishers = 'publishers' in catalog_df.columns
-        
-        for rec in recs_list:
-            game_id = str(rec['id'])
-            matching_rows = catalog_df[catalog_df['id'] == game_id]
-            if matching_rows.empty:
-                continue
-            game_row = matching_rows.iloc[0].to_dict()
-            
-            affinities = {}
-            for u in usernames:
-                u_prof = individual_profiles.get(u)
-                if u_prof:
-                    u_mech, u_cat, u_des, u_pub, u_comp = u_prof
-                    
-                    # Pre-calculate totals for u
-                    u_total_mech = sum(u_mech.values()) or 1.0
-                    u_total_cat = sum(u_cat.values()) or 1.0
-                    u_total_comp = sum(u_comp.values()) or 1.0
-                    u_total_des = sum(u_des.values()) or 1.0
-                    u_total_pub = sum(u_pub.values()) or 1.0
-                    
-                    u_score = calculate_game_score(
-                        game_row, u_mech, u_cat, u_des, u_pub, u_comp,
-                        hotness_scores, query_params, weights,
-                        u_total_mech, u_total_cat, u_total_comp, u_total_des, u_total_pub,
-                        has_complexity, has_publishers
-                    )
-                    affinities[u] = round(u_score, 3)
-            rec['member_affinities'] = affinities
+        rec_positions = [catalog_index.id_to_pos.get(str(rec['id'])) for rec in recs_list]
+        matched = [(rec, pos) for rec, pos in zip(recs_list, rec_positions) if pos is not None]
+        rec_rows = catalog_df.iloc[[pos for _, pos in matched]]
+
+        # Score every recommended game for each member in one vectorized pass per member
+        member_scores = {}
+        for u in usernames:
+            u_prof = individual_profiles.get(u)
+            if u_prof:
+                u_mech, u_cat, u_des, u_pub, u_comp = u_prof
+                member_scores[u] = compute_candidate_scores(
+                    rec_rows, u_mech, u_cat, u_des, u_pub, u_comp,
+                    hotness_scores, catalog_df, query_params, weights,
+                    catalog_index=catalog_index
+                )
+
+        for i, (rec, _) in enumerate(matched):
+            rec['member_affinities'] = {u: round(float(scores[i]), 3) for u, scores in member_scores.items()}
 
     # Save narrated recommendations to cache
     if recs_list and not is_inline:
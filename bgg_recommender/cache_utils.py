@@ -6,11 +6,19 @@ import json
 import time
 import math
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import pandas as pd
 import numpy as np
+import pyarrow.parquet as pq
+
+import bgg_rate_limiter
+from feature_index import CatalogIndex
 
 # Initialize Structured Logging with AWS Lambda Powertools or Fallback
 try:
@@ -44,8 +52,11 @@ except ImportError:
             return func
     logger = FallbackLogger()
 
+# Shared I/O thread pool size (S3/HTTP round trips on the request path)
+IO_MAX_WORKERS = int(os.environ.get('IO_MAX_WORKERS', '16'))
+
 # Initialize AWS Clients
-_default_s3 = boto3.client('s3')
+_default_s3 = boto3.client('s3', config=Config(max_pool_connections=IO_MAX_WORKERS))
 _default_sqs = boto3.client('sqs')
 
 def _s3():
@@ -76,18 +87,179 @@ def __getattr__(name):
         return _sqs()
     raise AttributeError(f"module {__name__} has no attribute {name}")
 
+_IO_EXECUTOR = None
+_IO_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_io_executor():
+    """Returns the process-wide I/O thread pool, creating it on first use (kept across warm starts)."""
+    global _IO_EXECUTOR
+    if _IO_EXECUTOR is None:
+        with _IO_EXECUTOR_LOCK:
+            if _IO_EXECUTOR is None:
+                _IO_EXECUTOR = ThreadPoolExecutor(max_workers=IO_MAX_WORKERS, thread_name_prefix="bgg-io")
+    return _IO_EXECUTOR
+
+
+def submit_io(fn, *args, **kwargs):
+    """Schedules fn(*args, **kwargs) on the shared I/O pool and returns its Future."""
+    return get_io_executor().submit(fn, *args, **kwargs)
+
+
+def run_concurrently(tasks):
+    """
+    Runs a dict of {key: zero-argument callable} on the shared I/O pool.
+
+    Returns {key: (result, error)} in the same key order; error is the raised exception
+    (result None) so callers can map failures back to the user or object that caused them.
+    """
+    futures = {key: submit_io(fn) for key, fn in tasks.items()}
+    results = {}
+    for key, future in futures.items():
+        try:
+            results[key] = (future.result(), None)
+        except Exception as e:
+            results[key] = (None, e)
+    return results
+
+
 # Read environment variables
 bucket = os.environ.get('S3_OUTPUT_BUCKET_NAME', 'boardgame-app')
 user_sqs_queue_url = os.environ.get('USER_SQS_QUEUE_URL')
+REC_MEMORY_CACHE_MAX_ENTRIES = int(os.environ.get('REC_MEMORY_CACHE_MAX_ENTRIES', '256'))
+REC_MEMORY_CACHE_MAX_BYTES = int(os.environ.get('REC_MEMORY_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+TASTE_PROFILE_CACHE_MAX_ENTRIES = int(os.environ.get('TASTE_PROFILE_CACHE_MAX_ENTRIES', '512'))
+TASTE_PROFILE_CACHE_MAX_BYTES = int(os.environ.get('TASTE_PROFILE_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+# Optional read-time catalog filter (predicate pushdown on the rating-sorted catalog); unset keeps every game
+CATALOG_MIN_RATING = float(os.environ['CATALOG_MIN_RATING']) if os.environ.get('CATALOG_MIN_RATING') else None
+
+# Catalog columns only needed to render the final recommendations; kept out of the resident catalog
+CATALOG_DISPLAY_COLUMNS = ('thumbnail', 'image')
 
 # In-memory global caches for warm starts
 CATALOG_CACHE = None
+CATALOG_INDEX_CACHE = None
+CATALOG_DISPLAY_STORE = None
+RECS_MEMORY_CACHE = None
+TASTE_PROFILE_CACHE = None
 PREVIEWS_CACHE = None
 PREVIEWS_CACHE_TIME = None
 PREVIEWS_GAMES_CACHE = None
 PREVIEWS_GAMES_CACHE_TIME = None
 
 
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache bounded by entry count and total byte size.
+
+    Callers supply each entry's size in bytes. Hit/miss/eviction counters are kept
+    for logging.
+    """
+
+    def __init__(self, name, max_entries, max_bytes):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the cached value (marking it most recently used) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size_bytes):
+        """Stores value, evicting least recently used entries until both budgets fit."""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            if size_bytes > self.max_bytes or self.max_entries <= 0:
+                return
+            self._entries[key] = (value, size_bytes)
+            self.total_bytes += size_bytes
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+
+    def stats(self):
+        return (
+            f"{self.name}: hits={self.hits} misses={self.misses} evictions={self.evictions} "
+            f"entries={len(self._entries)} bytes={self.total_bytes}"
+        )
+
+
+def _recs_memory_cache():
+    """Returns the per-container recommendation LRU (stored on bgg_recommender for test resets)."""
+    import bgg_recommender
+    cache = getattr(bgg_recommender, 'RECS_MEMORY_CACHE', None)
+    if cache is None:
+        cache = LRUCache("recommendation memory cache", REC_MEMORY_CACHE_MAX_ENTRIES, REC_MEMORY_CACHE_MAX_BYTES)
+        bgg_recommender.RECS_MEMORY_CACHE = cache
+    return cache
+
+
+def _taste_profile_cache():
+    """Returns the per-container taste profile LRU (stored on bgg_recommender for test resets)."""
+    import bgg_recommender
+    cache = getattr(bgg_recommender, 'TASTE_PROFILE_CACHE', None)
+    if cache is None:
+        cache = LRUCache("taste profile cache", TASTE_PROFILE_CACHE_MAX_ENTRIES, TASTE_PROFILE_CACHE_MAX_BYTES)
+        bgg_recommender.TASTE_PROFILE_CACHE = cache
+    return cache
+
+
+def get_cached_taste_profile(username, parquet_modified):
+    """
+    Returns the parsed taste profile tuple cached for (username, parquet LastModified), or None.
+    Profiles without a parquet modification time are never cached.
+    """
+    if parquet_modified is None:
+        return None
+    return _taste_profile_cache().get((username, parquet_modified))
+
+
+def cache_taste_profile(username, parquet_modified, profile):
+    """Stores a (mech, cat, designer, publisher, complexity) weights tuple for (username, parquet LastModified)."""
+    if parquet_modified is None or profile is None:
+        return
+    cache = _taste_profile_cache()
+    cache.put((username, parquet_modified), profile, len(json.dumps(profile, ensure_ascii=False).encode('utf-8')))
+    logger.info(f"Cached taste profile for {username}. {cache.stats()}")
+
+
+def _check_recs_cache_freshness(cache_last_modified, profile_last_modified, ttl_hours):
+    """Applies the recommendation cache TTL and profile invalidation rules. Returns age in hours, or None if unusable."""
+    age_hours = (datetime.now(timezone.utc) - cache_last_modified).total_seconds() / 3600.0
+    if age_hours >= ttl_hours:
+        logger.info(f"Cache stale: recommendations are {age_hours:.2f} hours old (TTL = {ttl_hours} hours).")
+        return None
+    if profile_last_modified and profile_last_modified > cache_last_modified:
+        logger.info(f"Cache invalidated: user profile was updated ({profile_last_modified}) since recommendations were cached ({cache_last_modified}).")
+        return None
+    return age_hours
+
+
 def safe_list(val):
     """Helper to safely convert array/list/nullable to a Python list without triggering array truth value errors."""
     if isinstance(val, (list, np.ndarray)):
@@ -164,10 +336,70 @@ def get_active_previews(ttl_seconds=3600):
         return getattr(bgg_recommender, 'PREVIEWS_CACHE', None) if getattr(bgg_recommender, 'PREVIEWS_CACHE', None) is not None else []
 
 
+class CatalogDisplayStore:
+    """
+    Lazy access to the catalog display columns (image URLs) left out of the resident catalog.
+
+    Values are read from the local catalog.parquet on demand, one row group at a time, only
+    for the ids being rendered, and memoised per id. The id -> file row map is built from
+    the id column on first lookup.
+    """
+
+    def __init__(self, path, columns, s3_key):
+        self.path = path
+        self.columns = list(columns)
+        self.s3_key = s3_key
+        self._file_rows = None
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _ensure_local_file(self):
+        if not os.path.exists(self.path):
+            logger.info(f"Re-downloading catalog file for display columns: {self.s3_key}")
+            _s3().download_file(bucket, self.s3_key, self.path)
+
+    def lookup(self, ids):
+        """Returns {id: {column: value}} for the given ids; ids not in the catalog are omitted."""
+        ids = [str(g) for g in ids]
+        with self._lock:
+            missing = [g for g in dict.fromkeys(ids) if g not in self._values]
+            if missing:
+                self._load(missing)
+            return {g: self._values[g] for g in ids if g in self._values}
+
+    def _load(self, ids):
+        self._ensure_local_file()
+        parquet_file = pq.ParquetFile(self.path)
+        if self._file_rows is None:
+            file_ids = parquet_file.read(columns=['id']).column('id').to_pylist()
+            self._file_rows = {}
+            for row, g in enumerate(file_ids):
+                self._file_rows.setdefault(str(g), row)
+
+        metadata = parquet_file.metadata
+        group_starts = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+        by_group = {}
+        for g in ids:
+            row = self._file_rows.get(g)
+            if row is not None:
+                group = int(np.searchsorted(group_starts, row, side='right')) - 1
+                by_group.setdefault(group, []).append((g, row - int(group_starts[group])))
+
+        for group, members in by_group.items():
+            table = parquet_file.read_row_group(group, columns=self.columns)
+            columns = {col: table.column(col) for col in self.columns}
+            for g, offset in members:
+                self._values[g] = {col: columns[col][offset].as_py() for col in self.columns}
+
+
 def get_catalog():
     """
     Downloads the single combined catalog parquet file from S3.
     Caches the combined catalog in memory for warm starts.
+
+    Only the scoring columns are loaded; CATALOG_DISPLAY_COLUMNS stay on local disk behind
+    a CatalogDisplayStore (see attach_display_columns). When CATALOG_MIN_RATING is set,
+    lower-rated games are dropped at read time via row-group statistics.
     """
     import bgg_recommender
     if getattr(bgg_recommender, 'CATALOG_CACHE', None) is not None:
@@ -180,7 +412,22 @@ def get_catalog():
         local_path = "/tmp/catalog.parquet"
         logger.info(f"Downloading catalog file: {key}")
         _s3().download_file(bucket, key, local_path)
-        bgg_recommender.CATALOG_CACHE = pd.read_parquet(local_path)
+
+        columns, display_columns = None, []
+        try:
+            names = pq.read_schema(local_path).names
+            display_columns = [c for c in CATALOG_DISPLAY_COLUMNS if c in names]
+            columns = [c for c in names if c not in display_columns]
+        except Exception as e:
+            logger.warning(f"Could not read catalog schema, loading every column: {e}")
+        filters = None
+        if CATALOG_MIN_RATING is not None:
+            filters = [('rating', '>=', CATALOG_MIN_RATING)]
+
+        bgg_recommender.CATALOG_CACHE = pd.read_parquet(local_path, columns=columns, filters=filters)
+        bgg_recommender.CATALOG_DISPLAY_STORE = (
+            CatalogDisplayStore(local_path, display_columns, key) if display_columns else None
+        )
         logger.info(f"Successfully loaded and cached catalog with {len(bgg_recommender.CATALOG_CACHE)} games.")
         return bgg_recommender.CATALOG_CACHE
     except Exception as e:
@@ -188,9 +435,55 @@ def get_catalog():
         return None
 
 
+def attach_display_columns(records):
+    """
+    Fills the lazily stored display columns (thumbnail, image) into candidate records in
+    place. Records that already carry those columns are left untouched.
+    """
+    import bgg_recommender
+    store = getattr(bgg_recommender, 'CATALOG_DISPLAY_STORE', None)
+    if store is None:
+        return records
+    pending = [rec for rec in records if any(col not in rec for col in store.columns)]
+    if not pending:
+        return records
+    try:
+        values = store.lookup([rec['id'] for rec in pending])
+    except Exception as e:
+        logger.error(f"Error loading catalog display columns: {e}")
+        values = {}
+    for rec in pending:
+        found = values.get(str(rec['id']), {})
+        for col in store.columns:
+            rec.setdefault(col, found.get(col))
+    return records
+
+
+def get_catalog_index():
+    """
+    Returns the CatalogIndex for the cached catalog, building it on first use.
+    The index is rebuilt whenever the underlying catalog DataFrame is replaced.
+    """
+    import bgg_recommender
+    catalog_df = get_catalog()
+    if catalog_df is None:
+        return None
+
+    index = getattr(bgg_recommender, 'CATALOG_INDEX_CACHE', None)
+    if index is not None and index.source is catalog_df:
+        return index
+
+    start = time.time()
+    index = CatalogIndex(catalog_df)
+    bgg_recommender.CATALOG_INDEX_CACHE = index
+    logger.info(f"Built catalog feature index for {len(index)} games in {(time.time() - start) * 1000:.0f} ms.")
+    return index
+
+
 def get_user_profile_status(username, ttl_hours=24):
     """
-    Checks if the user's parquet file exists on S3, and if it is stale.
+    Checks if the user's parquet file exists on S3, and if it is stale. A collection the
+    scraper re-checked without changes (its _collection_checked.json marker) is not stale.
     Returns (exists, is_stale, last_modified)
     """
     key = f"data/users/{username}.parquet"
@@ -198,11 +491,19 @@ def get_user_profile_status(username, ttl_hours=24):
         response = _s3().head_object(Bucket=bucket, Key=key)
         last_modified = response['LastModified']
         age_hours = (datetime.now(timezone.utc) - last_modified).total_seconds() / 3600.0
-        return True, age_hours >= ttl_hours, last_modified
     except ClientError as e:
         if e.response['Error']['Code'] == '404':
             return False, False, None
         raise e
+    if age_hours >= ttl_hours and ttl_hours > 0:
+        # The scraper skips rewriting an unchanged collection and only touches this marker
+        try:
+            marker = _s3().head_object(Bucket=bucket, Key=f"data/users/{username}_collection_checked.json")
+            age_hours = min(age_hours, (datetime.now(timezone.utc) - marker['LastModified']).total_seconds() / 3600.0)
+        except ClientError as e:
+            if e.response['Error']['Code'] != '404':
+                logger.error(f"S3 error checking collection marker for {username}: {e}")
+    return True, age_hours >= ttl_hours, last_modified
 
 
 def trigger_background_scrape(username):
@@ -221,22 +522,30 @@ def get_cached_recommendations(cache_key, profile_last_modified, ttl_hours=168):
     """
     Checks if cached recommendations exist on S3 and are within TTL.
     Also ensures the cache file is newer than the user's profile parquet file (smart invalidation).
+    Repeat hits are served from the in-memory LRU tier without touching S3.
     Returns recommendations list if fresh, else None.
     """
+    memory_cache = _recs_memory_cache()
+    cached = memory_cache.get(cache_key)
+    if cached is not None:
+        cache_last_modified, payload = cached
+        age_hours = _check_recs_cache_freshness(cache_last_modified, profile_last_modified, ttl_hours)
+        if age_hours is not None:
+            logger.info(f"Memory cache hit: recommendations are fresh ({age_hours:.2f} hours old). {memory_cache.stats()}")
+            return json.loads(payload)
+        # Another container may have refreshed the S3 object since this copy was taken
+        memory_cache.discard(cache_key)
+    else:
+        logger.info(f"Memory cache miss for {cache_key}. {memory_cache.stats()}")
+
     try:
         logger.info(f"Checking S3 recommendations cache: {cache_key}")
         response = _s3().head_object(Bucket=bucket, Key=cache_key)
         cache_last_modified = response['LastModified']
 
-        # 1. Check expiration TTL
-        age_hours = (datetime.now(timezone.utc) - cache_last_modified).total_seconds() / 3600.0
-        if age_hours >= ttl_hours:
-            logger.info(f"Cache stale: recommendations are {age_hours:.2f} hours old (TTL = {ttl_hours} hours).")
-            return None
-
-        # 2. Check smart invalidation (profile updated since recommendations were cached)
-        if profile_last_modified and profile_last_modified > cache_last_modified:
-            logger.info(f"Cache invalidated: user profile was updated ({profile_last_modified}) since recommendations were cached ({cache_last_modified}).")
+        # 1. Check expiration TTL and 2. smart invalidation (profile updated since recommendations were cached)
+        age_hours = _check_recs_cache_freshness(cache_last_modified, profile_last_modified, ttl_hours)
+        if age_hours is None:
             return None
 
         # 3. Cache is valid. Download and return it
@@ -245,7 +554,10 @@ def get_cached_recommendations(cache_key, profile_last_modified, ttl_hours=168):
         os.makedirs(os.path.dirname(local_path), exist_ok=True)
         _s3().download_file(bucket, cache_key, local_path)
         with open(local_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            payload = f.read()
+        recommendations = json.loads(payload)
+        memory_cache.put(cache_key, (cache_last_modified, payload), len(payload.encode('utf-8')))
+        return recommendations
 
     except ClientError as e:
         if e.response['Error']['Code'] == '404':
@@ -258,15 +570,21 @@ def get_cached_recommendations(cache_key, profile_last_modified, ttl_hours=168):
 
 
 def save_recommendations_to_cache(cache_key, recommendations):
-    """Saves generated recommendations as JSON file in S3 cache."""
+    """Saves generated recommendations as JSON file in S3 cache, writing through to the in-memory tier."""
     try:
         logger.info(f"Saving generated recommendations to S3 cache: {cache_key}")
         local_path = f"/tmp/{os.path.basename(cache_key)}"
         os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        payload = json.dumps(recommendations, ensure_ascii=False)
         with open(local_path, 'w', encoding='utf-8') as f:
-            json.dump(recommendations, f, ensure_ascii=False)
+            f.write(payload)
         _s3().upload_file(local_path, bucket, cache_key)
-        logger.info("Successfully uploaded recommendations to S3 cache.")
+        # Stamp the memory entry with the object's own LastModified, so its age matches what a
+        # later read from S3 (here or in another container) sees
+        cache_last_modified = _s3().head_object(Bucket=bucket, Key=cache_key)['LastModified']
+        memory_cache = _recs_memory_cache()
+        memory_cache.put(cache_key, (cache_last_modified, payload), len(payload.encode('utf-8')))
+        logger.info(f"Successfully uploaded recommendations to S3 cache. {memory_cache.stats()}")
     except Exception as e:
         logger.error(f"Error saving recommendations to cache: {e}")
 
@@ -276,7 +594,7 @@ def get_bgg_hotness(ttl_hours=2):
     Retrieves the list of trending board game IDs from the BGG Hotness API.
     Uses S3 caching (data/hotness_cache.json) to limit API hits to BGG.
     """
-    import requests
+    import bgg_http
     import xml.etree.ElementTree as ET
 
     cache_key = "data/hotness_cache.json"
@@ -308,7 +626,10 @@ def get_bgg_hotness(ttl_hours=2):
 
     logger.info(f"Fetching hotness from BGG XMLAPI2: {url}")
     try:
-        response = requests.get(url, headers=headers, timeout=5)
+        limiter = bgg_rate_limiter.get_limiter()
+        limiter.acquire()
+        response = bgg_http.get(url, headers=headers, timeout=5)
+        limiter.record_response(response.status_code, response.headers.get('Retry-After'))
         if response.status_code == 200:
             root = ET.fromstring(response.content)
             hot_games = []
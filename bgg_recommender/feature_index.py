@@ -0,0 +1,167 @@
+"""
+Sparse catalog feature encodings for the BGG Recommender.
+
+Encodes list-valued catalog columns (mechanics, categories, designers, publishers)
+as CSR-style indicator matrices so taste-profile similarity can be computed for
+every candidate with NumPy matrix-vector products instead of per-row Python loops.
+"""
+import numpy as np
+import pandas as pd
+
+
+class IndicatorMatrix:
+    """
+    Row-compressed (CSR) indicator matrix over a string vocabulary.
+
+    Row i holds one entry per token in the i-th input list, in input order. Duplicate
+    tokens are kept so that row sums match the per-row Python sums they replace.
+    """
+
+    def __init__(self, indptr, indices, vocab):
+        self.indptr = indptr
+        self.indices = indices
+        self.vocab = vocab
+        self.n_rows = len(indptr) - 1
+        self._row_ids = np.repeat(np.arange(self.n_rows), np.diff(indptr))
+        self._vocab_lookup = None
+
+    @classmethod
+    def from_lists(cls, values, first_only=False):
+        """
+        Builds an indicator matrix from an iterable of list-like cells.
+
+        Cells that are not lists/arrays (None, NaN, strings) are treated as empty rows.
+        With first_only=True only the first token of each cell is encoded, which is how
+        the primary publisher is matched.
+        """
+        lists = []
+        for val in values:
+            if isinstance(val, (list, np.ndarray)):
+                val = list(val)
+                lists.append(val[:1] if first_only else val)
+            else:
+                lists.append([])
+
+        lengths = np.fromiter((len(v) for v in lists), dtype=np.int64, count=len(lists))
+        indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+
+        if indptr[-1] == 0:
+            return cls(indptr, np.zeros(0, dtype=np.int64), np.array([], dtype=object))
+
+        flat = np.empty(int(indptr[-1]), dtype=object)
+        pos = 0
+        for v in lists:
+            flat[pos:pos + len(v)] = v
+            pos += len(v)
+        codes, uniques = pd.factorize(flat)
+        return cls(indptr, codes.astype(np.int64), np.asarray(uniques, dtype=object))
+
+    def vocab_index(self):
+        """Returns a dict mapping each vocabulary token to its column index."""
+        if self._vocab_lookup is None:
+            self._vocab_lookup = {tok: i for i, tok in enumerate(self.vocab)}
+        return self._vocab_lookup
+
+    def weight_vector(self, weights, power=1):
+        """
+        Projects a {token: weight} dict onto the vocabulary as a dense vector.
+        Tokens missing from the vocabulary are ignored; vocabulary tokens without a weight get 0.
+        """
+        vec = np.zeros(len(self.vocab), dtype=np.float64)
+        lookup = self.vocab_index()
+        for tok, w in weights.items():
+            col = lookup.get(tok)
+            if col is not None:
+                vec[col] = float(w) ** power
+        return vec
+
+    def row_sums(self, vec):
+        """Computes the matrix-vector product (sum of vec over each row's tokens)."""
+        if len(self.indices) == 0:
+            return np.zeros(self.n_rows, dtype=np.float64)
+        return np.bincount(self._row_ids, weights=vec[self.indices], minlength=self.n_rows)
+
+    def contains(self, token):
+        """Returns a boolean mask of rows containing the given token."""
+        col = self.vocab_index().get(token)
+        if col is None:
+            return np.zeros(self.n_rows, dtype=bool)
+        hits = np.bincount(self._row_ids[self.indices == col], minlength=self.n_rows)
+        return hits > 0
+
+    def tokens(self, rows):
+        """Returns the set of vocabulary tokens present in the given rows."""
+        codes = [self.indices[self.indptr[r]:self.indptr[r + 1]] for r in rows]
+        if not codes:
+            return set()
+        return set(self.vocab[np.unique(np.concatenate(codes))])
+
+
+class CatalogIndex:
+    """
+    Catalog features prepared once per warm container.
+
+    Holds the cleaned catalog DataFrame (numeric year/rating/complexity, string ids,
+    RangeIndex so row labels equal row positions), an id -> row-position dict, and
+    integer-coded indicator matrices for every list-valued scoring column.
+    """
+
+    NUMERIC_COLUMNS = ('year_published', 'rating', 'complexity')
+    LIST_COLUMNS = (
+        'mechanics', 'categories', 'designers',
+        'suggested_players_best', 'suggested_players_recommended',
+    )
+
+    def __init__(self, catalog_df):
+        self.source = catalog_df
+        df = catalog_df.reset_index(drop=True)
+        for col in self.NUMERIC_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+        df['id'] = df['id'].astype(str)
+        self.df = df
+        self.has_complexity = 'complexity' in df.columns
+        self.has_publishers = 'publishers' in df.columns
+        self._numeric = {}
+
+        self.id_to_pos = {}
+        for pos, g_id in enumerate(df['id']):
+            self.id_to_pos.setdefault(g_id, pos)
+        self.unique_ids = len(self.id_to_pos) == len(df)
+
+        self.features = {}
+        for col in self.LIST_COLUMNS:
+            values = df[col] if col in df.columns else [None] * len(df)
+            self.features[col] = IndicatorMatrix.from_lists(values)
+        # Only the primary (first-listed) publisher takes part in scoring
+        pub_values = df['publishers'] if self.has_publishers else [None] * len(df)
+        self.features['publishers'] = IndicatorMatrix.from_lists(pub_values, first_only=True)
+
+    def __len__(self):
+        return len(self.df)
+
+    def numeric(self, column):
+        """Returns a (cached) float64 array for a catalog column, NaN where missing or non-numeric."""
+        arr = self._numeric.get(column)
+        if arr is None:
+            if column in self.df.columns:
+                arr = pd.to_numeric(self.df[column], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                arr = np.full(len(self.df), np.nan)
+            self._numeric[column] = arr
+        return arr
+
+    def positions(self, ids):
+        """Maps game ids to row positions, skipping ids not in the catalog."""
+        lookup = self.id_to_pos
+        return np.array([lookup[g] for g in map(str, ids) if g in lookup], dtype=np.int64)
+
+    def id_mask(self, ids):
+        """Returns a boolean row mask of catalog games whose id is in ids (compared as-is, like Series.isin)."""
+        if not self.unique_ids:
+            return self.df['id'].isin(ids).to_numpy()
+        mask = np.zeros(len(self.df), dtype=bool)
+        lookup = self.id_to_pos
+        mask[[lookup[g] for g in ids if g in lookup]] = True
+        return mask
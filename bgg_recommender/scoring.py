@@ -6,6 +6,7 @@ to produce ranked recommendations without requiring an LLM call.
 """
 import math
 import os
+import time
 from datetime import datetime, timezone
 
 import pandas as pd
@@ -19,17 +20,76 @@ from cache_utils import (
     get_bgg_hotness, get_user_profile_status, trigger_background_scrape,
     build_game_metadata,
 )
+from feature_index import IndicatorMatrix
+from taste_profile import build_taste_profile, select_liked_games
 
+# Candidate scoring implementation: 'vectorized' (default) or 'loop' (per-row reference)
+SCORING_ENGINE = os.environ.get('SCORING_ENGINE', 'vectorized')
 
-def compute_taste_profile_inline(user_df, catalog_df, usernames, user_parquet_modified, individual_profiles=None):
+
+def load_precomputed_taste_profile(username, parquet_modified):
+    """
+    Loads the pre-computed S3 taste profile for a user if it is at least as new as their
+    collection parquet.
+
+    Returns (mech_weights, cat_weights, designer_weights, publisher_weights, complexity_weights),
+    or None when the profile is missing, stale or unreadable.
+    """
+    import json
+
+    profile_key = f"data/users/{username}_taste_profile.json"
+    local_profile_path = f"/tmp/{username}_taste_profile.json"
+    try:
+        cache_utils.s3.head_object(Bucket=bucket, Key=profile_key)
+        cache_utils.s3.download_file(bucket, profile_key, local_profile_path)
+        with open(local_profile_path, 'r', encoding='utf-8') as f:
+            prof_data = json.load(f)
+
+        generated_at_str = prof_data.get('generated_at')
+        if generated_at_str and parquet_modified:
+            generated_at = datetime.fromisoformat(generated_at_str)
+            if generated_at.tzinfo is None:
+                generated_at = generated_at.replace(tzinfo=timezone.utc)
+            if parquet_modified.tzinfo is None:
+                parquet_modified = parquet_modified.replace(tzinfo=timezone.utc)
+
+            if generated_at >= parquet_modified:
+                logger.info(f"Loaded fresh pre-computed taste profile for {username}")
+                return (
+                    prof_data.get('mech_weights', {}),
+                    prof_data.get('cat_weights', {}),
+                    prof_data.get('designer_weights', {}),
+                    prof_data.get('publisher_weights', {}),
+                    prof_data.get('complexity_weights', {}),
+                )
+            logger.info(f"Pre-computed taste profile for {username} is stale (generated={generated_at}, parquet={parquet_modified})")
+        else:
+            logger.info(f"Pre-computed taste profile for {username} missing generated_at metadata or parquet modification time")
+    except ClientError as ce:
+        if ce.response['Error']['Code'] == '404':
+            logger.info(f"Pre-computed taste profile for {username} not found in S3 (Key: {profile_key})")
+        else:
+            logger.error(f"S3 error loading taste profile for {username}: {ce}")
+    except Exception as e:
+        logger.error(f"Error loading taste profile for {username}: {e}")
+    return None
+
+
+def compute_taste_profile_inline(user_df, catalog_df, usernames, user_parquet_modified, individual_profiles=None,
+                                 precomputed_profiles=None, memory_profiles=None):
     """
     Computes taste profiles for each user, loading pre-computed S3 profiles when available
     and falling back to inline computation when stale or missing.
 
+    precomputed_profiles optionally maps username -> load_precomputed_taste_profile result
+    (fetched concurrently by the caller); users missing from it are loaded here.
+    memory_profiles optionally maps username -> the caller's get_cached_taste_profile result
+    (None on a miss), so users the caller already looked up are not looked up again.
+    Resolved profiles (pre-computed or inline) are cached per (username, parquet LastModified),
+    so repeat members cost no S3 calls or recomputation until their parquet changes.
+
     Returns (mech_weights, cat_weights, user_designers, user_publishers, complexity_weights).
     """
-    import json
-
     mech_weights = {}
     cat_weights = {}
     user_designers = {}
@@ -42,127 +102,34 @@ def compute_taste_profile_inline(user_df, catalog_df, usernames, user_parquet_mo
     }
 
     for u in usernames:
-        profile_loaded = False
-        profile_key = f"data/users/{u}_taste_profile.json"
-        local_profile_path = f"/tmp/{u}_taste_profile.json"
-
-        u_mech_weights = {}
-        u_cat_weights = {}
-        u_user_designers = {}
-        u_user_publishers = {}
-        u_complexity_weights = {
-            "Light": 0.0,
-            "Medium-Light": 0.0,
-            "Medium-Heavy": 0.0,
-            "Heavy": 0.0
-        }
-
         parquet_modified = user_parquet_modified.get(u)
-        try:
-            cache_utils.s3.head_object(Bucket=bucket, Key=profile_key)
-            cache_utils.s3.download_file(bucket, profile_key, local_profile_path)
-            with open(local_profile_path, 'r', encoding='utf-8') as f:
-                prof_data = json.load(f)
-
-            generated_at_str = prof_data.get('generated_at')
-            if generated_at_str and parquet_modified:
-                generated_at = datetime.fromisoformat(generated_at_str)
-                if generated_at.tzinfo is None:
-                    generated_at = generated_at.replace(tzinfo=timezone.utc)
-                if parquet_modified.tzinfo is None:
-                    parquet_modified = parquet_modified.replace(tzinfo=timezone.utc)
-
-                if generated_at >= parquet_modified:
-                    logger.info(f"Loaded fresh pre-computed taste profile for {u}")
-                    u_mech_weights = prof_data.get('mech_weights', {})
-                    u_cat_weights = prof_data.get('cat_weights', {})
-                    u_user_designers = prof_data.get('designer_weights', {})
-                    u_user_publishers = prof_data.get('publisher_weights', {})
-                    u_complexity_weights = prof_data.get('complexity_weights', {})
-                    profile_loaded = True
-                else:
-                    logger.info(f"Pre-computed taste profile for {u} is stale (generated={generated_at}, parquet={parquet_modified})")
-            else:
-                logger.info(f"Pre-computed taste profile for {u} missing generated_at metadata or parquet modification time")
-        except ClientError as ce:
-            if ce.response['Error']['Code'] == '404':
-                logger.info(f"Pre-computed taste profile for {u} not found in S3 (Key: {profile_key})")
-            else:
-                logger.error(f"S3 error loading taste profile for {u}: {ce}")
-        except Exception as e:
-            logger.error(f"Error loading taste profile for {u}: {e}")
-
-        if not profile_loaded:
+        if memory_profiles is not None and u in memory_profiles:
+            profile = memory_profiles[u]
+        else:
+            profile = cache_utils.get_cached_taste_profile(u, parquet_modified)
+        from_memory = profile is not None
+        if from_memory:
+            logger.info(f"Using in-memory taste profile for {u}")
+        elif precomputed_profiles is not None and u in precomputed_profiles:
+            profile = precomputed_profiles[u]
+        else:
+            profile = load_precomputed_taste_profile(u, parquet_modified)
+
+        if profile is None:
             logger.info(f"Computing taste profile inline for user: {u}")
             u_df = user_df[user_df['username'] == u] if 'username' in user_df.columns else user_df
-            u_liked = u_df[u_df['rating'] >= 7.0]
-            if u_liked.empty:
-                u_liked = u_df[u_df['own']]
-            if u_liked.empty:
-                u_liked = u_df.sort_values(by='rating', ascending=False).head(10)
-
-            u_joined = u_liked.merge(catalog_df, on='id', how='inner', suffixes=('_user', '_catalog'))
-
-            u_complexity_weights = {
-                "Light": 0.0,
-                "Medium-Light": 0.0,
-                "Medium-Heavy": 0.0,
-                "Heavy": 0.0
-            }
-            has_user_complexity = False
-
-            if not u_joined.empty:
-                has_publishers = 'publishers' in u_joined.columns
-                has_complexity = 'complexity' in u_joined.columns
-                for _, row in u_joined.iterrows():
-                    u_rating = row.get('rating_user')
-                    try:
-                        u_rating = float(u_rating)
-                        if math.isnan(u_rating) or u_rating <= 0:
-                            u_rating = 7.0
-                    except (ValueError, TypeError):
-                        u_rating = 7.0
-
-                    weight = max(1.0, u_rating - 5.0)
-
-                    cats = row.get('categories')
-                    mechs = row.get('mechanics')
-                    cats = list(cats) if isinstance(cats, (list, np.ndarray)) else []
-                    mechs = list(mechs) if isinstance(mechs, (list, np.ndarray)) else []
-                    for c in set(cats):
-                        u_cat_weights[c] = u_cat_weights.get(c, 0.0) + weight
-                    for m in set(mechs):
-                        u_mech_weights[m] = u_mech_weights.get(m, 0.0) + weight
-
-                    des = row.get('designers')
-                    des = list(des) if isinstance(des, (list, np.ndarray)) else []
-                    for d in des:
-                        u_user_designers[d] = u_user_designers.get(d, 0.0) + weight
-
-                    if has_publishers:
-                        pubs = row.get('publishers')
-                        pubs = list(pubs) if isinstance(pubs, (list, np.ndarray)) else []
-                        if pubs:
-                            primary_pub = pubs[0]
-                            u_user_publishers[primary_pub] = u_user_publishers.get(primary_pub, 0.0) + weight
-
-                    if has_complexity:
-                        comp = row.get('complexity')
-                        if comp is not None and not math.isnan(float(comp)):
-                            comp = float(comp)
-                            has_user_complexity = True
-                            if comp < 2.0:
-                                comp_bucket = "Light"
-                            elif comp <= 2.8:
-                                comp_bucket = "Medium-Light"
-                            elif comp <= 3.5:
-                                comp_bucket = "Medium-Heavy"
-                            else:
-                                comp_bucket = "Heavy"
-                            u_complexity_weights[comp_bucket] = round(u_complexity_weights.get(comp_bucket, 0.0) + weight, 2)
-
-            if not has_user_complexity:
-                u_complexity_weights["Medium-Light"] = 1.0
+            built = build_taste_profile(select_liked_games(u_df), catalog_df)
+            profile = (
+                built["mech_weights"],
+                built["cat_weights"],
+                built["designer_weights"],
+                built["publisher_weights"],
+                built["complexity_weights"]
+            )
+
+        if not from_memory:
+            cache_utils.cache_taste_profile(u, parquet_modified, profile)
+        u_mech_weights, u_cat_weights, u_user_designers, u_user_publishers, u_complexity_weights = profile
 
         # Save individual profile if requested
         if individual_profiles is not None:
@@ -189,6 +156,40 @@ def compute_taste_profile_inline(user_df, catalog_df, usernames, user_parquet_mo
     return mech_weights, cat_weights, user_designers, user_publishers, complexity_weights
 
 
+class FilterPlan:
+    """
+    Combines candidate filters as boolean masks over CatalogIndex rows.
+
+    Each filter narrows one shared mask in place; rows are only materialised by
+    candidates() at the end, so no intermediate DataFrame copies are made. Per-filter
+    removed counts and timings are logged and kept in stats.
+    """
+
+    def __init__(self, catalog_index):
+        self.catalog_index = catalog_index
+        self.mask = np.ones(len(catalog_index), dtype=bool)
+        self.remaining = len(catalog_index)
+        self.stats = []
+
+    def apply(self, name, mask_fn):
+        """Intersects the plan with mask_fn(), a boolean array over all catalog rows."""
+        start = time.perf_counter()
+        self.mask &= mask_fn()
+        remaining = int(np.count_nonzero(self.mask))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        removed = self.remaining - remaining
+        self.remaining = remaining
+        self.stats.append({'filter': name, 'removed': removed, 'remaining': remaining, 'ms': round(elapsed_ms, 2)})
+        logger.info(f"Filter '{name}' removed {removed} candidates in {elapsed_ms:.1f} ms. Candidates left: {remaining}")
+
+    def positions(self):
+        return np.flatnonzero(self.mask)
+
+    def candidates(self):
+        """Materialises the surviving catalog rows (index labels stay catalog row positions)."""
+        return self.catalog_index.df.iloc[self.positions()]
+
+
 def calculate_game_score(row, mech_weights, cat_weights, user_designers, user_publishers,
                          complexity_weights, hotness_scores, query_params, weights,
                          total_mech_weight, total_cat_weight, total_complexity_weight,
@@ -326,10 +327,284 @@ def calculate_game_score(row, mech_weights, cat_weights, user_designers, user_pu
     return comp_score
 
 
+def _vector_sim(matrix, user_weights):
+    """Projected cosine similarity of every row against a weight dict (see calculate_game_score)."""
+    user_norm_sq = sum(v * v for v in user_weights.values())
+    if user_norm_sq <= 0:
+        return np.zeros(matrix.n_rows, dtype=np.float64)
+    dot_sq = matrix.row_sums(matrix.weight_vector(user_weights, power=2))
+    return np.sqrt(dot_sq / user_norm_sq)
+
+
+def _numeric_column(candidates, column):
+    """Returns a float64 array for a catalog column, with NaN for missing or non-numeric values."""
+    if column not in candidates.columns:
+        return np.full(len(candidates), np.nan)
+    return pd.to_numeric(candidates[column], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _indicator(candidates, column, first_only=False):
+    values = candidates[column] if column in candidates.columns else [None] * len(candidates)
+    return IndicatorMatrix.from_lists(values, first_only=first_only)
+
+
+def compute_candidate_scores(candidates, mech_weights, cat_weights, user_designers, user_publishers,
+                             complexity_weights, hotness_scores, catalog_df, query_params, weights,
+                             catalog_index=None):
+    """
+    Vectorized equivalent of calling calculate_game_score on every candidate row.
+
+    Encodes mechanics, categories, designers and the primary publisher as CSR indicator
+    matrices and computes all seven similarity parts as matrix-vector products.
+    When catalog_index is given, candidates must be rows of catalog_index.df (their index
+    labels are catalog row positions) and the prebuilt matrices are reused instead of
+    re-encoding the candidate lists.
+    Returns a float64 array of composite scores aligned with the candidates' row order.
+    """
+    n = len(candidates)
+    w_mech = weights.get('w_mech', 0.5)
+    w_cat = weights.get('w_cat', 0.5)
+    w_pop = weights.get('w_pop', 0.5)
+    w_hot = weights.get('w_hot', 0.0)
+    w_comp = weights.get('w_comp', 0.4)
+    w_des = weights.get('w_des', 0.3)
+    w_pub = weights.get('w_pub', 0.1)
+
+    player_count = query_params.get('player_count')
+    duration_pref = query_params.get('duration_pref', 'any').lower()
+    complexity_pref = query_params.get('complexity_pref', 'any').lower()
+    total_complexity_weight = sum(complexity_weights.values()) or 1.0
+
+    if catalog_index is not None:
+        rows = candidates.index.to_numpy()
+        has_complexity = catalog_index.has_complexity
+        has_publishers = catalog_index.has_publishers
+
+        def matrix(column):
+            return catalog_index.features[column]
+
+        def numeric(column):
+            return catalog_index.numeric(column)[rows]
+    else:
+        rows = slice(None)
+        has_complexity = 'complexity' in catalog_df.columns
+        has_publishers = 'publishers' in catalog_df.columns
+
+        def matrix(column):
+            return _indicator(candidates, column, first_only=(column == 'publishers'))
+
+        def numeric(column):
+            return _numeric_column(candidates, column)
+
+    cat_sim = _vector_sim(matrix('categories'), cat_weights)[rows]
+    mech_sim = _vector_sim(matrix('mechanics'), mech_weights)[rows]
+    des_sim = _vector_sim(matrix('designers'), user_designers)[rows] if user_designers else np.zeros(n)
+
+    pub_sim = np.zeros(n)
+    if has_publishers and user_publishers:
+        pub_matrix = matrix('publishers')
+        pub_user_norm = math.sqrt(sum(v * v for v in user_publishers.values()))
+        if pub_user_norm > 0:
+            pub_sim = pub_matrix.row_sums(pub_matrix.weight_vector(user_publishers))[rows] / pub_user_norm
+
+    rating = numeric('rating')
+    rating = np.where(np.isnan(rating), 5.5, rating)
+    pop_score = np.clip((rating - 5.0) / 4.0, 0.0, 1.0)
+
+    hot_score = np.fromiter(
+        (hotness_scores.get(str(g_id), 0.0) for g_id in candidates['id']), dtype=np.float64, count=n
+    )
+
+    # Complexity similarity: explicit preference curve, else the user's bucket distribution
+    comp_sim = np.zeros(n)
+    cand_complexity = numeric('complexity')
+    valid = ~np.isnan(cand_complexity)
+    cc = np.where(valid, cand_complexity, 0.0)
+    if complexity_pref and complexity_pref != 'any':
+        if complexity_pref in ('low', 'light'):
+            curve = np.where(cc <= 2.0, 1.0, np.maximum(0.0, 1.0 - ((cc - 2.0) / 2.0)))
+        elif complexity_pref in ('high', 'heavy'):
+            curve = np.where(cc >= 3.5, 1.0, np.maximum(0.0, 1.0 - ((3.5 - cc) / 2.5)))
+        elif complexity_pref == 'medium':
+            curve = np.where(
+                (cc >= 2.0) & (cc <= 3.5), 1.0,
+                np.where(cc < 2.0,
+                         np.maximum(0.0, 1.0 - ((2.0 - cc) / 2.0)),
+                         np.maximum(0.0, 1.0 - ((cc - 3.5) / 1.5)))
+            )
+        else:
+            curve = np.zeros(n)
+        comp_sim = np.where(valid, curve, 0.0)
+    elif has_complexity and total_complexity_weight > 0:
+        bucket_weights = np.array([
+            complexity_weights.get("Light", 0.0),
+            complexity_weights.get("Medium-Light", 0.0),
+            complexity_weights.get("Medium-Heavy", 0.0),
+            complexity_weights.get("Heavy", 0.0),
+        ], dtype=np.float64)
+        bucket_idx = np.select([cc < 2.0, cc <= 2.8, cc <= 3.5], [0, 1, 2], default=3)
+        comp_sim = np.where(valid, bucket_weights[bucket_idx] / total_complexity_weight, 0.0)
+
+    denominator = w_mech + w_cat + w_pop + w_hot + w_comp + w_des + w_pub
+    if denominator > 0:
+        scores = (
+            w_mech * mech_sim +
+            w_cat * cat_sim +
+            w_pop * pop_score +
+            w_hot * hot_score +
+            w_comp * comp_sim +
+            w_des * des_sim +
+            w_pub * pub_sim
+        ) / denominator
+    else:
+        scores = np.zeros(n)
+
+    # A. Community suggested player count booster/penalty
+    if player_count:
+        p_str = str(player_count)
+        is_best = matrix('suggested_players_best').contains(p_str)[rows]
+        is_rec = matrix('suggested_players_recommended').contains(p_str)[rows]
+        scores = np.where(is_best, scores * 1.10, np.where(is_rec, scores, scores * 0.75))
+
+    # B. Play time duration preference soft penalty
+    if duration_pref and duration_pref != 'any':
+        playing_time = numeric('playing_time')
+        pt_valid = ~np.isnan(playing_time)
+        pt = np.where(pt_valid, playing_time, 0.0)
+        if duration_pref == 'short':
+            dur_mult = np.where(pt <= 45, 1.0, np.maximum(0.5, 1.0 - ((pt - 45.0) / 90.0)))
+        elif duration_pref == 'long':
+            dur_mult = np.where(pt >= 90, 1.0, np.maximum(0.5, 1.0 - ((90.0 - pt) / 90.0)))
+        elif duration_pref == 'medium':
+            dur_mult = np.where(
+                (pt >= 45) & (pt <= 90), 1.0,
+                np.where(pt < 45,
+                         np.maximum(0.6, 1.0 - ((45.0 - pt) / 45.0)),
+                         np.maximum(0.6, 1.0 - ((pt - 90.0) / 90.0)))
+            )
+        else:
+            dur_mult = np.ones(n)
+        scores = np.where(pt_valid, scores * dur_mult, scores)
+
+    return scores
+
+
+def _candidate_columns(candidates):
+    possible_columns = [
+        'id', 'name', 'categories', 'mechanics', 'rating', 'year_published',
+        'min_players', 'max_players', 'playing_time', 'min_playtime', 'max_playtime',
+        'complexity', 'min_age', 'thumbnail', 'image', 'designers', 'publishers',
+        'suggested_players_best', 'suggested_players_recommended'
+    ]
+    return [col for col in possible_columns if col in candidates.columns]
+
+
+def top_k_positions(scores, k):
+    """
+    Returns the row positions of the k highest scores, best first.
+
+    Uses np.argpartition instead of a full sort. Ties are broken by row position, so the
+    result is identical to np.argsort(-scores, kind='stable')[:k] (and therefore to the
+    stable list.sort(reverse=True) the loop engine uses). NaN scores rank last.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    neg = np.where(np.isnan(scores), np.inf, -scores)
+    if k >= n:
+        return np.argsort(neg, kind='stable')
+
+    kth = neg[np.argpartition(neg, k - 1)[k - 1]]
+    better = np.flatnonzero(neg < kth)
+    ties = np.flatnonzero(neg == kth)[:k - len(better)]
+    selected = np.concatenate([better, ties])
+    return selected[np.lexsort((selected, neg[selected]))]
+
+
+class RankedCandidates:
+    """
+    Lazily ranked view over scored candidates.
+
+    Rows are materialised as dicts only when fetched. fetch() hands out candidates in rank
+    order from an internal cursor, so post-filters that drop rows (dislike exclusions,
+    diversity caps) can pull replacements without re-scoring or sorting the full pool.
+    """
+
+    def __init__(self, candidates, scores, columns):
+        self.candidates = candidates
+        self.scores = scores
+        self.columns = columns
+        self.cursor = 0
+        self._order = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def _ensure_order(self, k):
+        k = min(k, len(self.scores))
+        if k > len(self._order):
+            # Grow geometrically so repeated small fetches stay cheap
+            grow_to = min(len(self.scores), max(k, 2 * len(self._order)))
+            self._order = top_k_positions(self.scores, grow_to)
+        return self._order[:k]
+
+    def top(self, k):
+        """Returns (records, scores) for the k best candidates without moving the cursor."""
+        order = self._ensure_order(k)
+        records = self.candidates.iloc[order][self.columns].to_dict('records')
+        return records, self.scores[order]
+
+    def fetch(self, n):
+        """Returns the next n candidate records in rank order and advances the cursor."""
+        order = self._ensure_order(self.cursor + n)[self.cursor:]
+        self.cursor += len(order)
+        if len(order) == 0:
+            return []
+        return self.candidates.iloc[order][self.columns].to_dict('records')
+
+
+def rank_candidates(candidates, mech_weights, cat_weights, user_designers, user_publishers,
+                    complexity_weights, hotness_scores, catalog_df, query_params, weights=None,
+                    engine=None, catalog_index=None):
+    """
+    Scores every candidate and returns a RankedCandidates view for top-K selection.
+    engine and catalog_index behave as in score_candidates.
+    """
+    if weights is None:
+        from cache_utils import parse_weights
+        weights = parse_weights(query_params)
+
+    columns_to_keep = _candidate_columns(candidates)
+    if candidates.empty:
+        return RankedCandidates(candidates, np.zeros(0, dtype=np.float64), columns_to_keep)
+
+    engine = (engine or SCORING_ENGINE).lower()
+    if engine == 'loop':
+        scores = np.array(_loop_scores(
+            candidates[columns_to_keep].to_dict('records'), mech_weights, cat_weights,
+            user_designers, user_publishers, complexity_weights, hotness_scores,
+            catalog_df, query_params, weights
+        ), dtype=np.float64)
+    else:
+        scores = compute_candidate_scores(
+            candidates, mech_weights, cat_weights, user_designers, user_publishers,
+            complexity_weights, hotness_scores, catalog_df, query_params, weights,
+            catalog_index=catalog_index
+        )
+    return RankedCandidates(candidates, scores, columns_to_keep)
+
+
 def score_candidates(candidates, mech_weights, cat_weights, user_designers, user_publishers,
-                     complexity_weights, hotness_scores, catalog_df, query_params, weights=None):
+                     complexity_weights, hotness_scores, catalog_df, query_params, weights=None,
+                     engine=None, catalog_index=None, k=40):
     """
-    Scores candidate games against user taste profiles and returns top-40 ranked results.
+    Scores candidate games against user taste profiles and returns the top-k ranked results.
+
+    engine selects the implementation: 'vectorized' (sparse matrix products, default) or
+    'loop' (calculate_game_score per row). Both return identical rankings; the loop engine
+    is kept as the reference for cross-checking. Defaults to the SCORING_ENGINE env var.
+    catalog_index (a CatalogIndex whose df the candidates were filtered from) lets the
+    vectorized engine reuse the prebuilt feature matrices.
 
     Returns list of dicts (each being a candidate row from the catalog).
     """
@@ -337,6 +612,24 @@ def score_candidates(candidates, mech_weights, cat_weights, user_designers, user
         from cache_utils import parse_weights
         weights = parse_weights(query_params)
 
+    engine = (engine or SCORING_ENGINE).lower()
+    if engine == 'loop':
+        return _score_candidates_loop(
+            candidates, mech_weights, cat_weights, user_designers, user_publishers,
+            complexity_weights, hotness_scores, catalog_df, query_params, weights, k=k
+        )
+
+    ranked = rank_candidates(
+        candidates, mech_weights, cat_weights, user_designers, user_publishers,
+        complexity_weights, hotness_scores, catalog_df, query_params, weights,
+        engine=engine, catalog_index=catalog_index
+    )
+    return ranked.fetch(k)
+
+
+def _loop_scores(candidate_records, mech_weights, cat_weights, user_designers, user_publishers,
+                 complexity_weights, hotness_scores, catalog_df, query_params, weights):
+    """Scores each candidate record with calculate_game_score (reference engine)."""
     total_complexity_weight = sum(complexity_weights.values()) or 1.0
     total_cat_weight = sum(cat_weights.values()) or 1.0
     total_mech_weight = sum(mech_weights.values()) or 1.0
@@ -345,41 +638,73 @@ def score_candidates(candidates, mech_weights, cat_weights, user_designers, user
     has_complexity = 'complexity' in catalog_df.columns
     has_publishers = 'publishers' in catalog_df.columns
 
-    # Convert candidates dataframe to a list of dicts for fast iteration
-    possible_columns = [
-        'id', 'name', 'categories', 'mechanics', 'rating', 'year_published',
-        'min_players', 'max_players', 'playing_time', 'min_playtime', 'max_playtime',
-        'complexity', 'min_age', 'thumbnail', 'image', 'designers', 'publishers',
-        'suggested_players_best', 'suggested_players_recommended'
-    ]
-    columns_to_keep = [col for col in possible_columns if col in candidates.columns]
-    candidate_records = candidates[columns_to_keep].to_dict('records')
-
-    candidate_scores = []
-    for row in candidate_records:
-        comp_score = calculate_game_score(
+    return [
+        calculate_game_score(
             row, mech_weights, cat_weights, user_designers, user_publishers,
             complexity_weights, hotness_scores, query_params, weights,
             total_mech_weight, total_cat_weight, total_complexity_weight,
             total_des_weight, total_pub_weight, has_complexity, has_publishers
         )
-        candidate_scores.append((comp_score, row))
+        for row in candidate_records
+    ]
 
+
+def _score_candidates_loop(candidates, mech_weights, cat_weights, user_designers, user_publishers,
+                           complexity_weights, hotness_scores, catalog_df, query_params, weights, k=40):
+    """Reference per-row implementation of score_candidates."""
+    # Convert candidates dataframe to a list of dicts for fast iteration
+    candidate_records = candidates[_candidate_columns(candidates)].to_dict('records')
+    scores = _loop_scores(
+        candidate_records, mech_weights, cat_weights, user_designers, user_publishers,
+        complexity_weights, hotness_scores, catalog_df, query_params, weights
+    )
+
+    candidate_scores = list(zip(scores, candidate_records))
     candidate_scores.sort(key=lambda x: x[0], reverse=True)
-    top_candidates = [item[1] for item in candidate_scores[:40]]
+    top_candidates = [item[1] for item in candidate_scores[:k]]
     return top_candidates
 
 
-def diversify_candidates(scored_candidates, max_per_mechanic=4, max_per_category=5, target_count=25):
+def diversify_candidates(scored_candidates, max_per_mechanic=4, max_per_category=5, target_count=25,
+                          fetch_more=None, max_extra=100):
     """
     Applies a deterministic diversification pass on scored candidates.
     Ensures that we do not cluster too many games with the same primary mechanic or category.
     The highest-scored candidate is always retained.
-    
+
+    fetch_more, when given, is called as fetch_more(n) to pull up to n further candidates in
+    rank order (e.g. RankedCandidates.fetch) whenever the list runs short or the caps skip too
+    many. It may return fewer than n (even none, e.g. when every pulled game was filtered out)
+    and returns None once the ranked pool is exhausted. At most max_extra candidates are
+    requested in total.
+
     If fewer than 25 diverse candidates can be selected, falls back to returning the original list.
     """
     from collections import defaultdict
 
+    original_candidates = scored_candidates
+    extra_requested = 0
+    exhausted = fetch_more is None
+
+    def pull(n):
+        """Appends up to n more ranked candidates; returns False once no more can be pulled."""
+        nonlocal extra_requested, exhausted
+        n = min(n, max_extra - extra_requested)
+        if exhausted or n <= 0:
+            return False
+        extra_requested += n
+        batch = fetch_more(n)
+        if batch is None:
+            exhausted = True
+            return False
+        scored_candidates.extend(batch)
+        return True
+
+    if fetch_more is not None:
+        scored_candidates = list(scored_candidates or [])
+        while len(scored_candidates) < 25 and pull(25 - len(scored_candidates)):
+            pass
+
     if not scored_candidates or len(scored_candidates) < 25:
         logger.info(
             f"Skipping diversity pass: candidate list size {len(scored_candidates) if scored_candidates else 0} "
@@ -399,9 +724,14 @@ def diversify_candidates(scored_candidates, max_per_mechanic=4, max_per_category
     caps_hit_mechanics = set()
     caps_hit_categories = set()
 
-    for idx, row in enumerate(scored_candidates):
-        if len(selected) >= target_count:
+    idx = -1
+    while len(selected) < target_count:
+        idx += 1
+        while idx >= len(scored_candidates) and pull(target_count - len(selected)):
+            pass
+        if idx >= len(scored_candidates):
             break
+        row = scored_candidates[idx]
 
         cand_mechs = row.get('mechanics')
         cand_cats = row.get('categories')
@@ -456,8 +786,10 @@ def diversify_candidates(scored_candidates, max_per_mechanic=4, max_per_category
             f"Diversity pass failed: only {len(selected)} diverse candidates could be selected "
             f"(target: {target_count}). Falling back to original unmodified candidates list."
         )
-        return scored_candidates
+        return original_candidates
 
+    if extra_requested:
+        logger.info(f"Diversity pass requested {extra_requested} extra ranked candidates to fill caps.")
     logger.info(
         f"Diversity pass complete. Selected {len(selected)} candidates. "
         f"Skipped {skipped_count} candidates due to caps (mechanic cap: {skipped_by_mechanic}, "
@@ -468,10 +800,16 @@ def diversify_candidates(scored_candidates, max_per_mechanic=4, max_per_category
     return selected
 
 
-def filter_dislike_exclusions(candidates, user_df, catalog_df):
+def filter_dislike_exclusions(candidates, user_df, catalog_df, catalog_index=None, fetch_more=None,
+                              max_extra=100):
     """
     Filters out candidates dominated by mechanics of disliked games (rating < 6.5)
     and having no overlap with liked games' mechanics.
+
+    With a catalog_index, liked/disliked mechanics are read from the prebuilt mechanics
+    matrix instead of merging the user's games against the catalog.
+    fetch_more, when given, is called as fetch_more(n) to pull replacement candidates in
+    rank order so the result keeps its original length where possible (up to max_extra).
     """
     if user_df is None or user_df.empty:
         return candidates
@@ -484,41 +822,57 @@ def filter_dislike_exclusions(candidates, user_df, catalog_df):
     if disliked_df.empty:
         return candidates
 
-    # Get mechanics of liked games
-    liked_joined = liked_df.merge(catalog_df, on='id', how='inner')
-    like_mechs = set()
-    for _, row in liked_joined.iterrows():
-        mechs = safe_list(row.get('mechanics'))
-        like_mechs.update(mechs)
-
-    # Get mechanics of disliked games
-    disliked_joined = disliked_df.merge(catalog_df, on='id', how='inner')
-    dislike_mechs = set()
-    for _, row in disliked_joined.iterrows():
-        mechs = safe_list(row.get('mechanics'))
-        dislike_mechs.update(mechs)
+    if catalog_index is not None:
+        mech_matrix = catalog_index.features['mechanics']
+        like_mechs = mech_matrix.tokens(catalog_index.positions(liked_df['id']))
+        dislike_mechs = mech_matrix.tokens(catalog_index.positions(disliked_df['id']))
+    else:
+        # Get mechanics of liked games
+        liked_joined = liked_df.merge(catalog_df, on='id', how='inner')
+        like_mechs = set()
+        for _, row in liked_joined.iterrows():
+            mechs = safe_list(row.get('mechanics'))
+            like_mechs.update(mechs)
+
+        # Get mechanics of disliked games
+        disliked_joined = disliked_df.merge(catalog_df, on='id', how='inner')
+        dislike_mechs = set()
+        for _, row in disliked_joined.iterrows():
+            mechs = safe_list(row.get('mechanics'))
+            dislike_mechs.update(mechs)
 
     if not dislike_mechs:
         return candidates
 
+    target_count = len(candidates)
+    pending = list(candidates)
+    extra_fetched = 0
     filtered = []
     excluded_count = 0
-    for row in candidates:
-        cand_mechs = set(safe_list(row.get('mechanics')))
-        if not cand_mechs:
+    while pending:
+        for row in pending:
+            cand_mechs = set(safe_list(row.get('mechanics')))
+            if not cand_mechs:
+                filtered.append(row)
+                continue
+
+            like_overlap = cand_mechs.intersection(like_mechs)
+            dislike_overlap = cand_mechs.intersection(dislike_mechs)
+
+            # Dominated check: shares no overlap with liked mechanics AND
+            # has dislike mechanics representing at least 50% of the candidate's mechanics
+            if len(like_overlap) == 0 and len(dislike_overlap) > 0 and len(dislike_overlap) >= len(cand_mechs) / 2.0:
+                excluded_count += 1
+                logger.info(f"Excluding candidate {row.get('name')} due to dislike mechanics domination (no liked mechanics, dislike overlap: {dislike_overlap})")
+                continue
             filtered.append(row)
-            continue
 
-        like_overlap = cand_mechs.intersection(like_mechs)
-        dislike_overlap = cand_mechs.intersection(dislike_mechs)
-
-        # Dominated check: shares no overlap with liked mechanics AND
-        # has dislike mechanics representing at least 50% of the candidate's mechanics
-        if len(like_overlap) == 0 and len(dislike_overlap) > 0 and len(dislike_overlap) >= len(cand_mechs) / 2.0:
-            excluded_count += 1
-            logger.info(f"Excluding candidate {row.get('name')} due to dislike mechanics domination (no liked mechanics, dislike overlap: {dislike_overlap})")
-            continue
-        filtered.append(row)
+        # Pull replacements for excluded candidates from the ranked pool
+        pending = []
+        shortfall = min(target_count - len(filtered), max_extra - extra_fetched)
+        if fetch_more is not None and shortfall > 0:
+            pending = fetch_more(shortfall)
+            extra_fetched += len(pending)
 
     logger.info(f"Dislike hard exclusion filtered {excluded_count} candidates. Remaining: {len(filtered)}")
     return filtered
@@ -1,11 +1,17 @@
 import os
 import json
-import math
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import pandas as pd
-import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from taste_profile import (
+    build_taste_profile, build_taste_profiles, select_liked_games, select_liked_games_by_user,
+)
 
 # Initialize Structured Logging with AWS Lambda Powertools or Fallback
 try:
@@ -39,10 +45,15 @@ except ImportError:
             return func
     logger = FallbackLogger()
 
+# Worker threads for batch-mode S3 downloads/uploads (also sizes the S3 connection pool)
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '32'))
+
 # Initialize AWS Client
-s3 = boto3.client('s3')
+s3 = boto3.client('s3', config=Config(max_pool_connections=BATCH_MAX_WORKERS))
 bucket = os.environ.get('S3_OUTPUT_BUCKET_NAME', 'boardgame-app')
 
+USERS_PREFIX = "data/users/"
+
 # In-memory cache for catalog
 CATALOG_CACHE = None
 
@@ -59,6 +70,7 @@ def get_catalog():
     logger.info(f"Downloading catalog file: {key}")
     s3.download_file(bucket, key, local_path)
     CATALOG_CACHE = pd.read_parquet(local_path)
+    CATALOG_CACHE['id'] = CATALOG_CACHE['id'].astype(str)
     logger.info(f"Successfully loaded and cached catalog with {len(CATALOG_CACHE)} games.")
     return CATALOG_CACHE
 
@@ -95,6 +107,17 @@ def extract_usernames_from_body(body_str):
         return [u]
     return []
 
+def _profile_document(weights):
+    """Orders a built taste profile into the JSON document the recommender reads."""
+    return {
+        "mech_weights": weights["mech_weights"],
+        "cat_weights": weights["cat_weights"],
+        "complexity_weights": weights["complexity_weights"],
+        "designer_weights": weights["designer_weights"],
+        "publisher_weights": weights["publisher_weights"],
+        "generated_at": datetime.now(timezone.utc).isoformat()
+    }
+
 def process_taste_profile(username):
     """Calculates and uploads the taste profile JSON for a single user."""
     logger.info(f"Generating taste profile for user: {username}")
@@ -109,123 +132,12 @@ def process_taste_profile(username):
     user_df['id'] = user_df['id'].astype(str)
 
     catalog_df = get_catalog()
-    catalog_df['id'] = catalog_df['id'].astype(str)
-
-    # Replicate inline profile selection logic from bgg_recommender.py
-    liked_games = user_df[user_df['rating'] >= 7.0]
-    if liked_games.empty:
-        liked_games = user_df[user_df['own']]
-    if liked_games.empty:
-        liked_games = user_df.sort_values(by='rating', ascending=False).head(10)
-
-    liked_joined = liked_games.merge(catalog_df, on='id', how='inner', suffixes=('_user', '_catalog'))
-
-    mech_weights = {}
-    cat_weights = {}
-    designer_weights = {}
-    publisher_weights = {}
-    complexity_weights = {
-        "Light": 0.0,
-        "Medium-Light": 0.0,
-        "Medium-Heavy": 0.0,
-        "Heavy": 0.0
-    }
-    complexity_counts = {
-        "Light": 0,
-        "Medium-Light": 0,
-        "Medium-Heavy": 0,
-        "Heavy": 0
-    }
 
-    if not liked_joined.empty:
-        # Default complexity fallback if none of the games have complexity data
-        complexity_weights["Medium-Light"] = 1.0
-
-        # Derive rating-weighted affinities
-        has_publishers = 'publishers' in liked_joined.columns
-        has_complexity = 'complexity' in liked_joined.columns
-        
-        complexity_count = 0
-        for _, row in liked_joined.iterrows():
-            u_rating = row.get('rating_user')
-            try:
-                u_rating = float(u_rating)
-                if math.isnan(u_rating) or u_rating <= 0:
-                    u_rating = 7.0
-            except (ValueError, TypeError):
-                u_rating = 7.0
-            
-            weight = max(1.0, u_rating - 5.0)
-
-            cats = row.get('categories')
-            mechs = row.get('mechanics')
-            cats = list(cats) if isinstance(cats, (list, np.ndarray)) else []
-            mechs = list(mechs) if isinstance(mechs, (list, np.ndarray)) else []
-            
-            for c in set(cats):
-                cat_weights[c] = cat_weights.get(c, 0.0) + weight
-            for m in set(mechs):
-                mech_weights[m] = mech_weights.get(m, 0.0) + weight
-
-            des = row.get('designers')
-            des = list(des) if isinstance(des, (list, np.ndarray)) else []
-            for d in des:
-                designer_weights[d] = designer_weights.get(d, 0.0) + weight
-
-            if has_publishers:
-                pubs = row.get('publishers')
-                pubs = list(pubs) if isinstance(pubs, (list, np.ndarray)) else []
-                if pubs:
-                    primary_pub = pubs[0]
-                    publisher_weights[primary_pub] = publisher_weights.get(primary_pub, 0.0) + weight
-
-            if has_complexity:
-                comp = row.get('complexity')
-                if comp is not None and not math.isnan(float(comp)):
-                    comp = float(comp)
-                    # Reset the default fallback on first valid complexity game
-                    if complexity_count == 0:
-                        complexity_weights = {
-                            "Light": 0.0,
-                            "Medium-Light": 0.0,
-                            "Medium-Heavy": 0.0,
-                            "Heavy": 0.0
-                        }
-                        complexity_counts = {
-                            "Light": 0,
-                            "Medium-Light": 0,
-                            "Medium-Heavy": 0,
-                            "Heavy": 0
-                        }
-                    complexity_count += 1
-                    if comp < 2.0:
-                        comp_bucket = "Light"
-                    elif comp <= 2.8:
-                        comp_bucket = "Medium-Light"
-                    elif comp <= 3.5:
-                        comp_bucket = "Medium-Heavy"
-                    else:
-                        comp_bucket = "Heavy"
-                    complexity_weights[comp_bucket] += weight
-                    complexity_counts[comp_bucket] += 1
-
-        # Compute averages for complexity weights if we had valid complexity data
-        if complexity_count > 0:
-            for b in complexity_weights:
-                if complexity_counts[b] > 0:
-                    complexity_weights[b] = round(complexity_weights[b] / complexity_counts[b], 2)
-                else:
-                    complexity_weights[b] = 0.0
+    # Same liked-game selection and weighting as the recommender's inline profiles
+    weights = build_taste_profile(select_liked_games(user_df), catalog_df)
 
     # Write profile JSON
-    profile = {
-        "mech_weights": mech_weights,
-        "cat_weights": cat_weights,
-        "complexity_weights": complexity_weights,
-        "designer_weights": designer_weights,
-        "publisher_weights": publisher_weights,
-        "generated_at": datetime.now(timezone.utc).isoformat()
-    }
+    profile = _profile_document(weights)
 
     local_profile_path = f"/tmp/{username}_taste_profile.json"
     with open(local_profile_path, 'w', encoding='utf-8') as f:
@@ -236,10 +148,115 @@ def process_taste_profile(username):
     s3.upload_file(local_profile_path, bucket, dest_key)
     logger.info(f"Successfully generated and uploaded taste profile for {username}")
 
+def list_user_collection_keys():
+    """Lists every user collection parquet directly under data/users/ (no profiles, no subfolders)."""
+    keys = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=USERS_PREFIX):
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            name = key[len(USERS_PREFIX):]
+            if name.endswith('.parquet') and '/' not in name:
+                keys.append(key)
+    return keys
+
+def _read_user_collection(key):
+    """Reads one user parquet as an Arrow table with normalized id/rating/own columns plus username."""
+    username = os.path.basename(key)[:-8]  # strip '.parquet'
+    body = s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+    table = pq.read_table(pa.BufferReader(body))
+    n = table.num_rows
+
+    def column(name, dtype, default):
+        if name in table.column_names:
+            return table.column(name).cast(dtype)
+        return pa.array([default] * n, type=dtype)
+
+    return pa.table({
+        'username': pa.array([username] * n, type=pa.string()),
+        'id': column('id', pa.string(), None),
+        'rating': column('rating', pa.float64(), None),
+        'own': column('own', pa.bool_(), False),
+    })
+
+def load_user_collections(keys):
+    """
+    Downloads and parses the given user parquets concurrently and stacks them into one Arrow
+    table. Returns (table, failed usernames); unreadable files are logged and skipped.
+    """
+    tables, failed = [], []
+    with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as pool:
+        futures = [(key, pool.submit(_read_user_collection, key)) for key in keys]
+        for key, future in futures:
+            try:
+                tables.append(future.result())
+            except Exception as e:
+                logger.error(f"Failed to load user collection {key}: {e}")
+                failed.append(os.path.basename(key)[:-8])
+    if not tables:
+        return None, failed
+    return pa.concat_tables(tables), failed
+
+def _upload_profile(username, profile):
+    dest_key = f"{USERS_PREFIX}{username}_taste_profile.json"
+    s3.put_object(
+        Bucket=bucket,
+        Key=dest_key,
+        Body=json.dumps(profile, ensure_ascii=False).encode('utf-8'),
+        ContentType='application/json',
+    )
+
+def run_batch_regeneration():
+    """
+    Regenerates the taste profile of every user with a collection parquet under data/users/.
+
+    Collections are loaded concurrently into one Arrow table, every profile is computed in a
+    single grouped pass against the catalog, and the JSON profiles are uploaded in parallel.
+    Intended to run right after the weekly user compaction so the recommender finds a fresh
+    precomputed profile instead of building one inline.
+    """
+    keys = list_user_collection_keys()
+    logger.info(f"Batch taste-profile regeneration over {len(keys)} user collections")
+    if not keys:
+        return {"users": 0, "uploaded": 0, "failed": []}
+
+    table, failed = load_user_collections(keys)
+    if table is None:
+        return {"users": len(keys), "uploaded": 0, "failed": failed}
+
+    user_games = table.to_pandas()
+    catalog_df = get_catalog()
+    liked = select_liked_games_by_user(user_games)
+    profiles = build_taste_profiles(liked, catalog_df)
+
+    # Users with empty collections still get the default profile, as in per-user mode
+    default_profile = build_taste_profile(user_games.iloc[:0], catalog_df)
+    usernames = [os.path.basename(k)[:-8] for k in keys]
+    documents = {u: _profile_document(profiles.get(u, default_profile))
+                 for u in usernames if u not in failed}
+
+    uploaded = 0
+    with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as pool:
+        futures = [(u, pool.submit(_upload_profile, u, doc)) for u, doc in documents.items()]
+        for username, future in futures:
+            try:
+                future.result()
+                uploaded += 1
+            except Exception as e:
+                logger.error(f"Failed to upload taste profile for {username}: {e}")
+                failed.append(username)
+
+    logger.info(f"Batch regeneration uploaded {uploaded} of {len(keys)} taste profiles")
+    return {"users": len(keys), "uploaded": uploaded, "failed": failed}
+
 @logger.inject_lambda_context
 def lambda_handler(event, context):
     logger.info("Received event", extra={"event": event})
-    
+
+    # Scheduled / manual invocation: {"mode": "batch"} regenerates every user's profile
+    if isinstance(event, dict) and event.get('mode') == 'batch':
+        return run_batch_regeneration()
+
     batch_item_failures = []
     
     for record in event.get('Records', []):
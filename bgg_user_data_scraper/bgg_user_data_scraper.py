@@ -1,14 +1,21 @@
+import hashlib
+import io
 import json
-import requests
 import xml.etree.ElementTree as ET
 import os
 import random
+import heapq
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import pandas as pd
 import pyarrow
 import pyarrow.parquet as pq
 import boto3
+from botocore.exceptions import ClientError
+
+import bgg_http
+import bgg_rate_limiter
 # Initialize Structured Logging with AWS Lambda Powertools or Fallback
 try:
     from aws_lambda_powertools import Logger
@@ -42,6 +49,19 @@ except ImportError:
     logger = FallbackLogger()
 
 S3_OUTPUT_BUCKET_NAME = os.environ.get('S3_OUTPUT_BUCKET_NAME', 'boardgame-app')
+s3 = boto3.client('s3')
+# Collection requests in flight at once (all still paced by the shared BGG rate limiter)
+COLLECTION_MAX_WORKERS = int(os.environ.get('COLLECTION_MAX_WORKERS', '10'))
+# Attempts per user within one invocation, counting polls of a queued (202) collection
+COLLECTION_MAX_ATTEMPTS = int(os.environ.get('COLLECTION_MAX_ATTEMPTS', '6'))
+# Invocation time kept back for writing results; users still queued by then go back to SQS
+TIME_BUDGET_MARGIN_SECONDS = float(os.environ.get('TIME_BUDGET_MARGIN_SECONDS', '15'))
+
+# request_collection() result for a collection BGG has accepted but not built yet
+QUEUED = 'queued'
+
+# User metadata on data/users/{user}.parquet holding the hash of the collection it contains
+COLLECTION_HASH_METADATA_KEY = 'collection-hash'
 
 def _get_element_value(element, xpath, attribute='value', default=None):
     """Helper to safely get an attribute value from an XML element."""
@@ -50,81 +70,243 @@ def _get_element_value(element, xpath, attribute='value', default=None):
         return found_element.get(attribute, default)
     return default
 
-def get_user_data(username):
+def _safe_float(val):
+    try:
+        return float(val) if val is not None else None
+    except (ValueError, TypeError):
+        return None
+
+def _parse_collection_item(item, username):
+    """Returns the collection row for an <item>, or None when it is neither rated nor owned."""
+    rating = _safe_float(_get_element_value(item, ".//stats/rating", attribute='value'))
+    own = _get_element_value(item, ".//status", attribute='own') == '1'
+    # rating=0.0 is falsy; on BGG this means "not rated", so we intentionally skip it
+    if rating or own:
+        return {
+            'id': item.get('objectid'),
+            'username': username,
+            'rating': rating,
+            'own': own
+        }
+    return None
+
+def stream_collection(source, username):
     """
-    Queries the BoardGameGeek API for a user's collection data.
-    Returns a dictionary with user collection information.
+    Streams a BGG /collection response with iterparse.
+
+    Each <item> is turned into a row as soon as it closes and is then cleared from the
+    tree, so large collections never hold the whole document. An <errors> document is kept
+    intact so its message can be read. Returns (root element, rated/owned rows, number of items).
+    """
+    root = None
+    rows = []
+    item_count = 0
+    item_depth = 0
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            elif elem.tag == 'item':
+                item_depth += 1
+            continue
+        if elem.tag != 'item' or elem is root:
+            continue
+        item_depth -= 1
+        if item_depth:
+            continue  # nested <item>: handled with its outermost item
+        item_count += 1
+        row = _parse_collection_item(elem, username)
+        if row is not None:
+            rows.append(row)
+        if root.tag != 'errors':
+            # Drop finished items but keep the root's leading text (the "accepted" message check)
+            text = root.text
+            root.clear()
+            root.text = text
+    return root, rows, item_count
+
+def _retry_delay(attempt, base_delay=10, max_delay=60):
+    """Exponential backoff with random jitter before attempt number attempt + 1."""
+    delay = min(max_delay, base_delay * (2 ** attempt))
+    return delay / 2.0 + random.uniform(0, delay / 2.0)
+
+def request_collection(username, limiter=None):
+    """
+    Makes one collection request for a user through the shared rate limiter.
+    Returns the rated/owned rows, [] for an unknown user, None when the collection is empty,
+    or QUEUED when BGG has accepted the request but not built the collection yet.
+    Raises on HTTP and parse errors.
     """
     api_url = f"https://boardgamegeek.com/xmlapi2/collection?username={username}&subtype=boardgame&excludesubtype=boardgameexpansion&stats=1"
     logger.info(f"Querying BGG API for user: {username} at {api_url}")
 
+    limiter = limiter or bgg_rate_limiter.get_limiter()
+    limiter.acquire()
+    bgg_api_token = os.environ.get('BGG_API_TOKEN')
+    headers = {}
+    if bgg_api_token:
+        headers["Authorization"] = f"Bearer {bgg_api_token}"
+    response = bgg_http.get(api_url, headers=headers)
+    limiter.record_response(response.status_code, response.headers.get('Retry-After'))
+    response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
+    xml_data = response.content
+    logger.info(f"Successfully received response for user {username}.")
+
+    root, user_data, item_count = stream_collection(io.BytesIO(xml_data), username)
+
+    # Check for BGG API errors (e.g., non-existent user)
+    if root.tag == 'errors':
+        error_msg = root.find(".//error/message")
+        error_text = error_msg.text if error_msg is not None else "Invalid username specified"
+        logger.error(f"BGG API returned error for user {username}: {error_text}")
+        return [] # Gracefully return empty list
+
+    if response.status_code == 202 or (root.text and "accepted" in root.text):
+        logger.info(f"BGG queued the collection for {username}: {(root.text or '').strip()}")
+        return QUEUED
+
+    if not item_count:
+        logger.warning(f"No collection items found for user {username}.")
+        return None
+
+    return user_data
+
+def get_user_data(username):
+    """
+    Queries the BoardGameGeek API for a user's collection data, retrying queued and failed requests.
+    Returns a dictionary with user collection information.
+    """
+    limiter = bgg_rate_limiter.get_limiter()
     retries = 3
     for i in range(retries):
         try:
-            bgg_api_token = os.environ.get('BGG_API_TOKEN')
-            headers = {}
-            if bgg_api_token:
-                headers["Authorization"] = f"Bearer {bgg_api_token}"
-            response = requests.get(api_url, headers=headers)
-            response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
-            xml_data = response.content
-            logger.info(f"Successfully received response for user {username}.")
-
-            root = ET.fromstring(xml_data)
-            
-            # Check for BGG API errors (e.g., non-existent user)
-            if root.tag == 'errors':
-                error_msg = root.find(".//error/message")
-                error_text = error_msg.text if error_msg is not None else "Invalid username specified"
-                logger.error(f"BGG API returned error for user {username}: {error_text}")
-                return [] # Gracefully return empty list
-
-            items = root.findall(".//item")
-            if root.text and "accepted" in root.text:
-                raise ValueError(f"BGG API message for {username}: {root.text}")
-
-            if not items:
-                logger.warning(f"No collection items found for user {username}.")
-                return None
-
-            def safe_float(val):
-                try:
-                    return float(val) if val is not None else None
-                except (ValueError, TypeError):
-                    return None
-
-            user_data = []
-            for item in items:
-                rating = safe_float(_get_element_value(item, ".//stats/rating", attribute='value'))
-                own = _get_element_value(item, ".//status", attribute='own') == '1'
-                # rating=0.0 is falsy; on BGG this means "not rated", so we intentionally skip it
-                if rating or own:
-                    user_data.append({
-                        'id': item.get('objectid'),
-                        'username': username,
-                        'rating': rating,
-                        'own': own
-                    })
+            user_data = request_collection(username, limiter)
+            if user_data == QUEUED:
+                raise ValueError(f"BGG API has queued the collection for {username}")
             return user_data
 
         except Exception as e:
             logger.error(f"Error querying BGG API for user {username}: {e}")
             if i < retries - 1:
-                # Exponential backoff with random jitter (base = 10, max = 60)
-                delay = min(60, 10 * (2 ** i))
-                jittered_delay = delay / 2.0 + random.uniform(0, delay / 2.0)
+                jittered_delay = _retry_delay(i)
                 logger.info(f"Retrying in {jittered_delay:.2f} seconds...")
-                time.sleep(jittered_delay)
+                limiter.pause(jittered_delay)
             else:
                 logger.error(f"Max retries reached for user {username}.")
                 return None
 
+def fetch_collections(usernames, deadline=None, max_attempts=COLLECTION_MAX_ATTEMPTS,
+                      max_workers=COLLECTION_MAX_WORKERS, base_delay=10, max_delay=60):
+    """
+    Fetches many users' collections concurrently.
+
+    usernames maps a caller key (the SQS message id) to a username. Every user's first
+    request starts at once; queued (202) and failed requests are retried with per-user
+    jittered backoff, so one slow collection never holds up the others, and the shared rate
+    limiter still paces the actual calls. deadline is a time.monotonic() value after which
+    no new attempt is started and requests still running are abandoned.
+
+    Returns (results, pending): results maps keys to the request_collection() rows, or None
+    once a user's attempts are used up; pending holds the keys still waiting on BGG when the
+    deadline hit.
+    """
+    limiter = bgg_rate_limiter.get_limiter()
+    results = {}
+    attempts = {key: 0 for key in usernames}
+    ready = [(0.0, key) for key in usernames]  # (monotonic time the next attempt may start, key)
+    heapq.heapify(ready)
+    in_flight = {}
+
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        while ready or in_flight:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            while ready and ready[0][0] <= now and len(in_flight) < max_workers:
+                _, key = heapq.heappop(ready)
+                attempts[key] += 1
+                in_flight[pool.submit(request_collection, usernames[key], limiter)] = key
+
+            next_start = ready[0][0] if ready else None
+            if deadline is not None:
+                next_start = deadline if next_start is None else min(next_start, deadline)
+            timeout = None if next_start is None else max(0.0, next_start - time.monotonic())
+            if not in_flight:
+                time.sleep(timeout or 0)
+                continue
+
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = in_flight.pop(future)
+                username = usernames[key]
+                try:
+                    user_data = future.result()
+                except Exception as e:
+                    logger.error(f"Error querying BGG API for user {username}: {e}")
+                    user_data = QUEUED
+                if user_data != QUEUED:
+                    results[key] = user_data
+                elif attempts[key] >= max_attempts:
+                    logger.error(f"Max retries reached for user {username}.")
+                    results[key] = None
+                else:
+                    delay = _retry_delay(attempts[key] - 1, base_delay, max_delay)
+                    logger.info(f"Retrying {username} in {delay:.2f} seconds...")
+                    heapq.heappush(ready, (time.monotonic() + delay, key))
+    finally:
+        # Requests still running at the deadline are abandoned rather than waited on
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    pending = {key for _, key in ready} | set(in_flight.values())
+    if pending:
+        logger.warning(f"Time budget exhausted with {len(pending)} collections still pending.")
+    return results, pending
+
+def collection_hash(user_data):
+    """
+    Hashes a collection's (id, rating, own) rows independent of their order, so a re-scrape
+    of an unchanged collection produces the same hash.
+    """
+    rows = sorted(
+        json.dumps([str(row['id']), row['rating'], bool(row['own'])])
+        for row in user_data
+    )
+    return hashlib.sha256('\n'.join(rows).encode('utf-8')).hexdigest()
+
+def get_stored_collection_hash(key):
+    """Returns the collection hash stored on an existing user parquet, or None if there is none."""
+    try:
+        response = s3.head_object(Bucket=S3_OUTPUT_BUCKET_NAME, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey'):
+            logger.warning(f"Could not read metadata of s3://{S3_OUTPUT_BUCKET_NAME}/{key}: {e}")
+        return None
+    except Exception as e:
+        logger.warning(f"Could not read metadata of s3://{S3_OUTPUT_BUCKET_NAME}/{key}: {e}")
+        return None
+    return response.get('Metadata', {}).get(COLLECTION_HASH_METADATA_KEY)
+
+def mark_collection_checked(user_id, digest):
+    """
+    Records that an unchanged collection was re-scraped. The marker is JSON, so it does not
+    trigger the taste-profile recompute, and the recommender reads its age for staleness.
+    """
+    s3.put_object(
+        Bucket=S3_OUTPUT_BUCKET_NAME,
+        Key=f"data/users/{user_id}_collection_checked.json",
+        Body=json.dumps({'collection_hash': digest}).encode('utf-8'),
+        ContentType='application/json'
+    )
+
 @logger.inject_lambda_context
 def lambda_handler(event, context):
     """
     AWS Lambda handler function.
-    Processes SQS events, extracts user IDs, queries BGG API,
-    and retrieves user collection information.
+    Processes SQS events, extracts user IDs, fetches every user's collection
+    concurrently from the BGG API, and saves each one to S3. Users whose
+    collection is still queued when the time budget runs out are reported
+    as batch item failures so SQS delivers them again.
     """
     logger.info("Received event", extra={"event": event})
 
@@ -139,42 +321,64 @@ def lambda_handler(event, context):
     failed_ids = [] # Keep for logging/debugging purposes if needed
     batch_item_failures = [] # List to store messageIds of failed records
 
+    # Stop starting BGG requests early enough to write the results before the Lambda times out
+    deadline = None
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000.0 - TIME_BUDGET_MARGIN_SECONDS
+
+    usernames = {}
     for record in event['Records']:
         try:
             # SQS message body is expected to be a string
-            user_id = record['body']
-            logger.info(f"Processing user ID from SQS: {user_id}")
+            usernames[record['messageId']] = record['body']
+            logger.info(f"Processing user ID from SQS: {record['body']}")
+        except Exception as e:
+            logger.error(f"An error occurred while processing record: {record.get('messageId')}, Error: {e}")
+            failed_ids.append(record.get('body'))
+            batch_item_failures.append({"itemIdentifier": record.get('messageId')})
 
-            user_data = get_user_data(user_id)
+    results, pending = fetch_collections(usernames, deadline)
 
-            if user_data is not None:
-                logger.info(f"Successfully retrieved data for user {user_id}. Collection size: {len(user_data)}")
+    for message_id, user_id in usernames.items():
+        if message_id in pending:
+            logger.warning(f"Collection for user {user_id} still pending at the time budget; returning it to the queue.")
+            failed_ids.append(user_id)
+            batch_item_failures.append({"itemIdentifier": message_id})
+            continue
 
-                # Convert user_data to pandas DataFrame
-                df = pd.DataFrame(user_data, columns=['id', 'username', 'rating', 'own'])
+        user_data = results.get(message_id)
+        if user_data is not None:
+            logger.info(f"Successfully retrieved data for user {user_id}. Collection size: {len(user_data)}")
 
-                # Define S3 path for the Parquet file
-                s3_output_key = f"users/{user_id}.parquet"
-                s3_full_path = f"s3://{S3_OUTPUT_BUCKET_NAME}/data/{s3_output_key}"
+            # Convert user_data to pandas DataFrame
+            df = pd.DataFrame(user_data, columns=['id', 'username', 'rating', 'own'])
 
-                try:
-                    # Save DataFrame to S3 in Parquet format
-                    df.to_parquet(s3_full_path, index=False, engine='pyarrow')
+            # Define S3 path for the Parquet file
+            s3_output_key = f"users/{user_id}.parquet"
+            s3_full_path = f"s3://{S3_OUTPUT_BUCKET_NAME}/data/{s3_output_key}"
+
+            try:
+                # Skip the PUT for an unchanged collection: rewriting it would recompute the
+                # taste profile and invalidate the user's cached recommendations for nothing
+                digest = collection_hash(user_data)
+                if get_stored_collection_hash(f"data/{s3_output_key}") == digest:
+                    mark_collection_checked(user_id, digest)
+                    logger.info(f"Collection for user {user_id} is unchanged; skipped rewriting {s3_full_path}")
+                else:
+                    # Save DataFrame to S3 in Parquet format, tagged with the collection hash
+                    df.to_parquet(s3_full_path, index=False, engine='pyarrow', storage_options={
+                        's3_additional_kwargs': {'Metadata': {COLLECTION_HASH_METADATA_KEY: digest}}
+                    })
                     logger.info(f"Successfully saved data for user {user_id} to S3: {s3_full_path}")
-                    processed_ids.append(user_id)
-                except Exception as s3_e:
-                    logger.error(f"Error saving data for user {user_id} to S3 ({s3_full_path}): {s3_e}")
-                    failed_ids.append(user_id)
-                    batch_item_failures.append({"itemIdentifier": record['messageId']})
-            else:
-                logger.error(f"Failed to retrieve data for user {user_id} (retries exhausted).")
+                processed_ids.append(user_id)
+            except Exception as s3_e:
+                logger.error(f"Error saving data for user {user_id} to S3 ({s3_full_path}): {s3_e}")
                 failed_ids.append(user_id)
-                batch_item_failures.append({"itemIdentifier": record['messageId']})
-
-        except Exception as e:
-            logger.error(f"An error occurred while processing record: {record.get('messageId')}, Error: {e}")
-            failed_ids.append(record.get('body'))
-            batch_item_failures.append({"itemIdentifier": record['messageId']})
+                batch_item_failures.append({"itemIdentifier": message_id})
+        else:
+            logger.error(f"Failed to retrieve data for user {user_id} (retries exhausted).")
+            failed_ids.append(user_id)
+            batch_item_failures.append({"itemIdentifier": message_id})
 
     if batch_item_failures:
         logger.warning(f"Finished processing with failures. Successfully processed: {len(processed_ids)} IDs. Failed to process: {len(batch_item_failures)} records.")
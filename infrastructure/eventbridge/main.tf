@@ -25,6 +25,40 @@ resource "aws_cloudwatch_event_target" "run_bgg_scraper_task" {
   }
 }
 
+# Hourly reprocess runs of the same task: each queues the next REPROCESS_IDS_PER_RUN stale
+# games (skipping ones queued by earlier runs), so a full refresh is paced over many runs.
+resource "aws_cloudwatch_event_rule" "hourly_bgg_reprocess_schedule" {
+  name                = "hourly-bgg-reprocess-schedule"
+  description         = "Re-queues the next slice of stale games for the BGG data scraper every hour"
+  schedule_expression = "rate(1 hour)"
+}
+
+resource "aws_cloudwatch_event_target" "run_bgg_reprocess_task" {
+  target_id = "run-bgg-reprocess-ecs-task"
+  rule      = aws_cloudwatch_event_rule.hourly_bgg_reprocess_schedule.name
+  arn       = var.ecs_cluster_arn
+  role_arn  = aws_iam_role.eventbridge_ecs_execution_role.arn
+
+  ecs_target {
+    task_definition_arn = var.ecs_task_definition_arn
+    task_count          = 1
+    launch_type         = "FARGATE"
+
+    network_configuration {
+      subnets          = var.ecs_subnets
+      security_groups  = [var.ecs_security_group_id]
+      assign_public_ip = true
+    }
+  }
+
+  input = jsonencode({
+    containerOverrides = [{
+      name        = "bgg-scraper-container"
+      environment = [{ name = "SCRAPE_MODE", value = "reprocess" }]
+    }]
+  })
+}
+
 # 3. IAM Role for EventBridge to invoke ECS
 resource "aws_iam_role" "eventbridge_ecs_execution_role" {
   name = "eventbridge-ecs-execution-role"
@@ -106,6 +140,7 @@ resource "aws_cloudwatch_event_target" "run_bgg_user_compactor_lambda" {
     combined_prefix        = "data/users_combined/"
     output_filename        = "users_combined.parquet"
     apply_schema_alignment = false
+    upsert_key             = "username"
   })
 }
 
@@ -138,3 +173,54 @@ resource "aws_lambda_permission" "allow_eventbridge_to_call_preview_refresh" {
   source_arn    = aws_cloudwatch_event_rule.daily_bgg_preview_refresh_schedule.arn
 }
 
+# 7. EventBridge rule to regenerate every user's taste profile (Sunday 3 AM UTC)
+#    Runs after the weekly user compaction so the recommender finds fresh precomputed
+#    profiles instead of building them inline on the request path.
+resource "aws_cloudwatch_event_rule" "weekly_bgg_taste_profile_batch_schedule" {
+  name                = "weekly-bgg-taste-profile-batch-schedule"
+  description         = "Regenerates all user taste profiles every Sunday at 3 AM"
+  schedule_expression = "cron(0 3 ? * SUN *)"
+}
+
+resource "aws_cloudwatch_event_target" "run_bgg_taste_profile_batch_lambda" {
+  rule      = aws_cloudwatch_event_rule.weekly_bgg_taste_profile_batch_schedule.name
+  target_id = "run-bgg-taste-profile-batch-lambda"
+  arn       = var.taste_analytics_lambda_arn
+  input     = jsonencode({
+    mode = "batch"
+  })
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_to_call_taste_analytics" {
+  statement_id  = "AllowExecutionFromEventBridgeTasteProfileBatch"
+  action        = "lambda:InvokeFunction"
+  function_name = var.taste_analytics_lambda_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.weekly_bgg_taste_profile_batch_schedule.arn
+}
+
+# 8. EventBridge rule for the daily incremental catalog compaction (04:00 UTC)
+#    Merges only raw game files changed since the last compaction's watermark into the
+#    existing catalog.parquet. The weekly full rebuild above still picks up deletions.
+resource "aws_cloudwatch_event_rule" "daily_bgg_incremental_compactor_schedule" {
+  name                = "daily-bgg-incremental-compactor-schedule"
+  description         = "Runs the S3 Parquet Compactor Lambda in incremental mode every day at 4 AM"
+  schedule_expression = "cron(0 4 * * ? *)"
+}
+
+resource "aws_cloudwatch_event_target" "run_bgg_incremental_compactor_lambda" {
+  rule      = aws_cloudwatch_event_rule.daily_bgg_incremental_compactor_schedule.name
+  target_id = "run-bgg-incremental-compactor-lambda"
+  arn       = var.compactor_lambda_arn
+  input     = jsonencode({
+    mode = "incremental"
+  })
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_to_call_incremental_compactor" {
+  statement_id  = "AllowExecutionFromEventBridgeIncrementalCompactor"
+  action        = "lambda:InvokeFunction"
+  function_name = var.compactor_lambda_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.daily_bgg_incremental_compactor_schedule.arn
+}
@@ -8,5 +8,5 @@ variable "compactor_lambda_arn" { type = string }
 variable "compactor_lambda_name" { type = string }
 variable "preview_refresh_lambda_arn" { type = string }
 variable "preview_refresh_lambda_name" { type = string }
-
-
+variable "taste_analytics_lambda_arn" { type = string }
+variable "taste_analytics_lambda_name" { type = string }
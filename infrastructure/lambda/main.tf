@@ -12,6 +12,11 @@ resource "aws_lambda_function" "bgg_game_data_scraper" {
       S3_OUTPUT_BUCKET_NAME = "boardgame-app"
       BGG_API_TOKEN         = var.bgg_api_token
       PYTHONIOENCODING      = "utf-8"
+      # "batch" writes one multi-row parquet per SQS batch instead of one file per game.
+      # Reprocess mode in bgg_game_scraper discovers ids from per-game file names only.
+      RAW_OUTPUT_MODE       = "per_game"
+      # Per-game S3 writes run on this many threads while the next BGG request is paced.
+      UPLOAD_MAX_WORKERS    = "8"
     }
   }
 }
@@ -22,8 +27,10 @@ resource "aws_lambda_event_source_mapping" "bgg_game_data_scraper_esm" {
   enabled          = true
   # 100 IDs are fetched in a SINGLE BGG API call (?id=1,2,...,100&stats=1).
   # This is the primary throughput lever: 10x fewer Lambda invocations vs batch_size=10.
-  # Upper bound is determined by Lambda timeout vs sequential S3 write time (~300ms each):
-  #   100 games x 300ms = 30s S3 writes + ~5s API = ~35s total (well under 180s timeout).
+  # Upper bound is determined by Lambda timeout vs S3 write time (~300ms each):
+  #   100 games x 300ms = 30s of writes, spread over UPLOAD_MAX_WORKERS threads and
+  #   overlapped with the 1s spacing between BGG requests (~4-5s total with 8 workers).
+  #   With RAW_OUTPUT_MODE = "batch" the writes collapse into a single ~300ms PUT.
   batch_size = 100
   # AWS requires this to be > 0 when batch_size > 10. With 60k messages in the
   # queue the batch fills to 100 almost instantly so this doesn't affect throughput.
@@ -59,8 +66,23 @@ resource "aws_lambda_event_source_mapping" "bgg_user_data_scraper_esm" {
 
 data "archive_file" "bgg_api_proxy_zip" {
   type        = "zip"
-  source_file = "../bgg_api_proxy/bgg_api_proxy.py"
   output_path = "${path.module}/bgg_api_proxy.zip"
+
+  source {
+    content  = file("../bgg_api_proxy/bgg_api_proxy.py")
+    filename = "bgg_api_proxy.py"
+  }
+
+  # Shared BGG rate limiter and keep-alive HTTP client (stdlib only) imported by the handler
+  source {
+    content  = file("../bgg_common/bgg_rate_limiter.py")
+    filename = "bgg_rate_limiter.py"
+  }
+
+  source {
+    content  = file("../bgg_common/bgg_http.py")
+    filename = "bgg_http.py"
+  }
 }
 
 resource "aws_lambda_function" "bgg_api_proxy" {
@@ -171,6 +193,29 @@ resource "aws_lambda_function" "bgg_taste_analytics" {
   }
 }
 
+# Same image, invoked only by the weekly {"mode": "batch"} schedule. Regenerating every
+# profile needs far more time and memory than a per-user SQS invocation, so it gets its own
+# limits instead of raising them (and the queue's visibility timeout) on the hot path.
+resource "aws_lambda_function" "bgg_taste_analytics_batch" {
+  function_name = "bgg_taste_analytics_batch"
+  role          = var.lambda_execution_role_arn
+  package_type  = "Image"
+  image_uri     = "${var.bgg_taste_analytics_ecr_url}:latest"
+  timeout       = 900
+  memory_size   = 3008
+
+  environment {
+    variables = {
+      S3_OUTPUT_BUCKET_NAME = var.s3_bucket_name
+      PYTHONIOENCODING      = "utf-8"
+    }
+  }
+
+  lifecycle {
+    ignore_changes = [image_uri]
+  }
+}
+
 resource "aws_lambda_event_source_mapping" "bgg_taste_analytics_esm" {
   event_source_arn        = var.taste_analytics_sqs_queue_arn
   function_name           = aws_lambda_function.bgg_taste_analytics.arn
@@ -181,8 +226,23 @@ resource "aws_lambda_event_source_mapping" "bgg_taste_analytics_esm" {
 
 data "archive_file" "bgg_preview_refresh_zip" {
   type        = "zip"
-  source_file = "../bgg_preview_refresh/bgg_preview_refresh.py"
   output_path = "${path.module}/bgg_preview_refresh.zip"
+
+  source {
+    content  = file("../bgg_preview_refresh/bgg_preview_refresh.py")
+    filename = "bgg_preview_refresh.py"
+  }
+
+  # Shared BGG rate limiter and keep-alive HTTP client (stdlib only) imported by the handler
+  source {
+    content  = file("../bgg_common/bgg_rate_limiter.py")
+    filename = "bgg_rate_limiter.py"
+  }
+
+  source {
+    content  = file("../bgg_common/bgg_http.py")
+    filename = "bgg_http.py"
+  }
 }
 
 resource "aws_lambda_function" "bgg_preview_refresh" {
@@ -192,7 +252,10 @@ resource "aws_lambda_function" "bgg_preview_refresh" {
   handler          = "bgg_preview_refresh.lambda_handler"
   source_code_hash = data.archive_file.bgg_preview_refresh_zip.output_base64sha256
   runtime          = "python3.12"
-  timeout          = 300
+  # Every geekpreview call is paced by the shared limiter (1 req/s by default), and each
+  # convention's item list is fetched one page per request, so large previews need the full
+  # 15 minutes rather than the 5 that unpaced requests fit in.
+  timeout          = 900
   memory_size      = 256
 
   environment {
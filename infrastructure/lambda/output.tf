@@ -45,6 +45,14 @@ output "bgg_taste_analytics_function_name" {
   value = aws_lambda_function.bgg_taste_analytics.function_name
 }
 
+output "bgg_taste_analytics_batch_arn" {
+  value = aws_lambda_function.bgg_taste_analytics_batch.arn
+}
+
+output "bgg_taste_analytics_batch_function_name" {
+  value = aws_lambda_function.bgg_taste_analytics_batch.function_name
+}
+
 output "bgg_preview_refresh_arn" {
   value = aws_lambda_function.bgg_preview_refresh.arn
 }
@@ -108,6 +108,8 @@ module "eventbridge" {
   compactor_lambda_name       = module.lambda.bgg_compactor_function_name
   preview_refresh_lambda_arn  = module.lambda.bgg_preview_refresh_arn
   preview_refresh_lambda_name = module.lambda.bgg_preview_refresh_function_name
+  taste_analytics_lambda_arn  = module.lambda.bgg_taste_analytics_batch_arn
+  taste_analytics_lambda_name = module.lambda.bgg_taste_analytics_batch_function_name
 }
 
 module "apigateway" {
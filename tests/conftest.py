@@ -1,5 +1,6 @@
 import sys
 import os
+import pytest
 
 # Set mock env variables globally for all tests to satisfy boto3 / env setups
 os.environ['AWS_DEFAULT_REGION'] = 'us-east-1'
@@ -9,6 +10,8 @@ os.environ['S3_OUTPUT_BUCKET_NAME'] = 'test-bucket'
 os.environ['USER_SQS_QUEUE_URL'] = 'https://sqs.test.com'
 os.environ['BGG_API_TOKEN'] = 'test-token'
 os.environ['BGG_TESTING'] = 'true'
+# Keep BGG pacing in unit tests to milliseconds; the limiter itself is covered in test_bgg_rate_limiter.py
+os.environ['BGG_RATE_LIMIT_PER_SECOND'] = '1000'
 
 # Mock aws_lambda_powertools inject_lambda_context to avoid AttributeError when context is None in tests
 try:
@@ -16,3 +19,17 @@ try:
     aws_lambda_powertools.Logger.inject_lambda_context = lambda self, func: func
 except ImportError:
     pass
+
+# Shared modules (bgg_common/) are copied next to each Lambda handler at image build time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bgg_common'))
+
+
+import bgg_rate_limiter
+
+
+@pytest.fixture(autouse=True)
+def reset_bgg_rate_limiters():
+    """Each test starts with a fresh BGG rate limiter (no backoff or schedule carried over)."""
+    bgg_rate_limiter.reset_limiters()
+    yield
+    bgg_rate_limiter.reset_limiters()
@@ -0,0 +1,120 @@
+"""
+Local stand-in for the BoardGameGeek XML API used by the rate-limiter tests.
+
+Serves /xmlapi2/thing, /xmlapi2/hot and /xmlapi2/collection from a background thread on
+127.0.0.1 and records the arrival time of every request. Like BGG, it answers 429 with a
+Retry-After header when requests arrive closer together than min_interval, and it can be
+told to throttle the first N requests regardless of spacing. Connections are kept alive
+(HTTP/1.1) and bodies are gzipped when the client asks, so connection reuse and
+decompression can be checked through client_ports and accept_encodings;
+drop_idle_connections closes each connection after its response without announcing it,
+like a load balancer timing out an idle keep-alive connection.
+"""
+import gzip
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeBGGServer:
+    def __init__(self, min_interval=0.0, throttle_first=0, retry_after="1", throttle_status=429,
+                 drop_idle_connections=False):
+        self.min_interval = min_interval
+        self.drop_idle_connections = drop_idle_connections
+        self.throttle_first = throttle_first
+        self.retry_after = retry_after
+        self.throttle_status = throttle_status
+        self.requests = []  # (monotonic arrival time, path, status sent)
+        self.client_ports = []  # client-side port of each request; repeats mean a reused connection
+        self.accept_encodings = []
+        self._lock = threading.Lock()
+        self._last_served = None
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def throttled_count(self):
+        return sum(1 for _, _, status in self.requests if status == self.throttle_status)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _decide_status(self, now):
+        """Returns the status for a request arriving now: throttle if scripted or too soon."""
+        with self._lock:
+            throttle = len(self.requests) < self.throttle_first
+            if self._last_served is not None and now - self._last_served < self.min_interval:
+                throttle = True
+            status = self.throttle_status if throttle else 200
+            if not throttle:
+                self._last_served = now
+            return status
+
+    def _body(self, path, query):
+        if path.endswith('/thing'):
+            ids = [i for i in query.get('id', [''])[0].split(',') if i]
+            items = ''.join(
+                f'<item type="boardgame" id="{i}"><name type="primary" value="Game {i}"/></item>'
+                for i in ids
+            )
+            return f'<items>{items}</items>'
+        if path.endswith('/hot'):
+            return '<items><item id="1" rank="1"><name value="Game 1"/></item></items>'
+        if path.endswith('/collection'):
+            return '<items><item objectid="1"><status own="1"/><stats><rating value="8"/></stats></item></items>'
+        return None
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                now = time.monotonic()
+                parsed = urlparse(self.path)
+                status = server._decide_status(now)
+                body = server._body(parsed.path, parse_qs(parsed.query))
+                if body is None:
+                    status = 404
+                accept_encoding = self.headers.get('Accept-Encoding', '')
+                with server._lock:
+                    server.requests.append((now, parsed.path, status))
+                    server.client_ports.append(self.client_address[1])
+                    server.accept_encodings.append(accept_encoding)
+
+                self.send_response(status)
+                if status == server.throttle_status and server.retry_after is not None:
+                    self.send_header('Retry-After', server.retry_after)
+                payload = (body if status == 200 else '<error/>').encode('utf-8')
+                if 'gzip' in accept_encoding:
+                    payload = gzip.compress(payload)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Type', 'text/xml')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                if server.drop_idle_connections:
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
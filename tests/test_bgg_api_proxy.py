@@ -27,7 +27,7 @@ def test_lambda_handler_invalid_username():
     assert response['statusCode'] == 400
     assert 'Invalid username format' in response['body']
 
-@patch('urllib.request.urlopen')
+@patch('bgg_http.urlopen')
 def test_lambda_handler_success(mock_urlopen):
     # Mock response
     mock_resp = MagicMock()
@@ -46,7 +46,7 @@ def test_lambda_handler_success(mock_urlopen):
     assert response['body'] == "<collection></collection>"
     assert 'Access-Control-Allow-Origin' not in response['headers']
 
-@patch('urllib.request.urlopen')
+@patch('bgg_http.urlopen')
 def test_lambda_handler_compression(mock_urlopen):
     import gzip
     import base64
@@ -1,6 +1,8 @@
+import io
 import os
 import sys
 import json
+import threading
 from unittest.mock import MagicMock, patch
 import pytest
 import xml.etree.ElementTree as ET
@@ -19,9 +21,6 @@ def test_xml_helpers():
     <item id="10">
         <name type="primary" value="Catan"/>
         <yearpublished value="1995"/>
-        <description>Classic game</description>
-        <link type="boardgamecategory" value="Negotiation"/>
-        <link type="boardgamecategory" value="Trading"/>
     </item>
     """
     root = ET.fromstring(xml_str)
@@ -29,14 +28,8 @@ def test_xml_helpers():
     assert bgg_game_data_scraper._get_element_value(root, "./name", attribute="value") == "Catan"
     assert bgg_game_data_scraper._get_element_value(root, "./yearpublished", attribute="value") == "1995"
     assert bgg_game_data_scraper._get_element_value(root, "./missing", attribute="value", default="N/A") == "N/A"
-    
-    assert bgg_game_data_scraper._get_element_text(root, "./description") == "Classic game"
-    assert bgg_game_data_scraper._get_element_text(root, "./missing", default="N/A") == "N/A"
-    
-    links = bgg_game_data_scraper._get_links(root, "boardgamecategory")
-    assert links == ["Negotiation", "Trading"]
 
-@patch('requests.get')
+@patch('bgg_http.get')
 def test_get_game_data_success(mock_get):
     xml_str = """
     <items>
@@ -108,7 +101,83 @@ def test_get_game_data_success(mock_get):
     assert data['suggested_players_best'] == ['3']
     assert data['suggested_players_recommended'] == ['3', '4']
 
-@patch('requests.get')
+def test_iter_game_items_streams_top_level_items():
+    """Streaming yields the same dicts as parsing the full tree, for top-level items only."""
+    xml_str = """<?xml version="1.0" encoding="utf-8"?>
+    <items termsofuse="https://boardgamegeek.com/xmlapi/termsofuse">
+        <item type="boardgame" id="13">
+            <thumbnail>
+                https://cf.geekdo-images.com/thumb/catan.png
+            </thumbnail>
+            <name type="alternate" value="Die Siedler von Catan"/>
+            <name type="primary" value="Catan"/>
+            <yearpublished value="1995"/>
+            <minplayers value="3"/>
+            <maxplayers value="not-a-number"/>
+            <poll name="language_dependence" title="Language Dependence">
+                <results numplayers="3"><result value="Best" numvotes="99"/></results>
+            </poll>
+            <poll name="suggested_numplayers" title="Suggested Players">
+                <results numplayers="3">
+                    <result value="Best" numvotes="15"/>
+                    <result value="Recommended" numvotes="5"/>
+                    <result value="Not Recommended" numvotes="1"/>
+                </results>
+                <results numplayers="2">
+                    <result value="Best" numvotes="0"/>
+                    <result value="Recommended" numvotes="0"/>
+                    <result value="Not Recommended" numvotes="0"/>
+                </results>
+            </poll>
+            <link type="boardgamemechanic" value="Dice Rolling"/>
+            <link type="boardgamemechanic" value="Trading"/>
+            <link type="boardgamepublisher" value=""/>
+            <link type="boardgamefamily" value="Catan"/>
+            <versions>
+                <item type="boardgameversion" id="999">
+                    <name type="primary" value="Catan English edition"/>
+                    <link type="boardgamepublisher" value="Mayfair"/>
+                </item>
+            </versions>
+            <statistics page="1">
+                <ratings>
+                    <bayesaverage value="7.0"/>
+                    <averageweight value="2.3"/>
+                </ratings>
+            </statistics>
+        </item>
+        <item type="boardgameexpansion" id="926">
+            <name type="primary" value="Catan: Seafarers"/>
+        </item>
+    </items>
+    """
+    streamed = list(bgg_game_data_scraper.iter_game_items(io.BytesIO(xml_str.encode('utf-8'))))
+    expected = [bgg_game_data_scraper._parse_item(item)
+                for item in ET.fromstring(xml_str.encode('utf-8')).findall('item')]
+    assert streamed == expected
+
+    catan, seafarers = streamed
+    assert catan['name'] == 'Catan'
+    assert catan['thumbnail'] == 'https://cf.geekdo-images.com/thumb/catan.png'
+    assert catan['year_published'] == 1995
+    assert catan['max_players'] is None
+    assert catan['mechanics'] == ['Dice Rolling', 'Trading']
+    assert catan['publishers'] == []
+    assert catan['rating'] == 7.0
+    assert catan['complexity'] == 2.3
+    assert catan['suggested_players_best'] == ['3']
+    assert catan['suggested_players_recommended'] == ['3']
+    assert seafarers == {
+        'id': '926', 'type': 'boardgameexpansion', 'name': 'Catan: Seafarers',
+        'year_published': None, 'min_players': None, 'max_players': None, 'playing_time': None,
+        'min_playtime': None, 'max_playtime': None, 'min_age': None, 'rating': None,
+        'complexity': None, 'thumbnail': None, 'image': None, 'categories': [], 'mechanics': [],
+        'designers': [], 'publishers': [], 'suggested_players_best': [],
+        'suggested_players_recommended': [],
+    }
+
+
+@patch('bgg_http.get')
 @patch('time.sleep') # prevent sleep from delaying tests
 def test_get_game_data_retry_and_success(mock_sleep, mock_get):
     xml_str = """
@@ -219,7 +288,7 @@ def test_lambda_handler_sqs_fetch_failures(mock_get_batch):
 @patch('pandas.DataFrame.to_parquet')
 @patch('time.sleep')
 def test_lambda_handler_chunking(mock_sleep, mock_to_parquet, mock_get_batch):
-    """Test that lambda handler correctly chunks large batches into chunks of 20 and sleeps in between."""
+    """Test that lambda handler correctly chunks large batches into chunks of 20."""
     def side_effect(game_ids, *args, **kwargs):
         return {str(gid): {'id': str(gid), 'name': f'Game {gid}'} for gid in game_ids}
     mock_get_batch.side_effect = side_effect
@@ -239,6 +308,75 @@ def test_lambda_handler_chunking(mock_sleep, mock_to_parquet, mock_get_batch):
     mock_get_batch.assert_any_call(list(range(100, 120)))
     mock_get_batch.assert_any_call(list(range(120, 125)))
 
-    # Should sleep once for 1.0 second between the two chunks
-    mock_sleep.assert_called_once_with(1.0)
+    # Pacing lives in the shared rate limiter inside get_batch_game_data, not in the handler
+    mock_sleep.assert_not_called()
+    assert mock_to_parquet.call_count == 25
+
+
+@patch('bgg_game_data_scraper.get_batch_game_data')
+@patch('pandas.DataFrame.to_parquet')
+@patch('time.sleep')
+def test_lambda_handler_uploads_overlap_next_fetch(mock_sleep, mock_to_parquet, mock_get_batch):
+    """Uploads for chunk 1 run on the pool, so the chunk 2 request is not held up by S3 writes."""
+    second_fetch = threading.Event()
+
+    def fetch(game_ids, *args, **kwargs):
+        if game_ids[0] == 120:
+            second_fetch.set()
+        return {str(gid): {'id': str(gid), 'name': f'Game {gid}'} for gid in game_ids}
+    mock_get_batch.side_effect = fetch
+
+    def slow_upload(*args, **kwargs):
+        # Fails if the upload had to finish before the next chunk was fetched
+        if not second_fetch.wait(timeout=5):
+            raise RuntimeError("next chunk was not fetched while uploads were in flight")
+    mock_to_parquet.side_effect = slow_upload
+
+    records = [{"messageId": f"msg{i}", "body": str(100 + i)} for i in range(25)]
+    response = bgg_game_data_scraper.lambda_handler({"Records": records}, None)
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['processed_ids'] == list(range(100, 125))
     assert mock_to_parquet.call_count == 25
+
+
+@patch('bgg_game_data_scraper.get_batch_game_data')
+@patch('pandas.DataFrame.to_parquet', autospec=True)
+@patch('time.sleep')
+def test_lambda_handler_batch_output_mode(mock_sleep, mock_to_parquet, mock_get_batch):
+    """RAW_OUTPUT_MODE=batch writes every found game of the SQS batch as one multi-row parquet."""
+    def side_effect(game_ids, *args, **kwargs):
+        return {str(gid): {'id': str(gid), 'name': f'Game {gid}'} for gid in game_ids if gid != 105}
+    mock_get_batch.side_effect = side_effect
+
+    records = [{"messageId": f"msg{i}", "body": str(100 + i)} for i in range(25)]
+    with patch.object(bgg_game_data_scraper, 'RAW_OUTPUT_MODE', 'batch'):
+        response = bgg_game_data_scraper.lambda_handler({"Records": records}, None)
+
+    assert response['statusCode'] == 200
+    assert sorted(json.loads(response['body'])['processed_ids']) == list(range(100, 125))
+    mock_to_parquet.assert_called_once()
+    args, kwargs = mock_to_parquet.call_args
+    written_df, s3_path = args[0], args[1]
+    assert s3_path.startswith('s3://test-bucket/data/boardgames/batches/dt=')
+    assert s3_path.endswith('.parquet')
+    assert written_df['id'].tolist() == [str(i) for i in range(100, 125) if i != 105]
+    assert isinstance(kwargs['schema'], pyarrow.Schema)
+
+
+@patch('bgg_game_data_scraper.get_batch_game_data')
+@patch('pandas.DataFrame.to_parquet')
+def test_lambda_handler_batch_output_write_failure(mock_to_parquet, mock_get_batch):
+    """A failed batch write reports every game in it under its own messageId; not-found games still succeed."""
+    mock_get_batch.return_value = {'1': {'id': '1', 'name': 'A'}, '2': {'id': '2', 'name': 'B'}}
+    mock_to_parquet.side_effect = Exception("S3 unavailable")
+
+    records = [{"messageId": "m1", "body": "1"}, {"messageId": "m2", "body": "2"}, {"messageId": "m3", "body": "3"}]
+    with patch.object(bgg_game_data_scraper, 'RAW_OUTPUT_MODE', 'batch'):
+        response = bgg_game_data_scraper.lambda_handler({"Records": records}, None)
+
+    assert response['statusCode'] == 207
+    assert response['batchItemFailures'] == [{"itemIdentifier": "m1"}, {"itemIdentifier": "m2"}]
+    body = json.loads(response['body'])
+    assert body['processed_ids'] == [3]
+    assert body['failed_ids'] == [1, 2]
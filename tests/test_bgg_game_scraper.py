@@ -1,6 +1,12 @@
+import io
+import json
 import os
 import sys
+import threading
+from datetime import datetime, timedelta, timezone
 from unittest.mock import MagicMock, patch
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
 from botocore.exceptions import ClientError
 
@@ -11,13 +17,14 @@ os.environ['AWS_REGION'] = 'us-east-1'
 os.environ['SQS_QUEUE_NAME'] = 'bgg_game_data_scraper_queue'
 os.environ['BATCH_SIZE'] = '2'
 os.environ['S3_UPDATE_INTERVAL'] = '2'
+os.environ['CRAWL_WORKERS'] = '1'
 os.environ['BGG_API_TOKEN'] = 'test-token'
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bgg_game_scraper'))
 import bgg_game_scraper
 
 @patch('bgg_game_scraper.boto3.client')
-@patch('requests.get')
+@patch('bgg_http.get')
 @patch('time.sleep')
 def test_main_success_flow(mock_sleep, mock_get, mock_boto):
     # Mock S3 Client
@@ -43,7 +50,7 @@ def test_main_success_flow(mock_sleep, mock_get, mock_boto):
         return MagicMock()
     mock_boto.side_effect = get_mock_client
 
-    # Mock requests.get BGG XML response for IDs 100, 101
+    # Mock bgg_http.get BGG XML response for IDs 100, 101
     mock_xml = """
     <items>
         <item id="100" type="boardgame">
@@ -59,11 +66,10 @@ def test_main_success_flow(mock_sleep, mock_get, mock_boto):
     mock_resp.content = mock_xml.encode('utf-8')
     mock_get.return_value = mock_resp
 
-    # Use sleep to break out of the infinite while True loop
-    mock_sleep.side_effect = KeyboardInterrupt("Stop infinite loop")
-
-    with pytest.raises(KeyboardInterrupt):
-        bgg_game_scraper.main()
+    # Stop the infinite while True loop when the rate limiter is asked for the second request
+    with patch('bgg_rate_limiter.RateLimiter.acquire', side_effect=[0.0, KeyboardInterrupt("Stop infinite loop")]):
+        with pytest.raises(KeyboardInterrupt):
+            bgg_game_scraper.main()
 
     # Verify start_id read from S3
     mock_s3.get_object.assert_called_once_with(Bucket='test-bucket', Key='bgg-scraper/bgg_start_id.txt')
@@ -71,10 +77,11 @@ def test_main_success_flow(mock_sleep, mock_get, mock_boto):
     # Verify BGG API query
     mock_get.assert_called_once_with("https://boardgamegeek.com/xmlapi2/thing?id=100,101", headers={"Authorization": "Bearer test-token"})
 
-    # Verify boardgame SQS send
-    mock_sqs.send_message.assert_called_once_with(
+    # Verify boardgame SQS send (buffered and drained as one batch before the checkpoint)
+    mock_sqs.send_message.assert_not_called()
+    mock_sqs.send_message_batch.assert_called_once_with(
         QueueUrl='https://sqs.mock-queue',
-        MessageBody='100'
+        Entries=[{'Id': '0', 'MessageBody': '100'}]
     )
     
     # Verify checkpoint S3 write (since update_counter (2) >= S3_UPDATE_INTERVAL (2))
@@ -84,6 +91,29 @@ def test_main_success_flow(mock_sleep, mock_get, mock_boto):
         Body=b'102'
     )
 
+@patch('bgg_game_scraper.boto3.client')
+@patch('bgg_http.get')
+def test_main_does_not_checkpoint_past_unsent_ids(mock_get, mock_boto):
+    mock_s3 = MagicMock()
+    mock_s3.exceptions.NoSuchKey = type('MockNoSuchKey', (Exception,), {})
+    mock_s3.get_object.return_value = {'Body': MagicMock(read=lambda: b"100")}
+    mock_sqs = MagicMock()
+    mock_sqs.get_queue_url.return_value = {'QueueUrl': 'https://sqs.mock-queue'}
+    mock_sqs.send_message_batch.return_value = {'Failed': [
+        {'Id': '0', 'SenderFault': True, 'Code': 'InvalidParameterValue', 'Message': 'rejected'}]}
+    mock_boto.side_effect = lambda service, *a, **k: mock_s3 if service == 's3' else mock_sqs
+
+    mock_resp = MagicMock()
+    mock_resp.status_code = 200
+    mock_resp.content = b'<items><item id="100" type="boardgame"><name type="primary" value="Catan"/></item></items>'
+    mock_get.return_value = mock_resp
+
+    with pytest.raises(SystemExit) as excinfo:
+        bgg_game_scraper.main()
+
+    assert excinfo.value.code == 1
+    mock_s3.put_object.assert_not_called()
+
 @patch('bgg_game_scraper.boto3.client')
 def test_main_s3_read_missing_key(mock_boto):
     mock_s3 = MagicMock()
@@ -146,3 +176,272 @@ def test_main_reprocess_mode(mock_boto):
             {'Id': '1', 'MessageBody': '200'}
         ]
     )
+
+
+
+def test_plan_reprocess_keeps_stale_games_priority_first():
+    now = datetime(2026, 6, 1, tzinfo=timezone.utc)
+    objects = {
+        1: now - timedelta(days=5),    # fresh, even though it is hot
+        2: now - timedelta(days=40),
+        3: now - timedelta(days=90),
+        4: None,                       # unknown age counts as stale
+        5: now - timedelta(days=31),
+    }
+    assert bgg_game_scraper.plan_reprocess(objects, 30, priority_ids=[1, 5, 99], now=now) == [5, 4, 3, 2]
+
+
+@patch('bgg_game_scraper.boto3.client')
+@patch('sys.argv', ['bgg_game_scraper', '--mode', 'reprocess'])
+@patch('time.sleep')
+def test_main_reprocess_mode_queues_only_stale_games_over_window(mock_sleep, mock_boto, monkeypatch):
+    monkeypatch.setenv('REPROCESS_MAX_AGE_DAYS', '30')
+    monkeypatch.setenv('REPROCESS_TOP_RATED', '1')
+    monkeypatch.setenv('REPROCESS_WINDOW_SECONDS', '3600')
+    monkeypatch.setenv('REPROCESS_CHUNK_SIZE', '2')
+    now = datetime.now(timezone.utc)
+    mock_s3 = MagicMock()
+    mock_paginator = MagicMock()
+    mock_paginator.paginate.return_value = [{'Contents': [
+        {'Key': 'data/boardgames/100.parquet', 'LastModified': now - timedelta(days=60)},
+        {'Key': 'data/boardgames/200.parquet', 'LastModified': now - timedelta(days=1)},
+        {'Key': 'data/boardgames/300.parquet', 'LastModified': now - timedelta(days=45)},
+        {'Key': 'data/boardgames/400.parquet', 'LastModified': now - timedelta(days=90)},
+        {'Key': 'data/boardgames/500.parquet', 'LastModified': now - timedelta(days=31)},
+    ]}]
+    mock_s3.get_paginator.return_value = mock_paginator
+
+    catalog = io.BytesIO()
+    pq.write_table(pa.table({'id': ['100', '300', '500'], 'rating': [6.1, 8.4, 7.0]}), catalog)
+    objects = {
+        'data/hotness_cache.json': json.dumps([{'id': '200', 'rank': 1}, {'id': '500', 'rank': 2}]).encode('utf-8'),
+        'data/boardgames_combined/catalog.parquet': catalog.getvalue(),
+    }
+    mock_s3.get_object.side_effect = lambda Bucket, Key: {'Body': io.BytesIO(objects[Key])}
+
+    mock_sqs = MagicMock()
+    mock_sqs.get_queue_url.return_value = {'QueueUrl': 'https://sqs.mock-queue'}
+    mock_sqs.send_message_batch.return_value = {'Successful': [], 'Failed': []}
+    mock_boto.side_effect = lambda service, *a, **k: mock_s3 if service == 's3' else mock_sqs
+
+    bgg_game_scraper.main()
+
+    # 200 is fresh; hot 500 goes first, then top-rated 300, then the rest oldest first
+    batches = [[e['MessageBody'] for e in c.kwargs['Entries']] for c in mock_sqs.send_message_batch.call_args_list]
+    assert batches == [['500', '300'], ['400', '100']]
+    # Everything is sent without waiting; the hour is clamped to the 15-minute SQS delay limit
+    mock_sleep.assert_not_called()
+    delays = [[e.get('DelaySeconds', 0) for e in c.kwargs['Entries']] for c in mock_sqs.send_message_batch.call_args_list]
+    assert delays == [[0, 0], [450, 450]]
+
+
+@patch('bgg_game_scraper.boto3.client')
+@patch('sys.argv', ['bgg_game_scraper', '--mode', 'reprocess'])
+def test_main_reprocess_mode_reads_manifest_instead_of_listing(mock_boto, monkeypatch):
+    monkeypatch.setenv('REPROCESS_WINDOW_SECONDS', '0')
+    now = datetime.now(timezone.utc)
+    manifest = io.BytesIO()
+    pq.write_table(pa.table({
+        'id': ['100', '200'],
+        'key': ['data/boardgames/batches/a.parquet', 'data/boardgames/200.parquet'],
+        'last_modified': pa.array([now - timedelta(days=60), now], type=pa.timestamp('ms', tz='UTC')),
+    }), manifest)
+    objects = {'data/boardgames_combined/catalog.manifest.parquet': manifest.getvalue()}
+    mock_s3 = MagicMock()
+    mock_s3.get_object.side_effect = lambda Bucket, Key: {'Body': io.BytesIO(objects[Key])}
+    mock_sqs = MagicMock()
+    mock_sqs.get_queue_url.return_value = {'QueueUrl': 'https://sqs.mock-queue'}
+    mock_sqs.send_message_batch.return_value = {'Successful': [], 'Failed': []}
+    mock_boto.side_effect = lambda service, *a, **k: mock_s3 if service == 's3' else mock_sqs
+
+    bgg_game_scraper.main()
+
+    mock_s3.get_paginator.assert_not_called()
+    mock_sqs.send_message_batch.assert_called_once_with(
+        QueueUrl='https://sqs.mock-queue', Entries=[{'Id': '0', 'MessageBody': '100'}])
+
+@patch('bgg_game_scraper.boto3.client')
+@patch('sys.argv', ['bgg_game_scraper', '--mode', 'reprocess'])
+def test_main_reprocess_mode_queues_one_slice_per_run(mock_boto, monkeypatch):
+    monkeypatch.setenv('REPROCESS_IDS_PER_RUN', '2')
+    monkeypatch.setenv('REPROCESS_WINDOW_SECONDS', '0')
+    monkeypatch.setenv('REPROCESS_TOP_RATED', '0')
+    now = datetime.now(timezone.utc)
+    manifest = io.BytesIO()
+    pq.write_table(pa.table({
+        'id': ['100', '200', '300', '400', '500'],
+        'last_modified': pa.array([now - timedelta(days=d) for d in (90, 80, 70, 60, 50)],
+                                  type=pa.timestamp('ms', tz='UTC')),
+    }), manifest)
+    # 100 is still waiting on the last run; 200's entry is older than its max age, so it is due again
+    ledger = {'100': (now - timedelta(hours=1)).isoformat(), '200': (now - timedelta(days=31)).isoformat()}
+    objects = {
+        'data/boardgames_combined/catalog.manifest.parquet': manifest.getvalue(),
+        'bgg-scraper/reprocess_queued.json': json.dumps(ledger).encode('utf-8'),
+    }
+    mock_s3 = MagicMock()
+    mock_s3.get_object.side_effect = lambda Bucket, Key: {'Body': io.BytesIO(objects[Key])}
+    mock_sqs = MagicMock()
+    mock_sqs.get_queue_url.return_value = {'QueueUrl': 'https://sqs.mock-queue'}
+    mock_sqs.send_message_batch.return_value = {'Successful': [], 'Failed': []}
+    mock_boto.side_effect = lambda service, *a, **k: mock_s3 if service == 's3' else mock_sqs
+
+    bgg_game_scraper.main()
+
+    sent = [e['MessageBody'] for c in mock_sqs.send_message_batch.call_args_list for e in c.kwargs['Entries']]
+    assert sent == ['200', '300']
+    put_kwargs = mock_s3.put_object.call_args.kwargs
+    assert put_kwargs['Key'] == 'bgg-scraper/reprocess_queued.json'
+    assert sorted(json.loads(put_kwargs['Body']), key=int) == ['100', '200', '300']
+
+def test_prune_reprocess_ledger_drops_rescraped_and_missing_games():
+    now = datetime(2026, 6, 1, tzinfo=timezone.utc)
+    queued = now - timedelta(days=2)
+    ledger = {1: queued, 2: queued, 3: queued, 4: now - timedelta(days=40)}
+    games = {1: now - timedelta(days=1), 2: now - timedelta(days=60), 4: None}
+    # 1 was re-scraped after it was queued, 3 is gone, 4 was queued too long ago
+    assert bgg_game_scraper.prune_reprocess_ledger(ledger, games, 30, now=now) == {2: queued}
+
+@patch('time.sleep')
+def test_send_ids_to_sqs_batch_retries_only_failed_entries(mock_sleep):
+    mock_sqs = MagicMock()
+    calls = []
+    throttled = set()
+    lock = threading.Lock()
+
+    def send_batch(QueueUrl, Entries):
+        failed = []
+        with lock:
+            calls.append([e['MessageBody'] for e in Entries])
+            for e in Entries:
+                if e['MessageBody'] == '103' and '103' not in throttled:
+                    throttled.add('103')
+                    failed.append({'Id': e['Id'], 'SenderFault': False, 'Code': 'ThrottlingException'})
+                elif e['MessageBody'] == '115':
+                    failed.append({'Id': e['Id'], 'SenderFault': True, 'Code': 'InvalidMessageContents'})
+        return {'Successful': [], 'Failed': failed}
+    mock_sqs.send_message_batch.side_effect = send_batch
+
+    failed = bgg_game_scraper.send_ids_to_sqs_batch(mock_sqs, 'https://sqs.mock-queue', list(range(100, 125)))
+
+    # The sender fault is reported, not retried; the throttled entry is resent on its own
+    assert failed == [115]
+    assert mock_sqs.send_message_batch.call_count == 4
+    assert sorted(calls, key=lambda c: (len(c), c)) == [['103'], [str(i) for i in range(120, 125)],
+                                      [str(i) for i in range(100, 110)], [str(i) for i in range(110, 120)]]
+    mock_sqs.send_message.assert_not_called()
+
+
+def test_sqs_id_buffer_flushes_in_background_and_drains():
+    mock_sqs = MagicMock()
+    mock_sqs.send_message_batch.return_value = {'Successful': [], 'Failed': []}
+    buffer = bgg_game_scraper.SqsIdBuffer(mock_sqs, 'https://sqs.mock-queue', flush_size=20)
+
+    for game_id in range(25):
+        buffer.add(game_id)
+    # 20 IDs flushed as two batches; the last 5 wait for the drain
+    assert buffer.drain() == []
+    buffer.close()
+
+    sent = [e['MessageBody'] for c in mock_sqs.send_message_batch.call_args_list for e in c.kwargs['Entries']]
+    assert sorted(sent, key=int) == [str(i) for i in range(25)]
+    assert mock_sqs.send_message_batch.call_count == 3
+
+
+def test_crawl_planner_watermark_and_adaptive_window():
+    planner = bgg_game_scraper.CrawlPlanner(100, window_size=5)
+    w1, w2, w3 = planner.next_window(), planner.next_window(), planner.next_window()
+    assert (w1, w2, w3) == ((100, 105), (105, 110), (110, 115))
+
+    # Out-of-order completion: the watermark only moves over a contiguous run
+    assert planner.complete(w2, boardgame_count=0) == 100
+    assert planner.window_size == 10  # sparse window -> larger windows
+    assert planner.fail(w1, split=True)
+    assert planner.window_size == 5
+    # Windows rejected for their ids are retried as two halves before any new ids
+    assert planner.has_retries
+    halves = planner.next_window(), planner.next_window()
+    assert halves == ((100, 102), (102, 105))
+    assert not planner.has_retries
+    planner.fail(halves[1], split=True)
+    assert planner.next_window() == (102, 103)
+    assert planner.next_window() == (103, 105)
+    assert planner.complete(halves[0], boardgame_count=2) == 102
+    assert planner.complete((103, 105), boardgame_count=2) == 102
+    assert planner.complete((102, 103), boardgame_count=1) == 110
+    assert planner.complete(w3, boardgame_count=5) == 115
+
+    for _ in range(10):
+        planner.complete(planner.next_window(), boardgame_count=0)
+    assert planner.window_size == bgg_game_scraper.BGG_MAX_IDS_PER_REQUEST
+
+def test_crawl_planner_retries_transient_failures_at_same_size_up_to_cap():
+    planner = bgg_game_scraper.CrawlPlanner(1, max_attempts=3)
+    window = planner.next_window()
+    assert window == (1, 21)
+    # Throttling or outages are not the ids' fault: same window, same size
+    for _ in range(2):
+        assert planner.fail(window)
+        assert planner.window_size == 20
+        assert planner.next_window() == window
+    assert not planner.fail(window)  # third failure exhausts the attempts
+    assert not planner.has_retries
+
+    # A rejected single id is retried as itself, never split further
+    assert planner.fail((21, 22), split=True)
+    assert planner.next_window() == (21, 22)
+
+def test_crawl_planner_restores_window_after_successes():
+    planner = bgg_game_scraper.CrawlPlanner(1)
+    planner.fail(planner.next_window(), split=True)
+    planner.fail(planner.next_window(), split=True)
+    assert planner.window_size == 5
+    # Dense windows do not grow past the starting size, but they do recover to it
+    for _ in range(4):
+        window = planner.next_window()
+        planner.complete(window, boardgame_count=window[1] - window[0])
+    assert planner.window_size == 20
+    assert planner.skip((1000, 1001)) == planner.completed_through
+
+def test_crawl_planner_grows_only_up_to_max_window():
+    planner = bgg_game_scraper.CrawlPlanner(1, window_size=4, max_window=12)
+    for _ in range(5):
+        planner.complete(planner.next_window(), boardgame_count=0)
+    assert planner.window_size == 12
+    # BGG's per-request limit still bounds a larger configured maximum
+    assert bgg_game_scraper.CrawlPlanner(1, max_window=50).max_window == bgg_game_scraper.BGG_MAX_IDS_PER_REQUEST
+
+
+@patch('bgg_game_scraper.boto3.client')
+@patch('bgg_http.get')
+def test_main_parallel_windows_checkpoint_contiguous_watermark(mock_get, mock_boto, monkeypatch):
+    monkeypatch.setenv('CRAWL_WORKERS', '3')
+    mock_s3 = MagicMock()
+    mock_s3.exceptions.NoSuchKey = type('MockNoSuchKey', (Exception,), {})
+    mock_s3.get_object.return_value = {'Body': MagicMock(read=lambda: b"452281")}
+    mock_sqs = MagicMock()
+    mock_sqs.get_queue_url.return_value = {'QueueUrl': 'https://sqs.mock-queue'}
+    mock_sqs.send_message_batch.return_value = {'Successful': [], 'Failed': []}
+    mock_boto.side_effect = lambda service, *a, **k: mock_s3 if service == 's3' else mock_sqs
+
+    def get(url, headers=None):
+        ids = [int(i) for i in url.split('id=')[1].split(',')]
+        items = ''.join(f'<item type="boardgame" id="{i}"><name type="primary" value="G{i}"/></item>'
+                        for i in ids if i <= 452300)
+        resp = MagicMock()
+        resp.status_code = 200
+        resp.content = f'<items>{items}</items>'.encode('utf-8')
+        return resp
+    mock_get.side_effect = get
+
+    # Crawls up to the frontier and exits on the first empty window beyond it
+    with pytest.raises(SystemExit) as excinfo:
+        bgg_game_scraper.main()
+    assert excinfo.value.code == 1
+
+    sent = sorted(int(e['MessageBody']) for c in mock_sqs.send_message_batch.call_args_list for e in c.kwargs['Entries'])
+    assert sent == list(range(452281, 452301))
+    checkpoints = [int(c.kwargs['Body']) for c in mock_s3.put_object.call_args_list]
+    assert checkpoints == sorted(checkpoints)
+    assert all((cp - 452281) % 2 == 0 for cp in checkpoints)
+    assert checkpoints[-1] <= 452301
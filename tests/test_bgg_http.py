@@ -0,0 +1,74 @@
+import urllib.error
+import urllib.request
+from unittest.mock import patch
+import pytest
+
+import bgg_http
+from fake_bgg_server import FakeBGGServer
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools():
+    bgg_http.reset()
+    yield
+    bgg_http.reset()
+
+
+def test_get_reuses_one_connection_and_decompresses():
+    with FakeBGGServer() as server:
+        first = bgg_http.get(f"{server.base_url}/xmlapi2/thing?id=1")
+        second = bgg_http.get(f"{server.base_url}/xmlapi2/thing?id=2")
+
+    assert first.status_code == 200
+    assert b'value="Game 2"' in second.content
+    assert all('gzip' in enc for enc in server.accept_encodings)
+    assert len(set(server.client_ports)) == 1
+
+
+def test_get_applies_default_timeouts():
+    with patch('requests.Session.get') as mock_get:
+        bgg_http.get("https://boardgamegeek.com/xmlapi2/hot", headers={"A": "b"})
+        bgg_http.get("https://boardgamegeek.com/xmlapi2/hot", timeout=5)
+
+    assert mock_get.call_args_list[0].kwargs == {'headers': {"A": "b"}, 'timeout': bgg_http.DEFAULT_TIMEOUT}
+    assert mock_get.call_args_list[1].kwargs['timeout'] == (5.0, 5.0)
+
+
+def test_urlopen_reuses_one_connection_and_decompresses():
+    with FakeBGGServer() as server:
+        bodies = []
+        for gid in (1, 2, 3):
+            req = urllib.request.Request(f"{server.base_url}/xmlapi2/thing?id={gid}", headers={"Authorization": "Bearer t"})
+            with bgg_http.urlopen(req, timeout=5) as response:
+                assert response.getcode() == 200
+                bodies.append(response.read().decode('utf-8'))
+
+    assert 'value="Game 3"' in bodies[2]
+    assert all('gzip' in enc for enc in server.accept_encodings)
+    assert len(set(server.client_ports)) == 1
+
+
+def test_urlopen_raises_http_error_with_headers_and_body():
+    with FakeBGGServer(throttle_first=1, retry_after="7") as server:
+        with pytest.raises(urllib.error.HTTPError) as exc_info:
+            bgg_http.urlopen(f"{server.base_url}/xmlapi2/thing?id=1")
+        # The connection stays usable after an error response
+        with bgg_http.urlopen(f"{server.base_url}/xmlapi2/thing?id=1") as response:
+            assert response.getcode() == 200
+
+    err = exc_info.value
+    assert err.code == 429
+    assert err.headers.get('Retry-After') == "7"
+    assert err.read() == b'<error/>'
+    assert len(set(server.client_ports)) == 1
+
+
+def test_urlopen_reconnects_when_pooled_connection_is_stale():
+    with FakeBGGServer(drop_idle_connections=True) as server:
+        for _ in range(2):
+            # The second request finds its pooled connection closed and retries on a new one
+            with bgg_http.urlopen(f"{server.base_url}/xmlapi2/hot") as response:
+                assert response.getcode() == 200
+
+    assert len(server.requests) == 2
+    assert len(set(server.client_ports)) == 2
@@ -86,7 +86,7 @@ def test_auto_discovery_and_pull(mock_s3_fixture):
                 
         raise ValueError(f"Unexpected url: {url}")
         
-    with patch('urllib.request.urlopen', side_effect=urlopen_mock), \
+    with patch('bgg_http.urlopen', side_effect=urlopen_mock), \
          patch('bgg_preview_refresh.datetime') as mock_datetime:
          
         mock_datetime.now.return_value = fixed_now
@@ -168,7 +168,7 @@ def test_passed_conventions_cleanup_with_seed(mock_s3_fixture):
             raise urllib.error.HTTPError(url, 404, "Not Found", {}, None)
         raise ValueError(f"No other URL should be requested. Got: {url}")
         
-    with patch('urllib.request.urlopen', side_effect=urlopen_mock), \
+    with patch('bgg_http.urlopen', side_effect=urlopen_mock), \
          patch('bgg_preview_refresh.datetime') as mock_datetime:
          
         mock_datetime.now.return_value = fixed_now
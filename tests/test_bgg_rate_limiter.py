@@ -0,0 +1,97 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest.mock import patch
+import pytest
+
+import bgg_rate_limiter
+from bgg_rate_limiter import RateLimiter, parse_retry_after
+from fake_bgg_server import FakeBGGServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bgg_game_data_scraper'))
+import bgg_game_data_scraper
+
+
+def test_parse_retry_after():
+    now = datetime(2026, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(" 0.5 ") == 0.5
+    assert parse_retry_after(format_datetime(now + timedelta(seconds=10), usegmt=True), now=now) == 10.0
+    assert parse_retry_after(format_datetime(now - timedelta(seconds=10), usegmt=True), now=now) == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("soon") is None
+
+
+@patch('time.sleep')
+def test_token_bucket_allows_burst_then_paces(mock_sleep):
+    limiter = RateLimiter(rate=2, burst=3)
+    waits = [limiter.acquire() for _ in range(5)]
+
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3] == pytest.approx(0.5, abs=0.05)
+    assert waits[4] == pytest.approx(1.0, abs=0.05)
+    assert mock_sleep.call_count == 2
+
+
+@patch('time.sleep')
+def test_throttled_response_backs_off_and_recovers(mock_sleep):
+    limiter = RateLimiter(rate=4, min_rate=1)
+    limiter.acquire()
+
+    assert limiter.record_response(429, "2") is True
+    assert limiter.rate == 2
+    # Retry-After holds the next request even though the bucket has a token
+    assert limiter.acquire() == pytest.approx(2.0, abs=0.05)
+
+    limiter.record_response(503)
+    limiter.record_response(503)
+    assert limiter.rate == 1  # floored at min_rate
+
+    for _ in range(10):
+        assert limiter.record_response(200) is False
+    assert limiter.rate == 4
+
+
+@patch('time.sleep')
+def test_pause_delays_next_acquire(mock_sleep):
+    limiter = RateLimiter(rate=100)
+    limiter.acquire()
+    limiter.pause(3)
+    assert limiter.acquire() == pytest.approx(3.0, abs=0.05)
+
+
+def test_get_limiter_reads_environment(monkeypatch):
+    monkeypatch.setenv('BGG_RATE_LIMIT_PER_SECOND', '5')
+    monkeypatch.setenv('BGG_RATE_LIMIT_BURST', '2')
+    bgg_rate_limiter.reset_limiters()
+
+    limiter = bgg_rate_limiter.get_limiter()
+    assert limiter.rate == 5
+    assert limiter.burst == 2
+    assert bgg_rate_limiter.get_limiter() is limiter
+
+
+def test_scraper_honours_retry_after_from_server():
+    with FakeBGGServer(throttle_first=1, retry_after="0.3") as server, \
+         patch.object(bgg_game_data_scraper, 'BGG_API_BASE_URL', f"{server.base_url}/xmlapi2/thing"):
+        result = bgg_game_data_scraper.get_batch_game_data([1, 2], max_retries=3, base_delay=0)
+
+    assert set(result) == {'1', '2'}
+    assert [status for _, _, status in server.requests] == [429, 200]
+    (first, _, _), (second, _, _) = server.requests
+    assert second - first >= 0.29
+
+
+def test_paced_requests_stay_under_server_limit(monkeypatch):
+    monkeypatch.setenv('BGG_RATE_LIMIT_PER_SECOND', '10')
+    bgg_rate_limiter.reset_limiters()
+
+    with FakeBGGServer(min_interval=0.08) as server, \
+         patch.object(bgg_game_data_scraper, 'BGG_API_BASE_URL', f"{server.base_url}/xmlapi2/thing"):
+        for gid in range(4):
+            assert str(gid) in bgg_game_data_scraper.get_batch_game_data([gid], max_retries=1)
+
+    assert len(server.requests) == 4
+    assert server.throttled_count == 0
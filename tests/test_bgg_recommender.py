@@ -37,6 +37,10 @@ import bgg_recommender
 def reset_globals():
     # Reset in-memory cache before each test
     bgg_recommender.CATALOG_CACHE = None
+    bgg_recommender.CATALOG_INDEX_CACHE = None
+    bgg_recommender.CATALOG_DISPLAY_STORE = None
+    bgg_recommender.RECS_MEMORY_CACHE = None
+    bgg_recommender.TASTE_PROFILE_CACHE = None
     yield
 
 def test_safe_list():
@@ -147,7 +151,7 @@ def test_save_recommendations_to_cache(mock_file, mock_s3):
     assert args[2] == 'cache-key'
 
 @patch('bgg_recommender.s3')
-@patch('requests.get')
+@patch('bgg_http.get')
 def test_get_bgg_hotness_fresh_cache(mock_get, mock_s3):
     now = datetime.now(timezone.utc)
     mock_s3.head_object.return_value = {
@@ -159,7 +163,7 @@ def test_get_bgg_hotness_fresh_cache(mock_get, mock_s3):
         mock_get.assert_not_called()
 
 @patch('bgg_recommender.s3')
-@patch('requests.get')
+@patch('bgg_http.get')
 def test_get_bgg_hotness_api_call(mock_get, mock_s3):
     # Cache is stale or missing
     mock_s3.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
@@ -1600,3 +1604,323 @@ def test_milestone_54_scoring_corrections():
 
 
 
+
+
+def _random_catalog(n_games, seed=7):
+    rng = np.random.default_rng(seed)
+    mechs = [f"mech{i}" for i in range(30)]
+    cats = [f"cat{i}" for i in range(20)]
+    designers = [f"des{i}" for i in range(15)]
+    pubs = [f"pub{i}" for i in range(10)]
+    rows = []
+    for i in range(n_games):
+        rows.append({
+            "id": str(1000 + i),
+            "name": f"Game {i}",
+            "mechanics": list(rng.choice(mechs, size=rng.integers(0, 5))),
+            "categories": list(rng.choice(cats, size=rng.integers(0, 4))) if i % 11 else None,
+            "designers": list(rng.choice(designers, size=rng.integers(0, 3))),
+            "publishers": list(rng.choice(pubs, size=rng.integers(0, 3))),
+            "rating": float(np.round(rng.uniform(4.0, 9.0), 2)) if i % 13 else np.nan,
+            "complexity": float(np.round(rng.uniform(1.0, 5.0), 2)) if i % 7 else np.nan,
+            "playing_time": int(rng.integers(15, 180)) if i % 5 else np.nan,
+            "suggested_players_best": [str(p) for p in rng.choice(["2", "3", "4"], size=rng.integers(0, 2))],
+            "suggested_players_recommended": [str(p) for p in rng.choice(["1", "2", "3", "4", "5"], size=rng.integers(0, 4))],
+        })
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize("query_params", [
+    {},
+    {'player_count': '3', 'duration_pref': 'medium', 'w_hot': '0.4'},
+    {'complexity_pref': 'heavy', 'duration_pref': 'short', 'w_des': '1.0', 'w_pub': '0.7'},
+    {'complexity_pref': 'medium', 'duration_pref': 'long', 'player_count': '2'},
+])
+def test_vectorized_engine_matches_loop_engine(query_params):
+    import scoring
+    from cache_utils import parse_weights
+
+    catalog_df = _random_catalog(300)
+    mech_weights = {"mech1": 4.0, "mech2": 2.5, "mech17": 1.0}
+    cat_weights = {"cat3": 3.0, "cat4": 1.0}
+    user_designers = {"des2": 2.0, "des9": 1.0}
+    user_publishers = {"pub1": 3.0, "pub5": 1.0}
+    complexity_weights = {"Light": 1.0, "Medium-Light": 4.0, "Medium-Heavy": 2.0, "Heavy": 0.0}
+    hotness_scores = {"1003": 1.0, "1010": 0.5}
+    weights = parse_weights(query_params)
+    args = (catalog_df, mech_weights, cat_weights, user_designers, user_publishers,
+            complexity_weights, hotness_scores, catalog_df, query_params, weights)
+
+    # Per-row reference scores must match the vectorized scores exactly
+    scores = scoring.compute_candidate_scores(*args)
+    records = catalog_df.to_dict('records')
+    for row, score in zip(records, scores):
+        expected = scoring.calculate_game_score(
+            row, mech_weights, cat_weights, user_designers, user_publishers,
+            complexity_weights, hotness_scores, query_params, weights,
+            0.0, 0.0, sum(complexity_weights.values()), 0.0, 0.0, True, True
+        )
+        assert score == expected
+
+    loop_ids = [r['id'] for r in scoring.score_candidates(*args, engine='loop')]
+    vec_ids = [r['id'] for r in scoring.score_candidates(*args, engine='vectorized')]
+    assert vec_ids == loop_ids
+    assert len(vec_ids) == 40
+
+
+@patch('bgg_recommender.s3')
+@patch('pandas.read_parquet')
+def test_get_catalog_index_built_once(mock_read_parquet, mock_s3):
+    mock_read_parquet.return_value = pd.DataFrame([
+        {"id": 10, "name": "Catan", "year_published": "1995", "rating": "7.1", "complexity": "2.3",
+         "mechanics": ["Dice Rolling", "Trading"], "publishers": ["KOSMOS", "Mayfair"]},
+        {"id": 20, "name": "Azul", "year_published": "2017", "rating": "n/a", "complexity": None,
+         "mechanics": None, "publishers": None},
+    ])
+
+    index = bgg_recommender.get_catalog_index()
+    assert index.id_to_pos == {"10": 0, "20": 1}
+    assert index.df['id'].tolist() == ["10", "20"]
+    assert index.df['year_published'].tolist() == [1995, 2017]
+    assert np.isnan(index.df['rating'].iloc[1])
+    assert set(index.features['mechanics'].vocab) == {"Dice Rolling", "Trading"}
+    assert list(index.features['publishers'].vocab) == ["KOSMOS"]
+
+    # Warm requests reuse the same index without rebuilding it
+    assert bgg_recommender.get_catalog_index() is index
+    mock_read_parquet.assert_called_once()
+
+    # Replacing the cached catalog invalidates the index
+    bgg_recommender.CATALOG_CACHE = mock_read_parquet.return_value.copy()
+    assert bgg_recommender.get_catalog_index() is not index
+
+
+def test_indexed_scoring_matches_unindexed_scoring():
+    import scoring
+    from cache_utils import parse_weights
+    from feature_index import CatalogIndex
+
+    index = CatalogIndex(_random_catalog(300, seed=11))
+    candidates = index.df[index.df['rating'] >= 6.0]
+    query_params = {'player_count': '4', 'duration_pref': 'short', 'w_hot': '0.2'}
+    args = (candidates, {"mech3": 2.0, "mech8": 1.0}, {"cat1": 3.0}, {"des4": 1.0}, {"pub2": 2.0},
+            {"Light": 2.0, "Medium-Light": 1.0, "Medium-Heavy": 0.0, "Heavy": 1.0},
+            {"1020": 0.8}, index.df, query_params, parse_weights(query_params))
+
+    indexed = scoring.compute_candidate_scores(*args, catalog_index=index)
+    unindexed = scoring.compute_candidate_scores(*args)
+    assert np.array_equal(indexed, unindexed)
+
+
+@pytest.mark.parametrize("k", [0, 1, 5, 40, 299, 300, 500])
+def test_top_k_positions_matches_stable_sort(k):
+    import scoring
+    rng = np.random.default_rng(3)
+    # Heavy ties exercise the position tie-break at the k-th boundary
+    scores = np.round(rng.uniform(0.0, 1.0, size=300), 1)
+    expected = np.argsort(-scores, kind='stable')[:k]
+    assert np.array_equal(scoring.top_k_positions(scores, k), expected)
+
+
+def test_ranked_candidates_fetch_and_scores():
+    import scoring
+    candidates = pd.DataFrame({"id": ["a", "b", "c", "d"], "name": ["A", "B", "C", "D"]})
+    ranked = scoring.RankedCandidates(candidates, np.array([0.2, 0.9, 0.5, 0.9]), ["id", "name"])
+
+    records, scores = ranked.top(2)
+    assert [r["id"] for r in records] == ["b", "d"]
+    assert scores.tolist() == [0.9, 0.9]
+
+    assert [r["id"] for r in ranked.fetch(3)] == ["b", "d", "c"]
+    assert [r["id"] for r in ranked.fetch(3)] == ["a"]
+    assert ranked.fetch(3) == []
+
+
+def test_dislike_exclusions_fetch_more_refills():
+    from scoring import filter_dislike_exclusions
+
+    catalog_df = pd.DataFrame([
+        {"id": "3", "mechanics": ["Trading"]},
+        {"id": "4", "mechanics": ["Dice Rolling"]},
+    ])
+    user_df = pd.DataFrame([
+        {"id": "3", "rating": 9.0, "own": True},
+        {"id": "4", "rating": 3.0, "own": False},
+    ])
+    candidates = [
+        {"id": "1", "name": "Liked", "mechanics": ["Trading"]},
+        {"id": "2", "name": "Disliked", "mechanics": ["Dice Rolling"]},
+    ]
+    pool = [
+        {"id": "5", "name": "Disliked Too", "mechanics": ["Dice Rolling"]},
+        {"id": "6", "name": "Neutral", "mechanics": ["Worker Placement"]},
+    ]
+
+    def fetch_more(n):
+        batch = pool[:n]
+        del pool[:n]
+        return batch
+
+    filtered = filter_dislike_exclusions(candidates, user_df, catalog_df, fetch_more=fetch_more)
+    assert [r["id"] for r in filtered] == ["1", "6"]
+
+
+def test_diversify_candidates_fetch_more_fills_caps():
+    import scoring
+    # 30 candidates all sharing one mechanic: caps would normally force the fallback
+    candidates = [{"id": i, "mechanics": ["Same"], "categories": [f"Cat {i}"]} for i in range(30)]
+    pool = [{"id": 100 + i, "mechanics": [f"Mech {i}"], "categories": [f"Other {i}"]} for i in range(40)]
+
+    def fetch_more(n):
+        batch = pool[:n]
+        del pool[:n]
+        return batch
+
+    result = scoring.diversify_candidates(candidates, max_per_mechanic=4, target_count=25, fetch_more=fetch_more)
+    assert len(result) == 25
+    assert [g["id"] for g in result[:4]] == [0, 1, 2, 3]
+    assert all(g["id"] >= 100 for g in result[4:])
+
+
+
+def test_diversify_candidates_fetch_more_unmet_caps_falls_back_to_original_list():
+    import scoring
+    # Every candidate shares one mechanic, so the caps can never yield 25 diverse games
+    pool = [{"id": i, "mechanics": ["Same"], "categories": ["Same"]} for i in range(200)]
+    requests = []
+
+    def fetch_more(n):
+        requests.append(n)
+        if not pool:
+            return None
+        batch = pool[:n]
+        del pool[:n]
+        # Every other batch comes back empty, as if all of it had been filtered out
+        return batch if len(requests) % 2 else []
+
+    candidates = pool[:10]
+    del pool[:10]
+    result = scoring.diversify_candidates(candidates, max_per_mechanic=4, target_count=25,
+                                          fetch_more=fetch_more, max_extra=100)
+    # Empty batches do not stop the refill; only the max_extra budget does
+    assert sum(requests) == 100
+    # The fallback is the list the caller passed in, not the refilled one
+    assert result is candidates
+    assert [g["id"] for g in result] == list(range(10))
+
+
+def test_diversify_candidates_stops_when_fetch_more_is_exhausted():
+    import scoring
+    candidates = [{"id": i, "mechanics": ["Same"], "categories": ["Same"]} for i in range(30)]
+    calls = []
+
+    def fetch_more(n):
+        calls.append(n)
+        return None
+
+    result = scoring.diversify_candidates(candidates, max_per_mechanic=4, target_count=25, fetch_more=fetch_more)
+    assert calls == [21]
+    assert [g["id"] for g in result] == list(range(30))
+
+def test_filter_plan_matches_chained_filters():
+    import scoring
+    from feature_index import CatalogIndex
+
+    catalog_df = _random_catalog(200, seed=5)
+    catalog_df['year_published'] = [1990 + (i % 35) for i in range(200)]
+    catalog_df['min_players'] = [1 + (i % 3) for i in range(200)]
+    catalog_df['max_players'] = [2 + (i % 5) for i in range(200)]
+    index = CatalogIndex(catalog_df)
+    owned_ids = {"1001", "1002", "1050"}
+
+    plan = scoring.FilterPlan(index)
+    plan.apply('unowned', lambda: ~index.id_mask(owned_ids))
+    plan.apply('year_start', lambda: index.numeric('year_published') >= 2000)
+    plan.apply('player_count', lambda: (index.numeric('min_players') <= 3) & (index.numeric('max_players') >= 3))
+    plan.apply('min_rating', lambda: index.numeric('rating') >= 5.0)
+
+    expected = index.df[~index.df['id'].isin(owned_ids)]
+    expected = expected[expected['year_published'] >= 2000]
+    expected = expected[(expected['min_players'] <= 3) & (expected['max_players'] >= 3)]
+    expected = expected[expected['rating'] >= 5.0]
+
+    result = plan.candidates()
+    assert result['id'].tolist() == expected['id'].tolist()
+    assert list(result.index) == list(expected.index)
+    assert [s['filter'] for s in plan.stats] == ['unowned', 'year_start', 'player_count', 'min_rating']
+    assert sum(s['removed'] for s in plan.stats) == len(index) - len(result)
+    assert plan.stats[-1]['remaining'] == plan.remaining == len(result)
+
+
+@patch('bgg_recommender.trigger_background_scrape')
+@patch('bgg_recommender.get_user_profile_status')
+def test_group_status_checks_map_back_per_user(mock_status, mock_trigger):
+    now = datetime.now(timezone.utc)
+
+    def status(u, ttl_hours=24):
+        if u == 'bob':
+            return (False, False, None)
+        if u == 'carol':
+            raise Exception("S3 HEAD failed")
+        return (True, False, now)
+
+    mock_status.side_effect = status
+    event = {'queryStringParameters': {'username': 'alice,bob'}}
+    response = bgg_recommender.lambda_handler(event, None)
+    assert json.loads(response['body']) == {'status': 'scraping', 'scraping_users': ['bob']}
+    mock_trigger.assert_called_once_with('bob')
+
+    event = {'queryStringParameters': {'username': 'alice,carol,bob'}}
+    response = bgg_recommender.lambda_handler(event, None)
+    assert response['statusCode'] == 500
+    assert json.loads(response['body'])['error'] == 'Failed checking user profile status for carol'
+
+
+@patch('bgg_recommender.s3')
+def test_taste_profile_cache_keyed_by_parquet_modified(mock_s3):
+    import scoring
+    mock_s3.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+    user_df = pd.DataFrame([
+        {"id": "1", "username": "alice", "rating": 9.0, "own": True},
+        {"id": "2", "username": "bob", "rating": 8.0, "own": True},
+    ])
+    catalog_df = pd.DataFrame([
+        {"id": "1", "name": "A", "mechanics": ["Trading"], "categories": ["Economic"], "rating": 7.0, "complexity": 2.5},
+        {"id": "2", "name": "B", "mechanics": ["Cooperative"], "categories": ["Thematic"], "rating": 8.0, "complexity": 3.9},
+    ])
+    modified = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    first = scoring.compute_taste_profile_inline(user_df, catalog_df, ["alice", "bob"], {"alice": modified, "bob": modified})
+    assert mock_s3.head_object.call_count == 2
+    assert first[0] == {"Trading": 4.0, "Cooperative": 3.0}
+
+    # Same members in another playgroup: no S3 calls and identical weights
+    with patch.object(pd.DataFrame, 'iterrows', side_effect=AssertionError("recomputed")):
+        second = scoring.compute_taste_profile_inline(user_df, catalog_df, ["bob", "alice"], {"alice": modified, "bob": modified})
+    assert mock_s3.head_object.call_count == 2
+    assert second == first
+
+    # A newer parquet for alice misses the cache for her only
+    scoring.compute_taste_profile_inline(
+        user_df, catalog_df, ["alice", "bob"], {"alice": modified + timedelta(hours=1), "bob": modified}
+    )
+    assert mock_s3.head_object.call_count == 3
+
+
+def test_taste_profile_inline_reuses_callers_memory_lookups():
+    import scoring
+    user_df = pd.DataFrame([{"id": "1", "username": "alice", "rating": 9.0, "own": True}])
+    catalog_df = pd.DataFrame([{"id": "1", "name": "A", "mechanics": ["Trading"], "categories": [], "rating": 7.0}])
+    modified = datetime(2024, 2, 1, tzinfo=timezone.utc)
+    cached = ({"Dice": 1.0}, {}, {}, {}, {"Light": 1.0, "Medium-Light": 0.0, "Medium-Heavy": 0.0, "Heavy": 0.0})
+    empty = ({}, {}, {}, {}, {"Light": 0.0, "Medium-Light": 1.0, "Medium-Heavy": 0.0, "Heavy": 0.0})
+
+    with patch('cache_utils.get_cached_taste_profile', side_effect=AssertionError("looked up twice")):
+        # A hit from the caller's probe is used as is; a miss goes straight to the S3 profile
+        hit = scoring.compute_taste_profile_inline(
+            user_df, catalog_df, ["alice"], {"alice": modified}, memory_profiles={"alice": cached})
+        assert hit[0] == {"Dice": 1.0}
+        miss = scoring.compute_taste_profile_inline(
+            user_df, catalog_df, ["alice"], {"alice": modified},
+            precomputed_profiles={"alice": empty}, memory_profiles={"alice": None})
+        assert miss[0] == {} and miss[4]["Medium-Light"] == 1.0
@@ -131,8 +131,8 @@ def test_process_taste_profile(mock_file, mock_read_parquet, mock_s3):
     assert profile_json["publisher_weights"]["pub1"] == 4.0
     assert profile_json["publisher_weights"]["pub3"] == 2.0
     assert "pub_local1" not in profile_json["publisher_weights"]
-    # Complexity weights are averaged: (4.0 + 2.0) / 2 = 3.0
-    assert profile_json["complexity_weights"] == {"Light": 0.0, "Medium-Light": 3.0, "Medium-Heavy": 0.0, "Heavy": 0.0}
+    # Complexity weights are summed per bucket like the recommender's inline profiles: 4.0 + 2.0 = 6.0
+    assert profile_json["complexity_weights"] == {"Light": 0.0, "Medium-Light": 6.0, "Medium-Heavy": 0.0, "Heavy": 0.0}
 
 @patch('bgg_taste_analytics.process_taste_profile')
 def test_lambda_handler_success(mock_process):
@@ -161,3 +161,69 @@ def test_lambda_handler_failure(mock_process):
     }
     resp = bgg_taste_analytics.lambda_handler(sqs_event, None)
     assert resp == {"batchItemFailures": [{"itemIdentifier": "msg-123"}]}
+
+def _parquet_body(df):
+    import io
+    buf = io.BytesIO()
+    df.to_parquet(buf, index=False)
+    body = MagicMock()
+    body.read.return_value = buf.getvalue()
+    return {"Body": body}
+
+@patch('bgg_taste_analytics.get_catalog')
+@patch('bgg_taste_analytics.s3')
+def test_run_batch_regeneration_builds_and_uploads_all_profiles(mock_s3, mock_get_catalog):
+    catalog_df = pd.DataFrame([
+        {"id": "100", "mechanics": ["mech1"], "categories": ["cat1"], "designers": ["des1"], "publishers": ["pub1"], "complexity": 2.0},
+        {"id": "300", "mechanics": ["mech3"], "categories": ["cat1"], "designers": ["des3"], "publishers": ["pub3"], "complexity": 3.0},
+    ])
+    mock_get_catalog.return_value = catalog_df
+    collections = {
+        "data/users/alex.parquet": pd.DataFrame([
+            {"id": 100, "rating": 9.0, "own": True},
+            {"id": 300, "rating": 7.0, "own": True},
+        ]),
+        "data/users/bob.parquet": pd.DataFrame([
+            {"id": "300", "rating": None, "own": True},
+        ]),
+        "data/users/broken.parquet": None,
+    }
+    paginator = MagicMock()
+    paginator.paginate.return_value = [{"Contents": [
+        {"Key": "data/users/alex.parquet"},
+        {"Key": "data/users/alex_taste_profile.json"},
+        {"Key": "data/users/bob.parquet"},
+        {"Key": "data/users/broken.parquet"},
+        {"Key": "data/users/archive/old.parquet"},
+    ]}]
+    mock_s3.get_paginator.return_value = paginator
+
+    def get_object(Bucket, Key):
+        if collections[Key] is None:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return _parquet_body(collections[Key])
+    mock_s3.get_object.side_effect = get_object
+
+    result = bgg_taste_analytics.run_batch_regeneration()
+
+    assert result == {"users": 3, "uploaded": 2, "failed": ["broken"]}
+    paginator.paginate.assert_called_once_with(Bucket='test-bucket', Prefix='data/users/')
+    uploads = {kw["Key"]: json.loads(kw["Body"]) for _, kw in mock_s3.put_object.call_args_list}
+    assert set(uploads) == {"data/users/alex_taste_profile.json", "data/users/bob_taste_profile.json"}
+
+    alex = uploads["data/users/alex_taste_profile.json"]
+    assert alex["cat_weights"] == {"cat1": 6.0}
+    assert alex["mech_weights"] == {"mech1": 4.0, "mech3": 2.0}
+    assert alex["complexity_weights"] == {"Light": 0.0, "Medium-Light": 4.0, "Medium-Heavy": 2.0, "Heavy": 0.0}
+    assert "generated_at" in alex
+    # Unrated owned game falls back to the neutral 7.0 rating (weight 2.0)
+    assert uploads["data/users/bob_taste_profile.json"]["designer_weights"] == {"des3": 2.0}
+
+@patch('bgg_taste_analytics.run_batch_regeneration')
+@patch('bgg_taste_analytics.process_taste_profile')
+def test_lambda_handler_batch_mode(mock_process, mock_batch):
+    mock_batch.return_value = {"users": 5, "uploaded": 5, "failed": []}
+    resp = bgg_taste_analytics.lambda_handler({"mode": "batch"}, None)
+    assert resp == {"users": 5, "uploaded": 5, "failed": []}
+    mock_batch.assert_called_once_with()
+    mock_process.assert_not_called()
@@ -1,3 +1,4 @@
+import io
 import os
 import sys
 import json
@@ -13,12 +14,19 @@ os.environ['BGG_API_TOKEN'] = 'test-token'
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bgg_user_data_scraper'))
 import bgg_user_data_scraper
 
+@pytest.fixture(autouse=True)
+def mock_s3():
+    # No collection hash stored yet unless a test says otherwise
+    with patch.object(bgg_user_data_scraper, 's3') as s3:
+        s3.head_object.return_value = {'Metadata': {}}
+        yield s3
+
 def test_xml_helper():
     xml_str = '<item objectid="100"><status own="1"/></item>'
     root = ET.fromstring(xml_str)
     assert bgg_user_data_scraper._get_element_value(root, ".//status", attribute="own") == "1"
 
-@patch('requests.get')
+@patch('bgg_http.get')
 def test_get_user_data_success(mock_get):
     xml_str = """
     <items>
@@ -51,7 +59,7 @@ def test_get_user_data_success(mock_get):
     assert data[0]['rating'] == 9.0
     assert data[0]['own'] is True
 
-@patch('requests.get')
+@patch('bgg_http.get')
 @patch('time.sleep')
 def test_get_user_data_retry_limit(mock_sleep, mock_get):
     mock_fail = MagicMock()
@@ -63,10 +71,10 @@ def test_get_user_data_retry_limit(mock_sleep, mock_get):
     assert mock_get.call_count == 3
     assert mock_sleep.call_count == 2
 
-@patch('bgg_user_data_scraper.get_user_data')
+@patch('bgg_user_data_scraper.request_collection')
 @patch('pandas.DataFrame.to_parquet')
-def test_lambda_handler_success(mock_to_parquet, mock_get_user_data):
-    mock_get_user_data.return_value = [
+def test_lambda_handler_success(mock_to_parquet, mock_request_collection):
+    mock_request_collection.return_value = [
         {'id': '10', 'username': 'testuser', 'rating': 9.0, 'own': True}
     ]
 
@@ -83,10 +91,11 @@ def test_lambda_handler_success(mock_to_parquet, mock_get_user_data):
     mock_to_parquet.assert_called_once_with(
         's3://test-bucket/data/users/testuser.parquet',
         index=False,
-        engine='pyarrow'
+        engine='pyarrow',
+        storage_options={'s3_additional_kwargs': {'Metadata': {'collection-hash': bgg_user_data_scraper.collection_hash(mock_request_collection.return_value)}}}
     )
 
-@patch('requests.get')
+@patch('bgg_http.get')
 def test_get_user_data_invalid_user(mock_get):
     xml_str = """
     <errors>
@@ -103,10 +112,41 @@ def test_get_user_data_invalid_user(mock_get):
     data = bgg_user_data_scraper.get_user_data("tester1")
     assert data == [] # Should return an empty list gracefully
 
-@patch('bgg_user_data_scraper.get_user_data')
+def test_stream_collection_keeps_rated_or_owned_items():
+    items = ''.join(
+        f'<item objectid="{i}" subtype="boardgame"><name>Game {i}</name>'
+        f'<status own="{i % 2}"/><stats><rating value="{"N/A" if i % 3 else i % 10}"/></stats></item>'
+        for i in range(1, 5001)
+    )
+    xml_bytes = f'<items totalitems="5000">{items}</items>'.encode('utf-8')
+
+    root, rows, item_count = bgg_user_data_scraper.stream_collection(io.BytesIO(xml_bytes), "bulk")
+
+    assert item_count == 5000
+    assert len(root) == 0  # finished items are cleared as they stream past
+    expected = []
+    for i in range(1, 5001):
+        rating = None if i % 3 else float(i % 10)
+        own = i % 2 == 1
+        if rating or own:
+            expected.append({'id': str(i), 'username': 'bulk', 'rating': rating, 'own': own})
+    assert rows == expected
+
+@patch('bgg_http.get')
+@patch('time.sleep')
+def test_get_user_data_queued_collection_retries(mock_sleep, mock_get):
+    mock_resp = MagicMock()
+    mock_resp.status_code = 202
+    mock_resp.content = b'<message>\n\tYour request for this collection has been accepted and will be processed.\n</message>'
+    mock_get.return_value = mock_resp
+
+    assert bgg_user_data_scraper.get_user_data("queued") is None
+    assert mock_get.call_count == 3
+
+@patch('bgg_user_data_scraper.request_collection')
 @patch('pandas.DataFrame.to_parquet')
-def test_lambda_handler_invalid_user_saves_empty_parquet(mock_to_parquet, mock_get_user_data):
-    mock_get_user_data.return_value = [] # User doesn't exist or empty collection
+def test_lambda_handler_invalid_user_saves_empty_parquet(mock_to_parquet, mock_request_collection):
+    mock_request_collection.return_value = [] # User doesn't exist or empty collection
 
     event = {
         "Records": [
@@ -123,3 +163,86 @@ def test_lambda_handler_invalid_user_saves_empty_parquet(mock_to_parquet, mock_g
     args, kwargs = mock_to_parquet.call_args
     assert args[0] == 's3://test-bucket/data/users/tester1.parquet'
 
+
+def test_fetch_collections_polls_queued_users_concurrently():
+    import threading
+    import time
+    polls = {}
+    lock = threading.Lock()
+
+    def request(username, limiter):
+        with lock:
+            polls[username] = polls.get(username, 0) + 1
+            count = polls[username]
+        time.sleep(0.05)
+        if username == 'slow' and count < 3:
+            return bgg_user_data_scraper.QUEUED
+        if username == 'broken':
+            raise ValueError("HTTP 500")
+        return [{'id': '1', 'username': username, 'rating': 8.0, 'own': True}]
+
+    usernames = {f'msg-{name}': name for name in ('slow', 'fast1', 'fast2', 'broken')}
+    with patch('bgg_user_data_scraper.request_collection', side_effect=request):
+        started = time.monotonic()
+        results, pending = bgg_user_data_scraper.fetch_collections(
+            usernames, max_attempts=3, base_delay=0.05, max_delay=0.1)
+        elapsed = time.monotonic() - started
+
+    assert pending == set()
+    assert results['msg-slow'][0]['username'] == 'slow'
+    assert results['msg-fast1'][0]['username'] == 'fast1'
+    assert results['msg-broken'] is None
+    assert polls == {'slow': 3, 'fast1': 1, 'fast2': 1, 'broken': 3}
+    # Close to the slowest user's three polls, not the sum of every user's attempts
+    assert elapsed < 0.8
+
+@patch('bgg_user_data_scraper.request_collection')
+@patch('pandas.DataFrame.to_parquet')
+def test_lambda_handler_returns_users_still_queued_at_deadline(mock_to_parquet, mock_request_collection):
+    rows = [{'id': '10', 'username': 'ready', 'rating': 9.0, 'own': True}]
+    mock_request_collection.side_effect = lambda username, limiter: (
+        rows if username == 'ready' else bgg_user_data_scraper.QUEUED)
+    context = MagicMock()
+    # Leaves roughly 0.2s of budget after the margin, far less than the first retry delay
+    context.get_remaining_time_in_millis.return_value = (bgg_user_data_scraper.TIME_BUDGET_MARGIN_SECONDS + 0.2) * 1000
+
+    event = {"Records": [
+        {"messageId": "msg-ready", "body": "ready"},
+        {"messageId": "msg-queued", "body": "queued"},
+    ]}
+    response = bgg_user_data_scraper.lambda_handler(event, context)
+
+    assert response['statusCode'] == 207
+    assert response['batchItemFailures'] == [{"itemIdentifier": "msg-queued"}]
+    assert json.loads(response['body'])['processed_ids'] == ['ready']
+    mock_to_parquet.assert_called_once()
+    assert mock_to_parquet.call_args.args[0] == 's3://test-bucket/data/users/ready.parquet'
+
+def test_collection_hash_ignores_row_order():
+    rows = [
+        {'id': '10', 'username': 'u', 'rating': 9.0, 'own': True},
+        {'id': '20', 'username': 'u', 'rating': None, 'own': True},
+    ]
+    digest = bgg_user_data_scraper.collection_hash(rows)
+    assert bgg_user_data_scraper.collection_hash(list(reversed(rows))) == digest
+    assert bgg_user_data_scraper.collection_hash([dict(rows[0], rating=8.5), rows[1]]) != digest
+    assert bgg_user_data_scraper.collection_hash(rows[:1]) != digest
+
+@patch('bgg_user_data_scraper.request_collection')
+@patch('pandas.DataFrame.to_parquet')
+def test_lambda_handler_skips_unchanged_collection(mock_to_parquet, mock_request_collection, mock_s3):
+    rows = [{'id': '10', 'username': 'testuser', 'rating': 9.0, 'own': True}]
+    mock_request_collection.return_value = rows
+    digest = bgg_user_data_scraper.collection_hash(rows)
+    mock_s3.head_object.return_value = {'Metadata': {'collection-hash': digest}}
+
+    response = bgg_user_data_scraper.lambda_handler({"Records": [{"messageId": "msg1", "body": "testuser"}]}, None)
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['processed_ids'] == ['testuser']
+    mock_s3.head_object.assert_called_once_with(Bucket='test-bucket', Key='data/users/testuser.parquet')
+    mock_to_parquet.assert_not_called()
+    # Only the JSON marker is touched, which does not fire the taste-profile trigger
+    put_kwargs = mock_s3.put_object.call_args.kwargs
+    assert put_kwargs['Key'] == 'data/users/testuser_collection_checked.json'
+    assert json.loads(put_kwargs['Body']) == {'collection_hash': digest}
@@ -30,6 +30,10 @@ import bgg_recommender
 def reset_globals():
     # Reset in-memory cache attributes in bgg_recommender module before each test
     bgg_recommender.CATALOG_CACHE = None
+    bgg_recommender.CATALOG_INDEX_CACHE = None
+    bgg_recommender.CATALOG_DISPLAY_STORE = None
+    bgg_recommender.RECS_MEMORY_CACHE = None
+    bgg_recommender.TASTE_PROFILE_CACHE = None
     bgg_recommender.PREVIEWS_CACHE = None
     bgg_recommender.PREVIEWS_CACHE_TIME = None
     bgg_recommender.PREVIEWS_GAMES_CACHE = None
@@ -157,6 +161,45 @@ def test_get_catalog_failure(mock_s3):
     df = cache_utils.get_catalog()
     assert df is None
 
+def _write_catalog_file(path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = pa.table({
+        'id': ['1', '2', '3', '4', '5'],
+        'name': ['Brass', 'Catan', 'Azul', 'Monopoly', 'Uno'],
+        'rating': [8.6, 7.1, 7.0, 4.4, 3.9],
+        'mechanics': [['Network'], ['Dice'], ['Drafting'], ['Roll'], ['Hand']],
+        'thumbnail': [f'http://img/{i}_t.jpg' for i in range(1, 6)],
+        'image': [f'http://img/{i}.jpg' for i in range(1, 6)],
+    })
+    pq.write_table(table, path, row_group_size=2)
+
+@patch('cache_utils._default_s3')
+def test_get_catalog_projects_display_columns_into_lazy_store(mock_s3):
+    mock_s3.download_file.side_effect = lambda bucket, key, path: _write_catalog_file(path)
+
+    df = cache_utils.get_catalog()
+    assert list(df.columns) == ['id', 'name', 'rating', 'mechanics']
+    assert len(df) == 5
+
+    store = bgg_recommender.CATALOG_DISPLAY_STORE
+    assert store.columns == ['thumbnail', 'image']
+    records = [{'id': '4', 'name': 'Monopoly'}, {'id': '1', 'name': 'Brass'}, {'id': '99', 'name': 'Unknown'},
+               {'id': '2', 'name': 'Catan', 'thumbnail': 'kept', 'image': 'kept'}]
+    cache_utils.attach_display_columns(records)
+    assert records[0] == {'id': '4', 'name': 'Monopoly', 'thumbnail': 'http://img/4_t.jpg', 'image': 'http://img/4.jpg'}
+    assert records[1]['image'] == 'http://img/1.jpg'
+    assert records[2]['thumbnail'] is None and records[2]['image'] is None
+    assert records[3]['thumbnail'] == 'kept'
+    assert store.lookup(['5']) == {'5': {'thumbnail': 'http://img/5_t.jpg', 'image': 'http://img/5.jpg'}}
+
+@patch('cache_utils._default_s3')
+def test_get_catalog_min_rating_filters_at_read_time(mock_s3):
+    mock_s3.download_file.side_effect = lambda bucket, key, path: _write_catalog_file(path)
+    with patch.object(cache_utils, 'CATALOG_MIN_RATING', 5.0):
+        df = cache_utils.get_catalog()
+    assert sorted(df['id']) == ['1', '2', '3']
+
 @patch('cache_utils._default_s3')
 def test_get_user_profile_status_exists(mock_s3):
     now = datetime.now(timezone.utc)
@@ -172,6 +215,25 @@ def test_get_user_profile_status_exists(mock_s3):
     assert exists is True
     assert is_stale is True
 
+@patch('cache_utils._default_s3')
+def test_get_user_profile_status_fresh_check_marker(mock_s3):
+    now = datetime.now(timezone.utc)
+    parquet = {'LastModified': now - timedelta(hours=48)}
+    marker = {'LastModified': now - timedelta(hours=1)}
+    mock_s3.head_object.side_effect = lambda Bucket, Key: marker if Key.endswith('_collection_checked.json') else parquet
+
+    # The parquet is old but an unchanged re-scrape touched the marker an hour ago
+    exists, is_stale, modified = cache_utils.get_user_profile_status("user1", ttl_hours=24)
+    assert (exists, is_stale, modified) == (True, False, parquet['LastModified'])
+
+    err_resp = {'Error': {'Code': '404', 'Message': 'Not Found'}}
+    def no_marker(Bucket, Key):
+        if Key.endswith('_collection_checked.json'):
+            raise ClientError(err_resp, 'HeadObject')
+        return parquet
+    mock_s3.head_object.side_effect = no_marker
+    assert cache_utils.get_user_profile_status("user1", ttl_hours=24)[1] is True
+
 @patch('cache_utils._default_s3')
 def test_get_user_profile_status_missing(mock_s3):
     err_resp = {'Error': {'Code': '404', 'Message': 'Not Found'}}
@@ -271,7 +333,7 @@ def test_save_recommendations_to_cache_error(mock_s3):
     mock_s3.upload_file.assert_called_once()
 
 @patch('cache_utils._default_s3')
-@patch('requests.get')
+@patch('bgg_http.get')
 def test_get_bgg_hotness_fresh_cache(mock_get, mock_s3):
     now = datetime.now(timezone.utc)
     mock_s3.head_object.return_value = {
@@ -283,7 +345,7 @@ def test_get_bgg_hotness_fresh_cache(mock_get, mock_s3):
         mock_get.assert_not_called()
 
 @patch('cache_utils._default_s3')
-@patch('requests.get')
+@patch('bgg_http.get')
 def test_get_bgg_hotness_api_success(mock_get, mock_s3):
     mock_s3.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
     mock_xml = """<items><item id="12" rank="1"><name value="Catan"/></item></items>"""
@@ -302,7 +364,7 @@ def test_get_bgg_hotness_api_success(mock_get, mock_s3):
         mock_s3.upload_file.assert_called_once()
 
 @patch('cache_utils._default_s3')
-@patch('requests.get')
+@patch('bgg_http.get')
 def test_get_bgg_hotness_api_failure_fallback(mock_get, mock_s3):
     mock_s3.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
     mock_get.side_effect = Exception("HTTP error")
@@ -314,7 +376,7 @@ def test_get_bgg_hotness_api_failure_fallback(mock_get, mock_s3):
         mock_s3.download_file.assert_called_once()
 
 @patch('cache_utils._default_s3')
-@patch('requests.get')
+@patch('bgg_http.get')
 def test_get_bgg_hotness_api_failure_no_fallback(mock_get, mock_s3):
     mock_s3.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
     mock_get.side_effect = Exception("HTTP error")
@@ -349,3 +411,80 @@ def test_parse_weights():
     w_malformed = cache_utils.parse_weights(qp_malformed)
     assert w_malformed['w_mech'] == 0.5
     assert w_malformed['w_cat'] == 0.5
+
+def test_run_concurrently_maps_results_and_errors():
+    import threading
+    barrier = threading.Barrier(3, timeout=5)
+
+    def ok(value):
+        # All three tasks must be in flight at once to pass the barrier
+        barrier.wait()
+        return value
+
+    def fail():
+        barrier.wait()
+        raise ValueError("boom")
+
+    results = cache_utils.run_concurrently({
+        'alice': lambda: ok(1),
+        'bob': fail,
+        'carol': lambda: ok(3),
+    })
+    assert list(results) == ['alice', 'bob', 'carol']
+    assert results['alice'] == (1, None)
+    assert results['carol'] == (3, None)
+    assert results['bob'][0] is None
+    assert isinstance(results['bob'][1], ValueError)
+    assert cache_utils.get_io_executor() is cache_utils.get_io_executor()
+
+def test_lru_cache_entry_and_byte_budgets():
+    cache = cache_utils.LRUCache("test", max_entries=2, max_bytes=100)
+    cache.put("a", "A", 40)
+    cache.put("b", "B", 40)
+    assert cache.get("a") == "A"  # "a" becomes most recently used
+    cache.put("c", "C", 10)       # entry budget evicts "b"
+    assert cache.get("b") is None
+    cache.put("d", "D", 95)       # byte budget evicts both "a" and "c"
+    assert len(cache) == 1 and cache.total_bytes == 95
+    cache.put("huge", "H", 500)   # larger than the whole budget: never stored
+    assert cache.get("huge") is None
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 2, 3)
+
+@patch('cache_utils._default_s3')
+@patch('builtins.open', new_callable=mock_open, read_data='[{"name": "Catan"}]')
+def test_get_cached_recommendations_repeat_hit_served_from_memory(mock_file, mock_s3):
+    now = datetime.now(timezone.utc)
+    mock_s3.head_object.return_value = {'LastModified': now - timedelta(hours=2)}
+
+    first = cache_utils.get_cached_recommendations("cache-key", now - timedelta(hours=4), ttl_hours=24)
+    second = cache_utils.get_cached_recommendations("cache-key", now - timedelta(hours=4), ttl_hours=24)
+    assert first == second == [{"name": "Catan"}]
+    assert second is not first
+    mock_s3.head_object.assert_called_once()
+    mock_s3.download_file.assert_called_once()
+
+    # A newer profile parquet invalidates the in-memory entry and falls back to S3
+    assert cache_utils.get_cached_recommendations("cache-key", now - timedelta(hours=1), ttl_hours=24) is None
+    assert mock_s3.head_object.call_count == 2
+    assert len(bgg_recommender.RECS_MEMORY_CACHE) == 0
+
+@patch('cache_utils._default_s3')
+@patch('builtins.open', new_callable=mock_open)
+def test_save_recommendations_writes_through_to_memory(mock_file, mock_s3):
+    stored_at = datetime.now(timezone.utc) - timedelta(minutes=3)
+    mock_s3.head_object.return_value = {'LastModified': stored_at}
+    cache_utils.save_recommendations_to_cache("cache-key", [{"name": "Catan"}])
+    # The memory entry carries the S3 object's LastModified, not the local clock
+    assert cache_utils._recs_memory_cache().get("cache-key")[0] == stored_at
+    recs = cache_utils.get_cached_recommendations("cache-key", None, ttl_hours=24)
+    assert recs == [{"name": "Catan"}]
+    mock_s3.head_object.assert_called_once_with(Bucket='test-bucket', Key='cache-key')
+    mock_s3.download_file.assert_not_called()
+
+@patch('cache_utils._default_s3')
+@patch('builtins.open', new_callable=mock_open)
+def test_save_recommendations_skips_memory_when_stamp_unknown(mock_file, mock_s3):
+    mock_s3.head_object.side_effect = ClientError({'Error': {'Code': '500'}}, 'HeadObject')
+    cache_utils.save_recommendations_to_cache("cache-key", [{"name": "Catan"}])
+    mock_s3.upload_file.assert_called_once()
+    assert cache_utils._recs_memory_cache().get("cache-key") is None
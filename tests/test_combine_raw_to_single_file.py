@@ -10,9 +10,9 @@ import combine_raw_to_single_file
 
 @patch('combine_raw_to_single_file.boto3.client')
 @patch('combine_raw_to_single_file.pq.read_table')
-@patch('combine_raw_to_single_file.pa.concat_tables')
-@patch('combine_raw_to_single_file.pq.write_table')
-def test_lambda_handler_success(mock_write_table, mock_concat_tables, mock_read_table, mock_boto_client):
+@patch('combine_raw_to_single_file.pq.ParquetWriter')
+@patch('combine_raw_to_single_file.write_serving_layout')
+def test_lambda_handler_success(mock_serving_layout, mock_parquet_writer, mock_read_table, mock_boto_client):
     # Setup mocks
     mock_s3 = MagicMock()
     mock_boto_client.return_value = mock_s3
@@ -58,12 +58,8 @@ def test_lambda_handler_success(mock_write_table, mock_concat_tables, mock_read_
         'designers': [['Designer']]
     }, schema=dummy_schema)
     mock_read_table.return_value = real_table
-    
-    # Mock concat_tables to return final table
-    mock_final_table = MagicMock()
-    mock_final_table.num_rows = 150
-    mock_final_table.num_columns = 20
-    mock_concat_tables.return_value = mock_final_table
+    mock_writer = mock_parquet_writer.return_value.__enter__.return_value
+    mock_serving_layout.return_value = (2, 0)
     
     # Invoke lambda_handler
     event = {}
@@ -72,7 +68,7 @@ def test_lambda_handler_success(mock_write_table, mock_concat_tables, mock_read_
     
     # Assert success response
     assert response['statusCode'] == 200
-    assert "Successfully compacted 150 records" in response['body']
+    assert "Successfully compacted 2 records" in response['body']
     
     # Verify calls
     mock_s3.get_paginator.assert_called_once_with('list_objects_v2')
@@ -82,8 +78,17 @@ def test_lambda_handler_success(mock_write_table, mock_concat_tables, mock_read_
     assert mock_s3.get_object.call_count == 2
     assert mock_read_table.call_count == 2
     
-    # Check that upload_file was called to upload the catalog back to S3
-    mock_s3.upload_file.assert_called_once_with(
+    # Aligned chunks are streamed straight into the staging ParquetWriter
+    mock_parquet_writer.assert_called_once_with('/tmp/staging_catalog.parquet', combine_raw_to_single_file.TARGET_SCHEMA, compression="snappy")
+    mock_writer.write_table.assert_called_once()
+    written = mock_writer.write_table.call_args[0][0]
+    assert written.schema == combine_raw_to_single_file.TARGET_SCHEMA
+    assert written.num_rows == 2
+    # ...then rewritten in the sorted serving layout
+    mock_serving_layout.assert_called_once_with('/tmp/staging_catalog.parquet', '/tmp/catalog.parquet')
+    
+    # Check that upload_file was called to upload the catalog back to S3 (the manifest is uploaded separately)
+    mock_s3.upload_file.assert_any_call(
         Filename='/tmp/catalog.parquet',
         Bucket=bucket_name,
         Key='data/boardgames_combined/catalog.parquet'
@@ -104,3 +109,349 @@ def test_lambda_handler_failure(mock_boto_client):
     # Assert error response
     assert response['statusCode'] == 500
     assert "Compaction failed: S3 access denied" in response['body']
+
+def _parquet_bytes(table):
+    import io
+    import pyarrow.parquet as pq
+    buf = io.BytesIO()
+    pq.write_table(table, buf)
+    return buf.getvalue()
+
+def _s3_body(data):
+    body = MagicMock()
+    body.__enter__.return_value.read.return_value = data
+    return {'Body': body}
+
+@patch('combine_raw_to_single_file.boto3.client')
+def test_lambda_handler_incremental_upserts_changed_files(mock_boto_client, tmp_path):
+    import json
+    from datetime import datetime, timezone
+    import pyarrow.parquet as pq
+
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    old, watermark, new = (datetime(2026, 1, d, tzinfo=timezone.utc) for d in (1, 2, 3))
+    mock_paginator = MagicMock()
+    mock_s3.get_paginator.return_value = mock_paginator
+    mock_paginator.paginate.return_value = [{'Contents': [
+        {'Key': 'data/boardgames/1.parquet', 'LastModified': old},
+        {'Key': 'data/boardgames/2.parquet', 'LastModified': new},
+        {'Key': 'data/boardgames/3.parquet', 'LastModified': new},
+    ]}]
+
+    previous = combine_raw_to_single_file.align_table_to_schema(
+        pa.table({'id': ['1', '2'], 'name': ['Old One', 'Old Two'], 'rating': [7.0, 6.0]}),
+        combine_raw_to_single_file.TARGET_SCHEMA)
+    previous_path = tmp_path / 'previous.parquet'
+    pq.write_table(previous, previous_path)
+    mock_s3.download_file.side_effect = lambda bucket, key, path: open(path, 'wb').write(previous_path.read_bytes())
+
+    objects = {
+        'data/boardgames_combined/catalog.watermark.json': json.dumps({'last_modified': watermark.isoformat()}).encode(),
+        'data/boardgames/2.parquet': _parquet_bytes(pa.table({'id': ['2'], 'name': ['New Two'], 'rating': [8.0]})),
+        'data/boardgames/3.parquet': _parquet_bytes(pa.table({'id': ['3'], 'name': ['Three'], 'rating': [9.0]})),
+    }
+    mock_s3.get_object.side_effect = lambda Bucket, Key: _s3_body(objects[Key])
+
+    written = {}
+    mock_s3.upload_file.side_effect = lambda Filename, Bucket, Key: written.update(table=pq.read_table(Filename))
+    response = combine_raw_to_single_file.lambda_handler({'mode': 'incremental'}, None)
+
+    assert response['statusCode'] == 200
+    # Only the two files newer than the watermark are downloaded (plus the watermark itself)
+    fetched = sorted(c.kwargs['Key'] for c in mock_s3.get_object.call_args_list)
+    assert fetched == ['data/boardgames/2.parquet', 'data/boardgames/3.parquet', 'data/boardgames_combined/catalog.watermark.json']
+    rows = {r['id']: r['name'] for r in written['table'].to_pylist()}
+    assert rows == {'1': 'Old One', '2': 'New Two', '3': 'Three'}
+    assert written['table'].schema == combine_raw_to_single_file.TARGET_SCHEMA
+
+    put_kwargs = mock_s3.put_object.call_args.kwargs
+    assert put_kwargs['Key'] == 'data/boardgames_combined/catalog.watermark.json'
+    assert json.loads(put_kwargs['Body'])['last_modified'] == new.isoformat()
+
+@patch('combine_raw_to_single_file.boto3.client')
+def test_lambda_handler_failed_download_holds_watermark_back(mock_boto_client):
+    import json
+    from datetime import datetime, timezone
+
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    failed_at, merged_at = (datetime(2026, 1, d, tzinfo=timezone.utc) for d in (2, 3))
+    mock_paginator = MagicMock()
+    mock_s3.get_paginator.return_value = mock_paginator
+    mock_paginator.paginate.return_value = [{'Contents': [
+        {'Key': 'data/boardgames/1.parquet', 'LastModified': failed_at},
+        {'Key': 'data/boardgames/2.parquet', 'LastModified': merged_at},
+    ]}]
+
+    def get_object(Bucket, Key):
+        if Key == 'data/boardgames/1.parquet':
+            raise ConnectionError("connection reset")
+        return _s3_body(_parquet_bytes(pa.table({'id': ['2'], 'name': ['Two']})))
+    mock_s3.get_object.side_effect = get_object
+
+    response = combine_raw_to_single_file.lambda_handler({'mode': 'full'}, None)
+
+    assert response['statusCode'] == 200
+    assert "Successfully compacted 1 records" in response['body']
+    # The watermark stops at the failed file so the next incremental run retries it
+    put_kwargs = mock_s3.put_object.call_args.kwargs
+    assert put_kwargs['Key'] == 'data/boardgames_combined/catalog.watermark.json'
+    assert json.loads(put_kwargs['Body'])['last_modified'] == failed_at.isoformat()
+
+def test_merged_watermark_without_failures_or_stamps():
+    from datetime import datetime, timezone
+    stamp = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    objects = [('a.parquet', stamp, 1), ('b.parquet', None, 1)]
+    assert combine_raw_to_single_file.merged_watermark(objects, []) == stamp
+    # A failed file with no LastModified cannot be placed, so no watermark is written
+    assert combine_raw_to_single_file.merged_watermark(objects, ['b.parquet']) is None
+
+@patch('combine_raw_to_single_file.boto3.client')
+def test_lambda_handler_incremental_without_watermark_falls_back_to_full(mock_boto_client):
+    from datetime import datetime, timezone
+    from botocore.exceptions import ClientError
+
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    mock_paginator = MagicMock()
+    mock_s3.get_paginator.return_value = mock_paginator
+    stamp = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    mock_paginator.paginate.return_value = [{'Contents': [
+        {'Key': 'data/boardgames/1.parquet', 'LastModified': stamp},
+        {'Key': 'data/boardgames/2.parquet', 'LastModified': stamp},
+    ]}]
+
+    raw = {f'data/boardgames/{i}.parquet': _parquet_bytes(pa.table({'id': [str(i)], 'name': ['Game']})) for i in (1, 2)}
+
+    def get_object(Bucket, Key):
+        if Key.endswith('.watermark.json'):
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return _s3_body(raw[Key])
+    mock_s3.get_object.side_effect = get_object
+
+    response = combine_raw_to_single_file.lambda_handler({'mode': 'incremental'}, None)
+
+    assert response['statusCode'] == 200
+    assert "Successfully compacted 2 records" in response['body']
+    mock_s3.download_file.assert_not_called()
+    mock_s3.put_object.assert_called_once()
+
+def test_upsert_table_replaces_all_rows_for_changed_keys():
+    previous = pa.table({'username': ['a', 'a', 'b'], 'id': ['1', '2', '3']})
+    delta = pa.table({'username': ['a'], 'id': ['9']})
+    result = combine_raw_to_single_file.upsert_table(previous, delta, 'username')
+    assert result.to_pylist() == [{'username': 'b', 'id': '3'}, {'username': 'a', 'id': '9'}]
+
+def test_streaming_writes_one_row_group_per_chunk(tmp_path):
+    import pyarrow.parquet as pq
+    mock_s3 = MagicMock()
+    raw = {f'data/boardgames/{i}.parquet': _parquet_bytes(pa.table({'id': [str(i)], 'rating': [float(i)]})) for i in range(5)}
+    mock_s3.get_object.side_effect = lambda Bucket, Key: _s3_body(raw[Key])
+
+    chunks = combine_raw_to_single_file.iter_compacted_chunks(
+        mock_s3, 'bucket', list(raw), apply_schema_alignment=True, max_workers=2, chunk_size=2)
+    output = tmp_path / 'catalog.parquet'
+    num_rows = combine_raw_to_single_file.write_streaming(chunks, str(output), combine_raw_to_single_file.TARGET_SCHEMA)
+
+    assert num_rows == 5
+    parquet_file = pq.ParquetFile(output)
+    assert parquet_file.metadata.num_row_groups == 3
+    assert parquet_file.read().column('id').to_pylist() == ['0', '1', '2', '3', '4']
+
+def test_write_serving_layout_sorts_and_tunes_row_groups(tmp_path):
+    import pyarrow.parquet as pq
+    staged = combine_raw_to_single_file.align_table_to_schema(pa.table({
+        'id': [str(i) for i in range(7)],
+        'rating': [5.5, None, 9.0, 4.0, 7.25, 8.0, 3.0],
+        'mechanics': [['Dice'], ['Dice', 'Drafting'], None, ['Drafting'], [], ['Dice'], ['Auction']],
+    }), combine_raw_to_single_file.TARGET_SCHEMA)
+    staging_path = tmp_path / 'staging.parquet'
+    pq.write_table(staged, staging_path, row_group_size=4)
+    output_path = tmp_path / 'catalog.parquet'
+
+    num_rows, duplicates = combine_raw_to_single_file.write_serving_layout(str(staging_path), str(output_path), row_group_size=3)
+
+    assert (num_rows, duplicates) == (7, 0)
+    parquet_file = pq.ParquetFile(output_path)
+    result = parquet_file.read()
+    assert result.schema == combine_raw_to_single_file.TARGET_SCHEMA
+    assert result.column('rating').to_pylist() == [9.0, 8.0, 7.25, 5.5, 4.0, 3.0, None]
+    assert result.column('id').to_pylist() == ['2', '5', '4', '0', '3', '6', '1']
+
+    metadata = parquet_file.metadata
+    assert metadata.num_row_groups == 3
+    rating_idx = result.schema.get_field_index('rating')
+    first, last = metadata.row_group(0), metadata.row_group(2)
+    assert first.sorting_columns[0].column_index == rating_idx and first.sorting_columns[0].descending
+    assert first.column(rating_idx).statistics.min == 7.25
+    assert last.column(rating_idx).statistics.null_count == 1
+    mech = next(i for i in range(metadata.num_columns) if first.column(i).path_in_schema.startswith('mechanics'))
+    assert first.column(mech).has_dictionary_page
+    name = result.schema.get_field_index('name')
+    assert not first.column(name).has_dictionary_page
+
+    # Row-group pruning: a rating >= 5.0 filter only needs the first two groups
+    filtered = pq.read_table(output_path, filters=[('rating', '>=', 5.0)])
+    assert filtered.column('id').to_pylist() == ['2', '5', '4', '0']
+
+def test_write_serving_layout_keeps_last_written_row_per_id(tmp_path):
+    import pyarrow.parquet as pq
+    # Staged oldest first: the later row for each duplicated id must win
+    staged = combine_raw_to_single_file.align_table_to_schema(pa.table({
+        'id': ['1', '2', '1', '3', '2', '1'],
+        'name': ['One v1', 'Two v1', 'One v2', 'Three', 'Two v2', 'One v3'],
+        'rating': [6.0, 7.0, 6.5, 8.0, 5.0, 9.0],
+    }), combine_raw_to_single_file.TARGET_SCHEMA)
+    staging_path = tmp_path / 'staging.parquet'
+    pq.write_table(staged, staging_path)
+    output_path = tmp_path / 'catalog.parquet'
+
+    num_rows, duplicates = combine_raw_to_single_file.write_serving_layout(str(staging_path), str(output_path))
+
+    assert (num_rows, duplicates) == (3, 3)
+    result = pq.read_table(output_path)
+    assert result.column('name').to_pylist() == ['One v3', 'Three', 'Two v2']
+
+def test_write_serving_layout_reads_only_index_columns_whole(tmp_path, monkeypatch):
+    import pyarrow.parquet as pq
+    staged = combine_raw_to_single_file.align_table_to_schema(pa.table({
+        'id': ['1', '2', '3', '1', '4', '2', '5'],
+        'name': ['One v1', 'Two v1', 'Three', 'One v2', 'Four', 'Two v2', 'Five'],
+        'rating': [6.0, 7.0, 8.0, 6.5, 3.0, 9.0, None],
+    }), combine_raw_to_single_file.TARGET_SCHEMA)
+    staging_path = tmp_path / 'staging.parquet'
+    pq.write_table(staged, staging_path, row_group_size=3)
+    output_path = tmp_path / 'catalog.parquet'
+
+    read_columns = []
+    read_table = pq.read_table
+    monkeypatch.setattr(pq, 'read_table', lambda *args, **kwargs: read_columns.append(kwargs.get('columns'))
+                        or read_table(*args, **kwargs))
+    num_rows, duplicates = combine_raw_to_single_file.write_serving_layout(
+        str(staging_path), str(output_path), row_group_size=2)
+    monkeypatch.undo()
+
+    # Only the dedup and sort columns are read for the whole staged file
+    assert read_columns == [['id', 'rating']]
+    assert (num_rows, duplicates) == (5, 2)
+    result = pq.read_table(output_path)
+    assert result.column('name').to_pylist() == ['Two v2', 'Three', 'One v2', 'Four', 'Five']
+    assert result.schema == combine_raw_to_single_file.TARGET_SCHEMA
+    assert pq.ParquetFile(output_path).metadata.num_row_groups == 3
+
+@patch('combine_raw_to_single_file.boto3.client')
+def test_lambda_handler_full_dedups_by_last_modified(mock_boto_client, tmp_path):
+    import pyarrow.parquet as pq
+    from datetime import datetime, timezone
+
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    mock_paginator = MagicMock()
+    mock_s3.get_paginator.return_value = mock_paginator
+    # Listed newest first: the older re-scrape must not win just because it is listed later
+    mock_paginator.paginate.return_value = [{'Contents': [
+        {'Key': 'data/boardgames/batch-b/1.parquet', 'LastModified': datetime(2026, 1, 5, tzinfo=timezone.utc)},
+        {'Key': 'data/boardgames/batch-a/1.parquet', 'LastModified': datetime(2026, 1, 1, tzinfo=timezone.utc)},
+        {'Key': 'data/boardgames/2.parquet', 'LastModified': datetime(2026, 1, 3, tzinfo=timezone.utc)},
+    ]}]
+    raw = {
+        'data/boardgames/batch-b/1.parquet': _parquet_bytes(pa.table({'id': ['1'], 'name': ['Newest']})),
+        'data/boardgames/batch-a/1.parquet': _parquet_bytes(pa.table({'id': ['1'], 'name': ['Stale']})),
+        'data/boardgames/2.parquet': _parquet_bytes(pa.table({'id': ['2'], 'name': ['Two']})),
+    }
+    mock_s3.get_object.side_effect = lambda Bucket, Key: _s3_body(raw[Key])
+    written = {}
+    mock_s3.upload_file.side_effect = lambda Filename, Bucket, Key: written.update(table=pq.read_table(Filename))
+
+    response = combine_raw_to_single_file.lambda_handler({}, None)
+
+    assert response['statusCode'] == 200
+    assert "Successfully compacted 2 records" in response['body']
+    assert "1 duplicate ids dropped" in response['body']
+    assert sorted(written['table'].column('name').to_pylist()) == ['Newest', 'Two']
+
+@patch('combine_raw_to_single_file.boto3.client')
+def test_lambda_handler_reads_per_game_and_batch_layouts(mock_boto_client):
+    import pyarrow.parquet as pq
+    from datetime import datetime, timezone
+
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    mock_paginator = MagicMock()
+    mock_s3.get_paginator.return_value = mock_paginator
+    mock_paginator.paginate.return_value = [{'Contents': [
+        {'Key': 'data/boardgames/1.parquet', 'LastModified': datetime(2026, 1, 1, tzinfo=timezone.utc)},
+        {'Key': 'data/boardgames/batches/dt=2026-01-02/120000-abc.parquet', 'LastModified': datetime(2026, 1, 2, tzinfo=timezone.utc)},
+    ]}]
+    raw = {
+        'data/boardgames/1.parquet': _parquet_bytes(pa.table({'id': ['1'], 'name': ['One (old)']})),
+        'data/boardgames/batches/dt=2026-01-02/120000-abc.parquet': _parquet_bytes(
+            pa.table({'id': ['1', '2', '3'], 'name': ['One', 'Two', 'Three']})),
+    }
+    mock_s3.get_object.side_effect = lambda Bucket, Key: _s3_body(raw[Key])
+    written = {}
+    mock_s3.upload_file.side_effect = lambda Filename, Bucket, Key: written.update(table=pq.read_table(Filename))
+
+    response = combine_raw_to_single_file.lambda_handler({}, None)
+
+    assert response['statusCode'] == 200
+    assert sorted(written['table'].column('name').to_pylist()) == ['One', 'Three', 'Two']
+
+@patch('combine_raw_to_single_file.boto3.client')
+def test_lambda_handler_writes_manifest_of_game_sources(mock_boto_client):
+    import pyarrow.parquet as pq
+    from datetime import datetime, timezone
+
+    mock_s3 = MagicMock()
+    mock_boto_client.return_value = mock_s3
+    mock_paginator = MagicMock()
+    mock_s3.get_paginator.return_value = mock_paginator
+    day1, day2 = datetime(2026, 1, 1, tzinfo=timezone.utc), datetime(2026, 1, 2, tzinfo=timezone.utc)
+    batch_key = 'data/boardgames/batches/dt=2026-01-02/120000-abc.parquet'
+    mock_paginator.paginate.return_value = [{'Contents': [
+        {'Key': 'data/boardgames/1.parquet', 'LastModified': day1, 'Size': 100},
+        {'Key': batch_key, 'LastModified': day2, 'Size': 300},
+    ]}]
+    raw = {
+        'data/boardgames/1.parquet': _parquet_bytes(pa.table({'id': ['1'], 'name': ['One (old)']})),
+        batch_key: _parquet_bytes(pa.table({'id': ['1', '2'], 'name': ['One', 'Two']})),
+    }
+    mock_s3.get_object.side_effect = lambda Bucket, Key: _s3_body(raw[Key])
+    uploads = {}
+    mock_s3.upload_file.side_effect = lambda Filename, Bucket, Key: uploads.update({Key: pq.read_table(Filename)})
+
+    response = combine_raw_to_single_file.lambda_handler({}, None)
+
+    assert response['statusCode'] == 200
+    manifest = uploads['data/boardgames_combined/catalog.manifest.parquet']
+    assert manifest.schema == combine_raw_to_single_file.MANIFEST_SCHEMA
+    rows = {r['id']: r for r in manifest.to_pylist()}
+    # Game 1 comes from the newer batch file, which won the dedup
+    assert {gid: (r['key'], r['size'], r['last_modified']) for gid, r in rows.items()} == {
+        '1': (batch_key, 300, day2), '2': (batch_key, 300, day2)}
+    catalog = {r['id']: r for r in uploads['data/boardgames_combined/catalog.parquet'].to_pylist()}
+    assert rows['1']['row_hash'] == combine_raw_to_single_file.row_hashes(pa.Table.from_pylist([catalog['1']]))[0]
+    assert rows['1']['row_hash'] != rows['2']['row_hash']
+
+def test_build_manifest_keeps_previous_sources_for_unchanged_games(tmp_path):
+    import pyarrow.parquet as pq
+    from datetime import datetime, timezone
+
+    catalog_path = tmp_path / 'catalog.parquet'
+    pq.write_table(combine_raw_to_single_file.align_table_to_schema(
+        pa.table({'id': ['1', '2', '3'], 'name': ['One', 'Two', 'Three']}),
+        combine_raw_to_single_file.TARGET_SCHEMA), catalog_path)
+    stamp = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    objects = [
+        ('data/boardgames/batches/a.parquet', stamp, 50),
+        ('data/boardgames/2.parquet', stamp, 20),
+    ]
+
+    manifest = combine_raw_to_single_file.build_manifest(
+        str(catalog_path), objects, {'1': 'data/boardgames/batches/a.parquet'}, 'data/boardgames/')
+
+    rows = {r['id']: (r['key'], r['size']) for r in manifest.to_pylist()}
+    # 2 falls back to its per-game file; 3's source is no longer listed
+    assert rows == {'1': ('data/boardgames/batches/a.parquet', 50), '2': ('data/boardgames/2.parquet', 20),
+                    '3': (None, None)}
@@ -0,0 +1,143 @@
+import os
+import sys
+import math
+import pytest
+import pandas as pd
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bgg_common'))
+import taste_profile
+
+
+def _reference_profile(liked_games, catalog_df):
+    """The per-row iterrows implementation the vectorized builder replaced."""
+    joined = liked_games.merge(catalog_df, on='id', how='inner', suffixes=('_user', '_catalog'))
+    mech, cat, des, pub = {}, {}, {}, {}
+    comp_weights = taste_profile.empty_complexity_weights()
+    has_comp = False
+    for _, row in joined.iterrows():
+        try:
+            u_rating = float(row.get('rating_user'))
+            if math.isnan(u_rating) or u_rating <= 0:
+                u_rating = 7.0
+        except (ValueError, TypeError):
+            u_rating = 7.0
+        weight = max(1.0, u_rating - 5.0)
+        listify = lambda v: list(v) if isinstance(v, (list, np.ndarray)) else []
+        for c in set(listify(row.get('categories'))):
+            cat[c] = cat.get(c, 0.0) + weight
+        for m in set(listify(row.get('mechanics'))):
+            mech[m] = mech.get(m, 0.0) + weight
+        for d in listify(row.get('designers')):
+            des[d] = des.get(d, 0.0) + weight
+        pubs = listify(row.get('publishers'))
+        if pubs:
+            pub[pubs[0]] = pub.get(pubs[0], 0.0) + weight
+        comp = row.get('complexity')
+        if comp is not None and not math.isnan(float(comp)):
+            has_comp = True
+            comp = float(comp)
+            bucket = "Light" if comp < 2.0 else "Medium-Light" if comp <= 2.8 else "Medium-Heavy" if comp <= 3.5 else "Heavy"
+            comp_weights[bucket] = round(comp_weights[bucket] + weight, 2)
+    if not has_comp:
+        comp_weights["Medium-Light"] = 1.0
+    return {"mech_weights": mech, "cat_weights": cat, "designer_weights": des,
+            "publisher_weights": pub, "complexity_weights": comp_weights}
+
+
+def _random_data(n_catalog=400, n_user=150, seed=1):
+    rng = np.random.default_rng(seed)
+    catalog = pd.DataFrame({
+        "id": [str(i) for i in range(n_catalog)],
+        "rating": rng.uniform(5, 9, n_catalog),
+        "mechanics": [list(rng.choice([f"m{j}" for j in range(25)], size=rng.integers(0, 6))) for _ in range(n_catalog)],
+        "categories": [list(rng.choice([f"c{j}" for j in range(12)], size=rng.integers(0, 4))) if i % 9 else None for i in range(n_catalog)],
+        "designers": [list(rng.choice([f"d{j}" for j in range(30)], size=rng.integers(0, 3))) for _ in range(n_catalog)],
+        "publishers": [list(rng.choice([f"p{j}" for j in range(8)], size=rng.integers(0, 3))) for _ in range(n_catalog)],
+        "complexity": [float(np.round(rng.uniform(1, 5), 2)) if i % 6 else np.nan for i in range(n_catalog)],
+    })
+    user = pd.DataFrame({
+        "id": [str(i) for i in rng.choice(n_catalog + 50, size=n_user, replace=False)],
+        "rating": [float(np.round(rng.uniform(1, 10), 1)) if i % 7 else np.nan for i in range(n_user)],
+        "own": rng.integers(0, 2, n_user).astype(bool),
+    })
+    return user, catalog
+
+
+def test_build_taste_profile_matches_reference_loop():
+    user, catalog = _random_data()
+    liked = taste_profile.select_liked_games(user)
+    result = taste_profile.build_taste_profile(liked, catalog)
+    expected = _reference_profile(liked, catalog)
+    for key in ("mech_weights", "cat_weights", "designer_weights", "publisher_weights"):
+        assert result[key] == pytest.approx(expected[key])
+    assert result["complexity_weights"] == expected["complexity_weights"]
+
+
+def test_build_taste_profile_primary_publisher_and_unique_mechanics():
+    catalog = pd.DataFrame([
+        {"id": "1", "mechanics": ["Dice", "Dice"], "designers": ["A", "A"], "publishers": ["P1", "P2"], "complexity": 1.5},
+    ])
+    liked = pd.DataFrame([{"id": "1", "rating": 9.0}])
+    profile = taste_profile.build_taste_profile(liked, catalog)
+    assert profile["mech_weights"] == {"Dice": 4.0}
+    assert profile["designer_weights"] == {"A": 8.0}
+    assert profile["publisher_weights"] == {"P1": 4.0}
+    assert profile["complexity_weights"] == {"Light": 4.0, "Medium-Light": 0.0, "Medium-Heavy": 0.0, "Heavy": 0.0}
+
+
+def test_complexity_weights_round_after_every_row_like_reference():
+    catalog = pd.DataFrame([{"id": str(i), "rating": 7.5, "complexity": 2.5} for i in range(3)])
+    # Unrounded weights of 2.333: rounding each increment gives 6.99, rounding the sum would give 7.0
+    liked = pd.DataFrame([{"id": str(i), "rating": 7.333} for i in range(3)])
+    profile = taste_profile.build_taste_profile(liked, catalog)
+    assert profile["complexity_weights"]["Medium-Light"] == 6.99
+    assert profile["complexity_weights"] == _reference_profile(liked, catalog)["complexity_weights"]
+
+
+def test_build_taste_profile_without_matches_defaults_complexity():
+    catalog = pd.DataFrame([{"id": "1", "mechanics": ["Dice"], "complexity": 2.0}])
+    liked = pd.DataFrame([{"id": "999", "rating": 8.0}])
+    profile = taste_profile.build_taste_profile(liked, catalog)
+    assert profile["mech_weights"] == {}
+    assert profile["complexity_weights"] == {"Light": 0.0, "Medium-Light": 1.0, "Medium-Heavy": 0.0, "Heavy": 0.0}
+
+
+def test_build_taste_profiles_grouped_matches_per_user():
+    user, catalog = _random_data(n_user=60)
+    own_only = user.assign(rating=np.where(user['rating'] >= 7.0, 6.5, user['rating']))
+    # Distinct sub-7 ratings so the top-10 fallback has no ties
+    unrated_unowned = user.head(25).assign(rating=np.linspace(1.0, 6.0, 25), own=False)
+    collections = {"alice": user, "bob": own_only, "cara": unrated_unowned}
+    stacked = pd.concat([df.assign(username=name) for name, df in collections.items()], ignore_index=True)
+
+    liked = taste_profile.select_liked_games_by_user(stacked)
+    profiles = taste_profile.build_taste_profiles(liked, catalog)
+
+    assert set(profiles) == set(collections)
+    for name, df in collections.items():
+        single_liked = taste_profile.select_liked_games(df)
+        assert sorted(liked.loc[liked['username'] == name, 'id']) == sorted(single_liked['id'])
+        expected = taste_profile.build_taste_profile(single_liked, catalog)
+        for key in ("mech_weights", "cat_weights", "designer_weights", "publisher_weights"):
+            assert profiles[name][key] == pytest.approx(expected[key])
+        assert profiles[name]["complexity_weights"] == expected["complexity_weights"]
+
+
+def test_flatten_uses_list_kernels_for_mixed_cells():
+    import pyarrow as pa
+    values = pd.Series([np.array(['a', 'b'], dtype=object), None, np.nan, ['c', None], [], 'stray'])
+    rows, tokens = taste_profile._flatten(values)
+    assert rows.tolist() == [0, 0, 3]
+    assert tokens.tolist() == ['a', 'b', 'c']
+
+    rows, tokens = taste_profile._flatten(values, first_only=True)
+    assert rows.tolist() == [0, 3]
+    assert tokens.tolist() == ['a', 'c']
+
+    # Arrow-backed columns are flattened without converting to Python objects first
+    arrow_values = pd.Series(pa.array([['x'], None, ['y', 'z']]), dtype=pd.ArrowDtype(pa.list_(pa.string())))
+    rows, tokens = taste_profile._flatten(arrow_values)
+    assert rows.tolist() == [0, 2, 2]
+    assert tokens.tolist() == ['x', 'y', 'z']
+    assert taste_profile._flatten(pd.Series([None, np.nan]))[0].size == 0